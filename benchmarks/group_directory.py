@@ -0,0 +1,137 @@
+"""Micro-benchmark of the grouping of files of a directory by song.
+
+Synthetic file names are grouped by `dakara_feeder.directory.group_directory`
+and by the previous implementation, which sorted the paths of all files and
+computed the name without extension of each file several times. Files are
+classified by their extension, so that no file is read.
+
+Run it from the root of the repository:
+
+    python benchmarks/group_directory.py
+    python benchmarks/group_directory.py --sizes 10000 100000
+"""
+
+import argparse
+import random
+import time
+from itertools import groupby
+
+from path import Path
+
+from dakara_feeder.directory import (
+    CLASSIFICATION_EXTENSION,
+    FileClassifier,
+    group_by_type,
+    group_directory,
+)
+
+SIZES = (10_000, 100_000, 1_000_000)
+EXTENSIONS = (".mkv", ".ass", ".flac", ".jpg")
+
+
+def generate_names(size, seed=0):
+    """Generate shuffled names of files of songs.
+
+    Each song has a video file, and some have a subtitle, an audio or another
+    file with the same name.
+
+    Args:
+        size (int): Number of names.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        list of str: Names of the files.
+    """
+    generator = random.Random(seed)
+    names = []
+    song = 0
+    while len(names) < size:
+        stem = "Artist {} - Title {} - OP{}".format(song % 997, song, song % 3)
+        count = generator.randint(1, len(EXTENSIONS))
+        names.extend(stem + extension for extension in EXTENSIONS[:count])
+        song += 1
+
+    names = names[:size]
+    generator.shuffle(names)
+
+    return names
+
+
+def group_directory_sorted(directory, names, path, classifier):
+    """Group files by song like the previous implementation.
+
+    Args:
+        directory (path.Path): Path of the directory.
+        names (list of str): Names of the files in the directory.
+        path (path.Path): Path of the scanned directory.
+        classifier (dakara_feeder.directory.FileClassifier): Classifier of
+            files.
+
+    Returns:
+        list of dakara_feeder.directory.SongPaths: Paths of the files for
+        each song.
+    """
+    files_list = sorted((directory / name for name in names), key=lambda f: (f.stem, f))
+
+    return [
+        item
+        for _, files in groupby(files_list, lambda f: f.stem)
+        for item in group_by_type(files, path, classifier)
+    ]
+
+
+def measure(function, names, repeat):
+    """Get the best duration of several runs of a grouping function.
+
+    Args:
+        function (function): Grouping function.
+        names (list of str): Names of the files.
+        repeat (int): Number of runs.
+
+    Returns:
+        tuple: Contains the best duration in seconds and the number of songs.
+    """
+    classifier = FileClassifier(CLASSIFICATION_EXTENSION)
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        songs = function(Path("directory"), names, Path("kara"), classifier)
+        durations.append(time.perf_counter() - start)
+
+    return min(durations), len(songs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=SIZES, help="numbers of files"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size")
+    args = parser.parse_args()
+
+    print(
+        "{:>10} {:>10} {:>12} {:>12} {:>8}".format(
+            "files", "songs", "sorted (s)", "bucketed (s)", "speedup"
+        )
+    )
+    for size in args.sizes:
+        names = generate_names(size)
+        sorted_duration, sorted_songs = measure(
+            group_directory_sorted, names, args.repeat
+        )
+        bucketed_duration, bucketed_songs = measure(group_directory, names, args.repeat)
+        assert sorted_songs == bucketed_songs
+
+        print(
+            "{:>10} {:>10} {:>12.3f} {:>12.3f} {:>7.1f}x".format(
+                size,
+                bucketed_songs,
+                sorted_duration,
+                bucketed_duration,
+                sorted_duration / bucketed_duration,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
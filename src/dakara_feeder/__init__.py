@@ -5,6 +5,7 @@ Feed the database of the Dakara server.
 """
 
 from dakara_feeder import (
+    cache,
     customization,
     difference,
     directory,
@@ -14,8 +15,10 @@ from dakara_feeder import (
     similarity,
     song,
     subtitle,
+    tools,
     utils,
     version,
+    watch,
     web_client,
     yaml,
 )
@@ -24,6 +27,7 @@ from dakara_feeder.version import __date__, __version__
 __all__ = [
     "__date__",
     "__version__",
+    "cache",
     "customization",
     "difference",
     "directory",
@@ -33,8 +37,10 @@ __all__ = [
     "similarity",
     "song",
     "subtitle",
+    "tools",
     "utils",
     "version",
+    "watch",
     "web_client",
     "yaml",
 ]
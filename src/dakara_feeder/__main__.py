@@ -1,5 +1,6 @@
 """Command line interface to run the feeder."""
 
+import asyncio
 import logging
 import sys
 from argparse import ArgumentParser
@@ -123,6 +124,36 @@ def get_parser():
         help="do not delete artists and works without songs at end of feed",
     )
 
+    songs_subparser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="number of songs to parse at the same time (overrides the config)",
+    )
+
+    songs_subparser.add_argument(
+        "--rescan",
+        action="store_true",
+        help="scan the whole karaoke folder again, ignoring the scan cache",
+    )
+
+    # the watch mode feeds synchronously
+    songs_mode_group = songs_subparser.add_mutually_exclusive_group()
+
+    songs_mode_group.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        help="keep running and feed songs as the karaoke folder changes",
+    )
+
+    songs_mode_group.add_argument(
+        "--async",
+        dest="asynchronous",
+        action="store_true",
+        help="parse and send songs concurrently on an event loop",
+    )
+
     # feed works subparser
     works_subparser = feed_subparser.add_parser(
         "works",
@@ -201,13 +232,30 @@ def feed_songs(args):
         set_loglevel(config)
 
     feeder = SongsFeeder(
-        config, force_update=args.force, prune=args.prune, progress=args.progress
+        config,
+        force_update=args.force,
+        prune=args.prune,
+        progress=args.progress,
+        parse_workers=args.jobs,
+        rescan=args.rescan,
     )
 
-    with handle_config_incomplete():
-        feeder.load()
+    try:
+        with handle_config_incomplete():
+            feeder.load()
 
-    feeder.feed()
+        if args.watch:
+            feeder.watch()
+            return
+
+        if args.asynchronous:
+            asyncio.run(feeder.feed_async())
+            return
+
+        feeder.feed()
+
+    finally:
+        feeder.close()
 
 
 def feed_works(args):
@@ -0,0 +1,604 @@
+"""Persistent caches used to speed up feeding.
+
+The metadata cache stores the values extracted by the metadata parsers in a
+SQLite database, so that unchanged files do not have to be parsed again on
+the next run:
+
+>>> cache = MetadataCache(Path("path/to/metadata.sqlite"))
+>>> cache.open()
+>>> metadata = cache.get(Path("video.mkv"), Path("base/video.mkv"))
+>>> if metadata is None:
+...     metadata = FFProbeMetadataParser.parse(Path("base/video.mkv"))
+...     cache.set(Path("video.mkv"), Path("base/video.mkv"), metadata)
+>>> cache.close()
+
+Entries are identified by the relative path of the file, its size, its
+modification time and its inode. An entry which file has changed is
+considered stale and removed.
+
+The scan cache stores the songs found in each directory of the karaoke folder
+in a JSON file, so that directories that have not changed are not listed
+again on the next run:
+
+>>> scan_cache = ScanCache(Path("path/to/scan.json"), root, signature)
+>>> scan_cache.load()
+>>> listing = list_directory(root, scan_cache=scan_cache)
+>>> scan_cache.save()
+
+The fingerprint cache stores the identity of each known video file (inode,
+size and hashes of its first and last blocks), so that a renamed file can be
+recognized even if its new name is very different:
+
+>>> with FingerprintCache(Path("path/to/fingerprints.sqlite")) as cache:
+...     cache.set(Path("video.mkv"), get_file_fingerprint(Path("base/video.mkv")))
+...     fingerprint = cache.get(Path("video.mkv"))
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from threading import Lock
+
+from dakara_feeder.directory import SongPaths
+from dakara_feeder.metadata import CachedMetadataParser
+
+logger = logging.getLogger(__name__)
+
+
+COMMIT_INTERVAL = 100
+FINGERPRINT_BLOCK_SIZE = 16 * 1024
+
+# coarsest resolution of modification times of directories in nanoseconds,
+# FAT file systems store them with a resolution of 2 seconds
+MTIME_GRANULARITY = 2_000_000_000
+
+
+def get_file_identity(file_path):
+    """Get the values identifying the content of a file.
+
+    Args:
+        file_path (path.Path): Path to the file.
+
+    Returns:
+        tuple: Size, modification time in nanoseconds and inode of the file.
+        `None` if the file cannot be accessed.
+    """
+    try:
+        stat = os.stat(file_path)
+
+    except OSError:
+        return None
+
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+def get_file_fingerprint(file_path, block_size=FINGERPRINT_BLOCK_SIZE):
+    """Get the fingerprint of a file.
+
+    Only the first and last blocks of the file are read.
+
+    Args:
+        file_path (path.Path): Path to the file.
+        block_size (int): Size of the blocks to read in bytes.
+
+    Returns:
+        tuple: Inode and size of the file, then hashes of its first and last
+        blocks. `None` if the file cannot be read.
+    """
+    try:
+        with open(file_path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            head = file.read(block_size)
+
+            if stat.st_size > block_size:
+                file.seek(-block_size, os.SEEK_END)
+                tail = file.read(block_size)
+
+            else:
+                tail = head
+
+    except OSError:
+        return None
+
+    return (
+        stat.st_ino,
+        stat.st_size,
+        hashlib.blake2b(head, digest_size=16).hexdigest(),
+        hashlib.blake2b(tail, digest_size=16).hexdigest(),
+    )
+
+
+class MetadataCache:
+    """Cache of metadata stored in a SQLite database.
+
+    The cache can be used by several threads at the same time.
+
+    Args:
+        database_path (path.Path): Path to the database file.
+
+    Attributes:
+        database_path (path.Path): Path to the database file.
+        connection (sqlite3.Connection): Connection to the database, set when
+            the cache is open.
+        hits (int): Number of requests served from the cache.
+        misses (int): Number of requests not served from the cache.
+    """
+
+    def __init__(self, database_path):
+        self.database_path = database_path
+        self.connection = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+        self.pending_writes = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def open(self):
+        """Open the database and create its structure if needed."""
+        self.database_path.parent.makedirs_p()
+        self.connection = sqlite3.connect(
+            str(self.database_path), check_same_thread=False
+        )
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            "path TEXT PRIMARY KEY, "
+            "size INTEGER, "
+            "mtime INTEGER, "
+            "inode INTEGER, "
+            "duration REAL, "
+            "audio_tracks_count INTEGER, "
+            "subtitle_tracks_count INTEGER)"
+        )
+        self.connection.commit()
+        logger.debug("Opened metadata cache '%s'", self.database_path)
+
+    def commit(self):
+        """Save pending changes."""
+        with self.lock:
+            self.connection.commit()
+            self.pending_writes = 0
+
+    def close(self):
+        """Save pending changes and close the database."""
+        if self.connection is None:
+            return
+
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+    def get(self, relative_path, file_path):
+        """Get the metadata of a file from the cache.
+
+        Args:
+            relative_path (path.Path): Path of the file relative to the
+                scanned directory, used as key.
+            file_path (path.Path): Path to the file.
+
+        Returns:
+            dakara_feeder.metadata.CachedMetadataParser: Metadata of the file,
+            or `None` if the file is not in the cache or has changed.
+        """
+        identity = get_file_identity(file_path)
+
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT size, mtime, inode, duration, audio_tracks_count, "
+                "subtitle_tracks_count FROM metadata WHERE path = ?",
+                (str(relative_path),),
+            ).fetchone()
+
+            if row is None or identity is None:
+                self.misses += 1
+                return None
+
+            # evict stale entry
+            if tuple(row[:3]) != identity:
+                self.connection.execute(
+                    "DELETE FROM metadata WHERE path = ?", (str(relative_path),)
+                )
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+        duration, audio_tracks_count, subtitle_tracks_count = row[3:]
+        return CachedMetadataParser(
+            {
+                "duration": duration,
+                "audio_tracks_count": audio_tracks_count,
+                "subtitle_tracks_count": subtitle_tracks_count,
+            }
+        )
+
+    def set(self, relative_path, file_path, metadata):
+        """Store the metadata of a file in the cache.
+
+        Args:
+            relative_path (path.Path): Path of the file relative to the
+                scanned directory, used as key.
+            file_path (path.Path): Path to the file.
+            metadata (dakara_feeder.metadata.MetadataParser): Metadata of the
+                file.
+        """
+        identity = get_file_identity(file_path)
+        if identity is None:
+            return
+
+        values = CachedMetadataParser.from_parser(metadata).metadata
+
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(relative_path),
+                    *identity,
+                    values["duration"],
+                    values["audio_tracks_count"],
+                    values["subtitle_tracks_count"],
+                ),
+            )
+
+            # commit from time to time
+            self.pending_writes += 1
+            if self.pending_writes >= COMMIT_INTERVAL:
+                self.connection.commit()
+                self.pending_writes = 0
+
+    def evict(self, relative_paths):
+        """Remove entries of files that do not exist anymore.
+
+        Args:
+            relative_paths (list of path.Path): Paths of the existing files,
+                relative to the scanned directory.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        existing_paths = {str(path) for path in relative_paths}
+
+        with self.lock:
+            removed_paths = [
+                (path,)
+                for (path,) in self.connection.execute("SELECT path FROM metadata")
+                if path not in existing_paths
+            ]
+            self.connection.executemany(
+                "DELETE FROM metadata WHERE path = ?", removed_paths
+            )
+            self.connection.commit()
+
+        logger.debug("Evicted %i entries from metadata cache", len(removed_paths))
+
+        return len(removed_paths)
+
+
+class ScanCache:
+    """Cache of the scan of a directory, stored in a JSON file.
+
+    For each directory, the cache stores its modification time, its sub
+    directories, its number of files and its songs. The content of the cache
+    is discarded if it was created for another directory or with another
+    classification of files.
+
+    A directory modified shortly before the scan started is not stored, as
+    files could be added to it in the same tick of its modification time
+    without changing it.
+
+    Args:
+        cache_path (path.Path): Path to the JSON file.
+        root (path.Path): Path of the scanned directory.
+        signature (dict): Description of the classification of files, see
+            `dakara_feeder.directory.FileClassifier.get_signature`.
+
+    Attributes:
+        cache_path (path.Path): Path to the JSON file.
+        root (path.Path): Path of the scanned directory.
+        signature (dict): Description of the classification of files.
+        entries (dict): Entries loaded from the file, by directory.
+        new_entries (dict): Entries of the current scan, by directory.
+        hits (int): Number of directories served from the cache.
+        misses (int): Number of directories not served from the cache.
+        start_time (int): Time the cache was created in nanoseconds.
+    """
+
+    VERSION = 1
+
+    def __init__(self, cache_path, root, signature):
+        self.cache_path = cache_path
+        self.root = root
+        self.signature = signature
+        self.entries = {}
+        self.new_entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.start_time = time.time_ns()
+
+    def get_header(self):
+        """Get the values that must match to reuse the content of the file.
+
+        Returns:
+            dict: Header of the file.
+        """
+        return {
+            "version": self.VERSION,
+            "root": str(self.root),
+            "signature": self.signature,
+        }
+
+    def load(self):
+        """Load the entries from the file.
+
+        Nothing is loaded if the file does not exist, cannot be read, or was
+        created for another directory or with another classification.
+        """
+        if not self.cache_path.exists():
+            return
+
+        try:
+            content = json.loads(self.cache_path.read_text())
+
+        except (OSError, ValueError) as error:
+            logger.debug("Cannot read scan cache: %s", error)
+            return
+
+        if content.get("header") != self.get_header():
+            logger.debug("Scan cache created with different parameters, ignoring it")
+            return
+
+        self.entries = content["directories"]
+
+    def save(self):
+        """Save the entries of the current scan in the file.
+
+        Directories that have not been seen in the current scan are dropped.
+        """
+        content = {"header": self.get_header(), "directories": self.new_entries}
+
+        try:
+            self.cache_path.parent.makedirs_p()
+            temporary_path = self.cache_path + ".tmp"
+            temporary_path.write_text(json.dumps(content))
+            os.replace(temporary_path, self.cache_path)
+
+        except OSError as error:
+            logger.debug("Cannot write scan cache: %s", error)
+
+        logger.debug(
+            "Scan cache: %i directories reused, %i directories listed",
+            self.hits,
+            self.misses,
+        )
+
+    def get(self, directory, mtime):
+        """Get the content of a directory from the cache.
+
+        Args:
+            directory (path.Path): Path of the directory, relative to the
+                scanned directory.
+            mtime (int): Current modification time of the directory in
+                nanoseconds.
+
+        Returns:
+            tuple: Contains the names of the sub directories, the number of
+            files and the list of `SongPaths` of the directory. `None` if the
+            directory is not in the cache or has changed.
+        """
+        entry = self.entries.get(str(directory))
+
+        if entry is None or entry["mtime"] != mtime:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.new_entries[str(directory)] = entry
+
+        return (
+            entry["subdirectories"],
+            entry["files_count"],
+            [self.deserialize_song_paths(song) for song in entry["songs"]],
+        )
+
+    def set(self, directory, mtime, subdirectories, files_count, songs):
+        """Store the content of a directory in the cache.
+
+        Args:
+            directory (path.Path): Path of the directory, relative to the
+                scanned directory.
+            mtime (int): Modification time of the directory in nanoseconds.
+            subdirectories (list of str): Names of the sub directories.
+            files_count (int): Number of files in the directory.
+            songs (list of dakara_feeder.directory.SongPaths): Songs of the
+                directory.
+        """
+        # the directory may still change without its modification time
+        # changing
+        if mtime > self.start_time - MTIME_GRANULARITY:
+            return
+
+        self.new_entries[str(directory)] = {
+            "mtime": mtime,
+            "subdirectories": subdirectories,
+            "files_count": files_count,
+            "songs": [self.serialize_song_paths(song) for song in songs],
+        }
+
+    @staticmethod
+    def serialize_song_paths(song_paths):
+        """Convert paths of a song to a JSON-compliant structure.
+
+        Args:
+            song_paths (dakara_feeder.directory.SongPaths): Paths of the song.
+
+        Returns:
+            list: Paths of the video, audio and subtitle files, then list of
+            paths of other files.
+        """
+        video, audio, subtitle, others = song_paths.as_tuple()
+        return [video, audio, subtitle, list(others)]
+
+    @staticmethod
+    def deserialize_song_paths(data):
+        """Convert a JSON-compliant structure to paths of a song.
+
+        Args:
+            data (list): Paths of the video, audio and subtitle files, then
+                list of paths of other files.
+
+        Returns:
+            dakara_feeder.directory.SongPaths: Paths of the song.
+        """
+        return SongPaths(*data)
+
+
+class FingerprintCache:
+    """Cache of fingerprints of files stored in a SQLite database.
+
+    Args:
+        database_path (path.Path): Path to the database file.
+
+    Attributes:
+        database_path (path.Path): Path to the database file.
+        connection (sqlite3.Connection): Connection to the database, set when
+            the cache is open.
+    """
+
+    def __init__(self, database_path):
+        self.database_path = database_path
+        self.connection = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def open(self):
+        """Open the database and create its structure if needed."""
+        self.database_path.parent.makedirs_p()
+        self.connection = sqlite3.connect(str(self.database_path))
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints ("
+            "path TEXT PRIMARY KEY, "
+            "inode INTEGER, "
+            "size INTEGER, "
+            "head TEXT, "
+            "tail TEXT)"
+        )
+        self.connection.commit()
+        logger.debug("Opened fingerprint cache '%s'", self.database_path)
+
+    def close(self):
+        """Save pending changes and close the database."""
+        if self.connection is None:
+            return
+
+        self.connection.commit()
+        self.connection.close()
+        self.connection = None
+
+    def commit(self):
+        """Save pending changes."""
+        self.connection.commit()
+
+    def get(self, relative_path):
+        """Get the fingerprint of a file.
+
+        Args:
+            relative_path (path.Path): Path of the file relative to the
+                scanned directory.
+
+        Returns:
+            tuple: Fingerprint of the file, see `get_file_fingerprint`. `None`
+            if the file is not in the cache.
+        """
+        row = self.connection.execute(
+            "SELECT inode, size, head, tail FROM fingerprints WHERE path = ?",
+            (str(relative_path),),
+        ).fetchone()
+
+        return None if row is None else tuple(row)
+
+    def set(self, relative_path, fingerprint):
+        """Store the fingerprint of a file.
+
+        Args:
+            relative_path (path.Path): Path of the file relative to the
+                scanned directory.
+            fingerprint (tuple): Fingerprint of the file, see
+                `get_file_fingerprint`. If `None`, the file is removed from
+                the cache.
+        """
+        if fingerprint is None:
+            self.delete(relative_path)
+            return
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)",
+            (str(relative_path), *fingerprint),
+        )
+
+    def delete(self, relative_path):
+        """Remove the fingerprint of a file.
+
+        Args:
+            relative_path (path.Path): Path of the file relative to the
+                scanned directory.
+        """
+        self.connection.execute(
+            "DELETE FROM fingerprints WHERE path = ?", (str(relative_path),)
+        )
+
+    def get_missing(self, relative_paths):
+        """Get the files which fingerprint is not stored.
+
+        Args:
+            relative_paths (list of path.Path): Paths of the files relative to
+                the scanned directory.
+
+        Returns:
+            list of path.Path: Paths of the files not in the cache.
+        """
+        known_paths = {
+            path for (path,) in self.connection.execute("SELECT path FROM fingerprints")
+        }
+
+        return [path for path in relative_paths if str(path) not in known_paths]
+
+    def evict(self, relative_paths):
+        """Remove fingerprints of files that do not exist anymore.
+
+        Args:
+            relative_paths (list of path.Path): Paths of the existing files,
+                relative to the scanned directory.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        existing_paths = {str(path) for path in relative_paths}
+        removed_paths = [
+            (path,)
+            for (path,) in self.connection.execute("SELECT path FROM fingerprints")
+            if path not in existing_paths
+        ]
+        self.connection.executemany(
+            "DELETE FROM fingerprints WHERE path = ?", removed_paths
+        )
+        self.connection.commit()
+
+        logger.debug("Evicted %i entries from fingerprint cache", len(removed_paths))
+
+        return len(removed_paths)
@@ -1,6 +1,15 @@
 """Manage differences."""
 
 import itertools
+import math
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+# minimal number of pairs to compare with several processes
+PROCESSES_MINIMAL_PAIRS = 100000
+
+# number of shards per process, for a better balance of the load
+SHARDS_PER_PROCESS = 4
 
 
 def generate_diff(old_list, new_list):
@@ -31,9 +40,59 @@ def generate_diff(old_list, new_list):
     return list(added), list(deleted), list(unchanged)
 
 
-def match_similar(list1, list2, compute_similarity, threshold=0.8):
+def match_identical(list1, list2, get_key):
+    """Match elements of two lists having the same key.
+
+    Only unambiguous pairs are matched, i.e. when exactly one element of each
+    list has the key. This is done in linear time.
+
+    Args:
+        list1 (list): Elements to match.
+        list2 (list): Elements to match.
+        get_key (function): Function taking as argument an element of either
+            list and returning a hashable key. Elements which key is `None`
+            are not matched.
+
+    Returns:
+        tuple of list: Contains 3 lists:
+
+        1. List of tuple with matching elements from `list1` and `list2`;
+        2. List of unmatched elements from `list1`;
+        3. List of unmatched elements from `list2`.
+    """
+    indexes_by_key1 = defaultdict(list)
+    for index, item in enumerate(list1):
+        indexes_by_key1[get_key(item)].append(index)
+
+    indexes_by_key2 = defaultdict(list)
+    for index, item in enumerate(list2):
+        indexes_by_key2[get_key(item)].append(index)
+
+    pairs = [
+        (None, indexes1[0], indexes_by_key2[key][0])
+        for key, indexes1 in indexes_by_key1.items()
+        if key is not None
+        and len(indexes1) == 1
+        and len(indexes_by_key2.get(key, ())) == 1
+    ]
+
+    return assign_pairs(list1, list2, pairs)
+
+
+def match_similar(
+    list1,
+    list2,
+    compute_similarity,
+    threshold=0.8,
+    generate_candidates=None,
+    batch=False,
+    processes=1,
+):
     """Match similar strings between two lists using a provided method.
 
+    Pairs are matched from the highest similarity to the lowest one. Pairs
+    with the same similarity are matched in the order of the lists.
+
     Args:
         list1 (list): Elements to match.
         list2 (list): Elements to match.
@@ -43,6 +102,21 @@ def match_similar(list1, list2, compute_similarity, threshold=0.8):
             0 low similarity).
         threshold (float): Only consider pairs with similarity higher than this
             value. Default is 0.8.
+        generate_candidates (function): Function taking as argument the first
+            list, the second list and the threshold. Should yield the pairs of
+            indexes of elements which similarity may be higher than the
+            threshold, other pairs are not considered. If not given, all pairs
+            are considered.
+        batch (bool): If `True`, `compute_similarity` is a function taking as
+            argument the first list, the second list and the threshold. It
+            should yield the similarity, the index in the first list and the
+            index in the second list of the pairs which similarity is higher
+            than the threshold. `generate_candidates` is not used.
+        processes (int): Number of processes to compute similarities. If
+            greater than 1, `list1` is divided in shards scored in parallel by
+            a pool of processes; `compute_similarity` and
+            `generate_candidates` must then be picklable. Not used in batch
+            mode, or if there are not enough pairs to compare.
 
     Returns:
         tuple of list: Contains 3 lists:
@@ -51,34 +125,120 @@ def match_similar(list1, list2, compute_similarity, threshold=0.8):
         2. List of unmatched elements from `list1`;
         3. List of unmatched elements from `list2`.
     """
-    items1 = list1.copy()
-    items2 = list2.copy()
-
     # Generate list of similarity for each pair of items
+    if batch:
+        pairs = [
+            (-similarity, index1, index2)
+            for similarity, index1, index2 in compute_similarity(
+                list1, list2, threshold
+            )
+        ]
+
+    elif processes > 1 and len(list1) * len(list2) >= PROCESSES_MINIMAL_PAIRS:
+        pairs = []
+        shard_size = math.ceil(len(list1) / (processes * SHARDS_PER_PROCESS))
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [
+                executor.submit(
+                    score_pairs,
+                    list1[start : start + shard_size],
+                    list2,
+                    compute_similarity,
+                    threshold,
+                    generate_candidates,
+                    start,
+                )
+                for start in range(0, len(list1), shard_size)
+            ]
+            for future in futures:
+                pairs.extend(future.result())
+
+    else:
+        pairs = score_pairs(
+            list1, list2, compute_similarity, threshold, generate_candidates
+        )
+
+    # Sort the pair of items with higher similarity first
+    pairs.sort()
+
+    return assign_pairs(list1, list2, pairs)
+
+
+def score_pairs(
+    list1, list2, compute_similarity, threshold, generate_candidates=None, offset=0
+):
+    """Compute the similarity of pairs of elements of two lists.
+
+    Args:
+        list1 (list): Elements to compare.
+        list2 (list): Elements to compare.
+        compute_similarity (function): Funtion taking as argument element from
+            first list and element from second list, and returning their
+            similarity.
+        threshold (float): Only keep pairs with similarity higher than this
+            value.
+        generate_candidates (function): Function taking as argument the first
+            list, the second list and the threshold, and yielding the pairs of
+            indexes of elements to compare. If not given, all pairs are
+            compared.
+        offset (int): Value added to indexes of the first list, when it is a
+            shard of a longer list.
+
+    Returns:
+        list of tuple: Pairs with a similarity higher than the threshold, each
+        one containing the opposite of the similarity, the index of the
+        element of the first list and the index of the element of the second
+        list.
+    """
+    if generate_candidates is None:
+        candidates = itertools.product(range(len(list1)), range(len(list2)))
+
+    else:
+        candidates = generate_candidates(list1, list2, threshold)
+
     pairs = []
-    for item1, item2 in itertools.product(items1, items2):
-        similarity = compute_similarity(item1, item2)
+    for index1, index2 in candidates:
+        similarity = compute_similarity(list1[index1], list2[index2])
         if similarity > threshold:
-            pairs.append({"similarity": similarity, "item1": item1, "item2": item2})
+            pairs.append((-similarity, index1 + offset, index2))
+
+    return pairs
 
-    # Sort the pair of items with higher similarity first
-    pairs.sort(key=lambda e: e["similarity"], reverse=True)
 
+def assign_pairs(list1, list2, pairs):
+    """Match elements of two lists following the order of the given pairs.
+
+    Args:
+        list1 (list): Elements to match.
+        list2 (list): Elements to match.
+        pairs (list of tuple): Sorted pairs, each one containing a sort key,
+            the index of the element of the first list and the index of the
+            element of the second list.
+
+    Returns:
+        tuple of list: Contains 3 lists:
+
+        1. List of tuple with matching elements from `list1` and `list2`;
+        2. List of unmatched elements from `list1`;
+        3. List of unmatched elements from `list2`.
+    """
     # Loop over all pairs and create match if elements not already matched with
     # a higher similarity element
     matched_elements = []
-    for pair in pairs:
-        item1 = pair["item1"]
-        item2 = pair["item2"]
-
-        if item1 not in items1 or item2 not in items2:
+    matched1 = set()
+    matched2 = set()
+    for _, index1, index2 in pairs:
+        if index1 in matched1 or index2 in matched2:
             # Element already matched with a higher similarity item
             continue
 
         # Create match
-        matched_elements.append((item1, item2))
-        # Remove matched elements from source lists
-        items1.remove(item1)
-        items2.remove(item2)
-
-    return matched_elements, items1, items2
+        matched_elements.append((list1[index1], list2[index2]))
+        matched1.add(index1)
+        matched2.add(index2)
+
+    return (
+        matched_elements,
+        [item for index, item in enumerate(list1) if index not in matched1],
+        [item for index, item in enumerate(list2) if index not in matched2],
+    )
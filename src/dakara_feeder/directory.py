@@ -1,56 +1,621 @@
 """List directoryes to extract song files."""
 
 import logging
-from itertools import groupby
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
 
 import filetype
+import pysubs2
+from dakara_base.exceptions import DakaraError
+from path import Path
 
 from dakara_feeder.subtitle.parsing import is_subtitle
 
 logger = logging.getLogger(__name__)
 
 
-def list_directory(path):
+CLASSIFICATION_EXTENSION = "extension"
+CLASSIFICATION_SNIFF = "sniff"
+CLASSIFICATION_HYBRID = "hybrid"
+CLASSIFICATION_MODES = (
+    CLASSIFICATION_EXTENSION,
+    CLASSIFICATION_SNIFF,
+    CLASSIFICATION_HYBRID,
+)
+
+# extensions listed in several types are ambiguous
+DEFAULT_EXTENSIONS = {
+    "video": [
+        ".avi",
+        ".flv",
+        ".m4v",
+        ".mkv",
+        ".mov",
+        ".mp4",
+        ".mpeg",
+        ".mpg",
+        ".ogg",
+        ".ogv",
+        ".webm",
+        ".wmv",
+    ],
+    "audio": [
+        ".aac",
+        ".flac",
+        ".m4a",
+        ".mp3",
+        ".oga",
+        ".ogg",
+        ".opus",
+        ".wav",
+        ".webm",
+        ".wma",
+    ],
+    "subtitle": list(pysubs2.formats.FILE_EXTENSION_TO_FORMAT_IDENTIFIER),
+    "other": [
+        ".bmp",
+        ".gif",
+        ".jpeg",
+        ".jpg",
+        ".json",
+        ".nfo",
+        ".png",
+        ".txt",
+        ".webp",
+        ".yaml",
+        ".yml",
+    ],
+}
+
+
+class FileClassifier:
+    """Classify files as video, audio, subtitle or other.
+
+    Three modes are available:
+
+    - "sniff": the type is guessed from the header of the file, which must be
+        read. This is the most reliable mode;
+    - "extension": the type is decided from the extension of the file only,
+        no file is read. Files with an unknown extension are considered as
+        other files;
+    - "hybrid": the type is decided from the extension of the file, the
+        header of the file is read only if the extension is unknown or
+        ambiguous.
+
+    Args:
+        mode (str): Mode of classification.
+        extensions (dict): Extensions for each type of file ("video",
+            "audio", "subtitle" and "other"). Types that are not given use
+            the default extensions. An extension listed in several types is
+            ambiguous.
+
+    Attributes:
+        mode (str): Mode of classification.
+        types_by_extension (dict): Types of file for each lower case
+            extension.
+
+    Raises:
+        InvalidClassificationModeError: If the mode is unknown.
+    """
+
+    TYPES = ("video", "audio", "subtitle", "other")
+
+    def __init__(self, mode=CLASSIFICATION_SNIFF, extensions=None):
+        if mode not in CLASSIFICATION_MODES:
+            raise InvalidClassificationModeError(
+                "Invalid classification mode '{}', must be one of {}".format(
+                    mode, ", ".join(CLASSIFICATION_MODES)
+                )
+            )
+
+        self.mode = mode
+
+        # create the lookup table of extensions
+        extensions = {**DEFAULT_EXTENSIONS, **(extensions or {})}
+        self.types_by_extension = {}
+        for file_type in self.TYPES:
+            for extension in extensions.get(file_type) or []:
+                self.types_by_extension.setdefault(extension.lower(), []).append(
+                    file_type
+                )
+
+    def get_signature(self):
+        """Get a description of the classification.
+
+        Two classifiers with the same signature classify files the same way.
+
+        Returns:
+            dict: JSON-compliant description of the classification.
+        """
+        return {"mode": self.mode, "extensions": self.types_by_extension}
+
+    def classify(self, file, path):
+        """Get the type of a file.
+
+        Args:
+            file (path.Path): Path to the file, relative to the scanned
+                directory.
+            path (path.Path): Path of the scanned directory.
+
+        Returns:
+            str: Type of the file, either "video", "audio", "subtitle" or
+            "other".
+        """
+        file_type = self.classify_by_extension(file)
+        if file_type is not None:
+            return file_type
+
+        return self.classify_by_header(file, path)
+
+    def classify_by_extension(self, file):
+        """Get the type of a file without reading it, if possible.
+
+        Args:
+            file (path.Path): Path to the file.
+
+        Returns:
+            str: Type of the file, either "video", "audio", "subtitle" or
+            "other", or `None` if the header of the file must be read.
+        """
+        if self.mode == CLASSIFICATION_SNIFF:
+            return None
+
+        types = self.types_by_extension.get(file.ext.lower(), [])
+
+        if len(types) == 1:
+            return types[0]
+
+        if self.mode == CLASSIFICATION_EXTENSION:
+            return types[0] if types else "other"
+
+        return None
+
+    def classify_by_header(self, file, path):
+        """Get the type of a file by reading its header.
+
+        Args:
+            file (path.Path): Path to the file, relative to the scanned
+                directory.
+            path (path.Path): Path of the scanned directory.
+
+        Returns:
+            str: Type of the file, either "video", "audio", "subtitle" or
+            "other".
+        """
+        maintype = get_main_type(path / file)
+
+        if maintype in ("video", "audio"):
+            return maintype
+
+        if is_subtitle(file):
+            return "subtitle"
+
+        return "other"
+
+
+def list_directory(path, classifier=None, scan_cache=None, workers=1):
     """List song files in given directory recursively.
 
     Args:
         path (path.Path): Path of directory to scan.
+        classifier (FileClassifier): Classifier of files. By default, files
+            are classified by reading their header.
+        scan_cache (dakara_feeder.cache.ScanCache): Cache of previous scans.
+            If given, directories that have not changed are not listed again.
+        workers (int): Number of file system operations to run at the same
+            time. If greater than 1, see `scan_directory_parallel`.
 
     Returns:
         list of SongPaths: Paths of the files for each song. Paths are relative
-        to the given path.
+        to the given path. Directories are given depth first, in alphabetical
+        order.
     """
     logger.debug("Listing '%s'", path)
-    files_list = [p.relpath(path) for p in path.walkfiles()]
-    files_list.sort(key=lambda f: (get_path_without_extension(f), f))
-    logger.debug("Listed %i files", len(files_list))
+    files_count = 0
+    songs_by_directory = []
+    for directory, directory_files_count, songs in scan_directory(
+        path, classifier, scan_cache, workers
+    ):
+        files_count += directory_files_count
+        songs_by_directory.append((directory, songs))
 
-    listing = [
-        item
-        for _, files in groupby(files_list, get_path_without_extension)
-        for item in group_by_type(files, path)
-    ]
+    # directories scanned in parallel are not in order
+    if workers > 1:
+        songs_by_directory.sort(key=lambda item: item[0].split(os.sep))
+
+    listing = [song for _, songs in songs_by_directory for song in songs]
 
+    logger.debug("Listed %i files", files_count)
     logger.debug("Found %i different videos", len(listing))
 
     return listing
 
 
-def get_path_without_extension(path):
-    """Remove extension from file path.
+def walk_directory(path, classifier=None, scan_cache=None, workers=1):
+    """Yield song files in given directory recursively.
+
+    Songs are yielded as soon as the directory containing them has been
+    scanned, so the memory used only depends on the size of the largest
+    directory.
 
     Args:
-        path (path.Path): Path to a file.
+        path (path.Path): Path of directory to scan.
+        classifier (FileClassifier): Classifier of files. By default, files
+            are classified by reading their header.
+        scan_cache (dakara_feeder.cache.ScanCache): Cache of previous scans.
+            If given, directories that have not changed are not listed again.
+        workers (int): Number of file system operations to run at the same
+            time. If greater than 1, directories are not given in order.
+
+    Yield:
+        SongPaths: Paths of the files for each song. Paths are relative to the
+        given path.
+    """
+    for _, _, songs in scan_directory(path, classifier, scan_cache, workers):
+        yield from songs
+
+
+def scan_directory(path, classifier=None, scan_cache=None, workers=1):
+    """Yield the songs of given directory recursively, directory by directory.
+
+    Directories are traversed depth first, in alphabetical order. If several
+    workers are requested, the directory is scanned by
+    `scan_directory_parallel` instead.
+
+    If a scan cache is given, a directory which modification time has not
+    changed since the previous scan is not listed again: its sub directories
+    and its songs are taken from the cache. Note that the modification time of
+    a directory changes only when files are added, removed or renamed in it.
+
+    Args:
+        path (path.Path): Path of directory to scan.
+        classifier (FileClassifier): Classifier of files. By default, files
+            are classified by reading their header.
+        scan_cache (dakara_feeder.cache.ScanCache): Cache of previous scans.
+        workers (int): Number of file system operations to run at the same
+            time.
+
+    Yield:
+        tuple: Contains:
+
+        1. path.Path: Path of a directory, relative to the given path;
+        2. int: Number of files in this directory;
+        3. list of SongPaths: Paths of the files for each song of this
+            directory.
+    """
+    if workers > 1:
+        yield from scan_directory_parallel(path, classifier, scan_cache, workers)
+        return
+
+    pending_directories = [Path("")]
+    while pending_directories:
+        directory = pending_directories.pop()
+
+        # try to get the directory from the cache
+        cached = None
+        if scan_cache is not None:
+            mtime = os.stat(path / directory).st_mtime_ns
+            cached = scan_cache.get(directory, mtime)
+
+        if cached is not None:
+            subdirectories, files_count, songs = cached
+
+        else:
+            names, subdirectories = list_entries(path / directory)
+            files_count = len(names)
+            songs = group_directory(directory, names, path, classifier)
+
+            if scan_cache is not None:
+                scan_cache.set(directory, mtime, subdirectories, files_count, songs)
+
+        # traverse sub directories in alphabetical order
+        pending_directories.extend(
+            directory / name for name in sorted(subdirectories, reverse=True)
+        )
+
+        yield directory, files_count, songs
+
+
+class PendingDirectory:
+    """Directory being scanned in parallel.
+
+    Args:
+        directory (path.Path): Path of the directory, relative to the scanned
+            directory.
+        mtime (int): Modification time of the directory in nanoseconds, if
+            known.
+        names (list of str): Names of the files in the directory.
+        subdirectories (list of str): Names of the sub directories.
+
+    Attributes:
+        directory (path.Path): Path of the directory, relative to the scanned
+            directory.
+        mtime (int): Modification time of the directory in nanoseconds, if
+            known.
+        names (list of str): Names of the files in the directory.
+        subdirectories (list of str): Names of the sub directories.
+        types (dict): Type of the files which header has been read, by path
+            relative to the scanned directory.
+        remaining (int): Number of files which header remains to be read.
+    """
+
+    def __init__(self, directory, mtime, names, subdirectories):
+        self.directory = directory
+        self.mtime = mtime
+        self.names = names
+        self.subdirectories = subdirectories
+        self.types = {}
+        self.remaining = 0
+
+
+def scan_directory_parallel(path, classifier=None, scan_cache=None, workers=2):
+    """Yield the songs of given directory recursively, using several threads.
+
+    This is useful on network file systems, where each operation waits for
+    the server. Getting the modification time of directories, listing
+    directories and reading the header of files are run by a pool of
+    threads, so that several of them wait for the server at the same time.
+    The scan cache and the grouping of files by song are only used in the
+    calling thread. Operations are submitted lazily, so that no more than
+    twice the number of workers operations are pending.
+
+    Args:
+        path (path.Path): Path of directory to scan.
+        classifier (FileClassifier): Classifier of files. By default, files
+            are classified by reading their header.
+        scan_cache (dakara_feeder.cache.ScanCache): Cache of previous scans.
+        workers (int): Number of operations to run at the same time.
+
+    Yield:
+        tuple: Contains the path of a directory relative to the given path,
+        the number of files in this directory and the list of `SongPaths` of
+        this directory, like `scan_directory`, but directories are given in
+        the order they are scanned.
+    """
+    if classifier is None:
+        classifier = FileClassifier()
+
+    # iterators of operations to run, each one is a function to call in the
+    # pool, and a function to call with its result in the calling thread
+    operations = deque()
+    scanned = deque()
+
+    def schedule(function, callback):
+        operations.append(iter([(function, callback)]))
+
+    def visit(directory):
+        if scan_cache is None:
+            schedule(
+                partial(list_entries, path / directory),
+                partial(on_listed, directory, None),
+            )
+            return
+
+        schedule(partial(get_mtime, path / directory), partial(on_mtime, directory))
+
+    def on_mtime(directory, mtime):
+        cached = scan_cache.get(directory, mtime)
+        if cached is None:
+            schedule(
+                partial(list_entries, path / directory),
+                partial(on_listed, directory, mtime),
+            )
+            return
+
+        subdirectories, files_count, songs = cached
+        on_scanned(directory, subdirectories, files_count, songs)
+
+    def on_listed(directory, mtime, entries):
+        names, subdirectories = entries
+        pending = PendingDirectory(directory, mtime, names, subdirectories)
+
+        # only files which type cannot be decided by their extension are read
+        directory_str = str(directory)
+        files = [
+            file
+            for file in (Path(os.path.join(directory_str, name)) for name in names)
+            if classifier.classify_by_extension(file) is None
+        ]
+        pending.remaining = len(files)
+
+        if not files:
+            on_classified(pending)
+            return
+
+        operations.append(
+            (
+                partial(classifier.classify_by_header, file, path),
+                partial(on_header, pending, file),
+            )
+            for file in files
+        )
+
+    def on_header(pending, file, file_type):
+        pending.types[file] = file_type
+        pending.remaining -= 1
+
+        if pending.remaining == 0:
+            on_classified(pending)
+
+    def on_classified(pending):
+        songs = group_directory(
+            pending.directory, pending.names, path, classifier, pending.types
+        )
+
+        if scan_cache is not None:
+            scan_cache.set(
+                pending.directory,
+                pending.mtime,
+                pending.subdirectories,
+                len(pending.names),
+                songs,
+            )
+
+        on_scanned(pending.directory, pending.subdirectories, len(pending.names), songs)
+
+    def on_scanned(directory, subdirectories, files_count, songs):
+        scanned.append((directory, files_count, songs))
+        for name in sorted(subdirectories):
+            visit(directory / name)
+
+    visit(Path(""))
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while operations or running:
+                # submit operations until enough are pending
+                while operations and len(running) < workers * 2:
+                    operation = next(operations[0], None)
+                    if operation is None:
+                        operations.popleft()
+                        continue
+
+                    function, callback = operation
+                    running[executor.submit(function)] = callback
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.pop(future)(future.result())
+
+                while scanned:
+                    yield scanned.popleft()
+
+        finally:
+            # do not wait for operations that will never be used
+            for future in running:
+                future.cancel()
+
+
+def get_mtime(path):
+    """Get the modification time of a file or a directory.
+
+    Args:
+        path (path.Path): Path of the file or the directory.
 
     Returns:
-        path.Path: Path to the file without the extension.
+        int: Modification time in nanoseconds.
+    """
+    return os.stat(path).st_mtime_ns
 
-    Example:
 
-    >>> get_path_without_extension(Path("directory/file0.mkv"))
-    ... Path('directory/file0')
+def get_mount_point(path):
+    """Get the mount point of the file system containing a path.
+
+    Args:
+        path (path.Path): Path of a file or a directory.
+
+    Returns:
+        path.Path: Absolute path of the mount point.
     """
-    return path.dirname() / path.stem
+    path = Path(path).realpath()
+    while not path.ismount():
+        parent = path.parent
+        if parent == path:
+            break
+
+        path = parent
+
+    return path
+
+
+def get_scan_workers(path, workers=1, mounts=None):
+    """Get the number of file system operations to run at the same time.
+
+    Args:
+        path (path.Path): Path of the scanned directory.
+        workers (int): Default number of operations.
+        mounts (dict): Number of operations for some mount points, by path of
+            the mount point. The mount point of the scanned directory is
+            looked for in it.
+
+    Returns:
+        int: Number of operations to run at the same time.
+    """
+    if not mounts:
+        return workers
+
+    mount_point = get_mount_point(path)
+    for mount_path, mount_workers in mounts.items():
+        if Path(mount_path).realpath() == mount_point:
+            logger.debug(
+                "Scanning mount point '%s' with %i workers",
+                mount_point,
+                mount_workers,
+            )
+            return mount_workers
+
+    return workers
+
+
+def list_entries(path):
+    """List the files and the sub directories of a directory.
+
+    Args:
+        path (path.Path): Path of the directory.
+
+    Returns:
+        tuple: Contains:
+
+        1. list of str: Names of the files;
+        2. list of str: Names of the sub directories.
+    """
+    names = []
+    subdirectories = []
+
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                subdirectories.append(entry.name)
+                continue
+
+            names.append(entry.name)
+
+    return names, subdirectories
+
+
+def group_directory(directory, names, path, classifier=None, types=None):
+    """Group the files of one directory by song.
+
+    Files are grouped in one pass by their name without extension, which is
+    computed once per file. Only the groups are sorted, so that songs are
+    given in a stable order.
+
+    Args:
+        directory (path.Path): Path of the directory, relative to the scanned
+            directory.
+        names (list of str): Names of the files in the directory.
+        path (path.Path): Path of the scanned directory.
+        classifier (FileClassifier): Classifier of files. By default, files
+            are classified by reading their header.
+        types (dict): Type of files already classified, by path relative to
+            the scanned directory. Other files are classified by the
+            classifier.
+
+    Returns:
+        list of SongPaths: Paths of the files for each song.
+    """
+    names_by_stem = {}
+    for name in names:
+        names_by_stem.setdefault(os.path.splitext(name)[0], []).append(name)
+
+    # join paths as strings, to create each path object once
+    directory_str = str(directory)
+
+    return [
+        item
+        for stem in sorted(names_by_stem)
+        for item in group_by_type(
+            [
+                Path(os.path.join(directory_str, name))
+                for name in sorted(names_by_stem[stem])
+            ],
+            path,
+            classifier,
+            types,
+        )
+    ]
 
 
 def get_main_type(file):
@@ -71,37 +636,36 @@ def get_main_type(file):
     return maintype
 
 
-def group_by_type(files, path):
-    """Group files by extension.
+def group_by_type(files, path, classifier=None, types=None):
+    """Group files by type.
 
     Args:
         files (list of path.Path): List of relative path to the files to group.
         path (path.Path): Path of directory to scan.
+        classifier (FileClassifier): Classifier of files. By default, files
+            are classified by reading their header.
+        types (dict): Type of files already classified, by relative path.
+            Other files are classified by the classifier.
 
     Returns:
         list of SongPaths: Paths of the files for each song.
     """
-    # sort files by their extension
-    videos = []
-    audios = []
-    subtitles = []
-    others = []
-    for file in files:
-        maintype = get_main_type(path / file)
+    if classifier is None:
+        classifier = FileClassifier()
 
-        if maintype == "video":
-            videos.append(file)
-            continue
+    # sort files by their type
+    files_by_type = {file_type: [] for file_type in FileClassifier.TYPES}
+    for file in files:
+        file_type = types.get(file) if types else None
+        if file_type is None:
+            file_type = classifier.classify(file, path)
 
-        if maintype == "audio":
-            audios.append(file)
-            continue
+        files_by_type[file_type].append(file)
 
-        if is_subtitle(file):
-            subtitles.append(file)
-            continue
-
-        others.append(file)
+    videos = files_by_type["video"]
+    audios = files_by_type["audio"]
+    subtitles = files_by_type["subtitle"]
+    others = files_by_type["other"]
 
     # check there is at least one video
     if len(videos) == 0:
@@ -132,26 +696,125 @@ def group_by_type(files, path):
 class SongPaths:
     """Paths of files related to a song.
 
+    Instances are immutable. Paths are stored as plain strings, and are
+    converted to `path.Path` objects only when accessed. Hashing and equality
+    rely on the tuple of these strings.
+
+    Args:
+        video (str): Path to the video file.
+        audio (str): Path to the audio file.
+        subtitle (str): Path to the subtitle file.
+        others (iterable of str): Paths of other files.
+
     Attributes:
         video (path.Path): Path to the video file.
         audio (path.Path): Path to the audio file.
         subtitle (path.Path): Path to the subtitle file.
         others (list of path.Path): Paths of other files.
+        video_str (str): Path to the video file, as stored.
+        audio_str (str): Path to the audio file, as stored.
+        subtitle_str (str): Path to the subtitle file, as stored.
+        others_str (tuple of str): Paths of other files, as stored.
     """
 
+    __slots__ = ("video_str", "audio_str", "subtitle_str", "others_str")
+
     def __init__(self, video, audio=None, subtitle=None, others=None):
-        self.video = video
-        self.audio = audio
-        self.subtitle = subtitle
-        self.others = [] if others is None else others
+        object.__setattr__(self, "video_str", str(video))
+        object.__setattr__(self, "audio_str", None if audio is None else str(audio))
+        object.__setattr__(
+            self, "subtitle_str", None if subtitle is None else str(subtitle)
+        )
+        object.__setattr__(
+            self,
+            "others_str",
+            () if others is None else tuple(str(other) for other in others),
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SongPaths is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("SongPaths is immutable")
+
+    def __reduce__(self):
+        return self.__class__, self.as_tuple()
+
+    @property
+    def video(self):
+        return Path(self.video_str)
+
+    @property
+    def audio(self):
+        return None if self.audio_str is None else Path(self.audio_str)
+
+    @property
+    def subtitle(self):
+        return None if self.subtitle_str is None else Path(self.subtitle_str)
+
+    @property
+    def others(self):
+        return [Path(other) for other in self.others_str]
+
+    def as_tuple(self):
+        """Get the paths as plain strings.
+
+        Returns:
+            tuple: Paths of the video, audio and subtitle files, or `None` if
+            there is no such file, then tuple of paths of other files.
+        """
+        return self.video_str, self.audio_str, self.subtitle_str, self.others_str
+
+    def with_prefix(self, prefix):
+        """Get the paths of the song inside a directory.
+
+        Args:
+            prefix (str): Directory to prepend to the paths.
+
+        Returns:
+            SongPaths: Paths of the song, prefixed by the directory.
+        """
+        video, audio, subtitle, others = self.as_tuple()
+
+        return SongPaths(
+            os.path.join(prefix, video),
+            None if audio is None else os.path.join(prefix, audio),
+            None if subtitle is None else os.path.join(prefix, subtitle),
+            [os.path.join(prefix, other) for other in others],
+        )
+
+    def without_prefix(self, prefix):
+        """Get the paths of the song relative to a directory containing it.
+
+        Args:
+            prefix (str): Directory to remove from the paths.
+
+        Returns:
+            SongPaths: Paths of the song, relative to the directory.
+        """
+        video, audio, subtitle, others = self.as_tuple()
+
+        return SongPaths(
+            os.path.relpath(video, prefix),
+            None if audio is None else os.path.relpath(audio, prefix),
+            None if subtitle is None else os.path.relpath(subtitle, prefix),
+            [os.path.relpath(other, prefix) for other in others],
+        )
 
     def __eq__(self, other):
-        return self.__hash__() == other.__hash__()
+        if not isinstance(other, SongPaths):
+            return NotImplemented
+
+        return self.as_tuple() == other.as_tuple()
 
     def __hash__(self):
-        return hash(str(self))
+        return hash(self.as_tuple())
 
     def __repr__(self):
         return "video: {}, audio: {}, subtitle: {}, others: {}".format(
-            self.video, self.audio, self.subtitle, self.others
+            self.video_str, self.audio_str, self.subtitle_str, list(self.others_str)
         )
+
+
+class InvalidClassificationModeError(DakaraError):
+    """Error raised when the mode of classification of files is unknown."""
@@ -1,24 +1,73 @@
 """Feeder for songs."""
 
+import asyncio
+import hashlib
 import logging
+from collections import deque
 
+from dakara_base.directory import directories
 from dakara_base.exceptions import DakaraError
 from dakara_base.progress_bar import null_bar, progress_bar
 from path import Path
 
+from dakara_feeder.cache import (
+    FingerprintCache,
+    MetadataCache,
+    ScanCache,
+    get_file_fingerprint,
+)
 from dakara_feeder.customization import get_custom_song
-from dakara_feeder.difference import generate_diff, match_similar
-from dakara_feeder.directory import list_directory
-from dakara_feeder.similarity import calculate_file_path_similarity
+from dakara_feeder.difference import match_identical, match_similar
+from dakara_feeder.directory import (
+    CLASSIFICATION_SNIFF,
+    FileClassifier,
+    get_scan_workers,
+    group_directory,
+    list_directory,
+    list_entries,
+)
+from dakara_feeder.index import SongsIndex
+from dakara_feeder.journal import Journal, get_song_video_path
+from dakara_feeder.kara_folder import KaraFolder
+from dakara_feeder.similarity import (
+    SIMILARITY_METHODS,
+    SIMILARITY_SEQUENCE_MATCHER,
+    SIMILARITY_TRIGRAM,
+    InvalidSimilarityMethodError,
+    calculate_file_path_similarities,
+    calculate_file_path_similarity,
+    check_numpy,
+    generate_file_path_candidates,
+)
 from dakara_feeder.song import BaseSong
-from dakara_feeder.utils import divide_chunks
+from dakara_feeder.tools import registry
+from dakara_feeder.utils import (
+    AdaptiveChunker,
+    divide_chunks,
+    get_available_cpu_count,
+    map_concurrently,
+    run_concurrently,
+)
 from dakara_feeder.version import check_version
-from dakara_feeder.web_client import HTTPClientDakara
+from dakara_feeder.watch import DEBOUNCE, POLLING_INTERVAL, WatcherError, get_watcher
+from dakara_feeder.web_client import (
+    AsyncHTTPClientDakara,
+    HTTPClientDakara,
+    SongsCountMismatchError,
+)
 
 logger = logging.getLogger(__name__)
 
 
 SONGS_PER_CHUNK = 100
+SIMILARITY_THRESHOLD = 0.8
+PARSE_WORKERS = 1
+CACHE_DIRECTORY_NAME = "feeder"
+TOOLS_CACHE_FILE = "tools.json"
+METADATA_CACHE_FILE = "metadata_{}_{}.sqlite"
+SCAN_CACHE_FILE = "scan_{}.json"
+FINGERPRINT_CACHE_FILE = "fingerprints_{}.sqlite"
+JOURNAL_FILE = "journal_{}.jsonl"
 
 
 class SongsFeeder:
@@ -31,30 +80,118 @@ class SongsFeeder:
         prune (bool): If `True`, artists and works without songs are deleted at
             the end.
         progress (bool): If `True`, a progress bar is displayed during long tasks.
+        parse_workers (int): Number of songs to parse at the same time. If not
+            given, the value is taken from the config.
+        rescan (bool): If `True`, the whole kara folder is scanned again even
+            if the scan cache is enabled.
 
     Attributes:
         http_client (web_client.HTTPClientDakara): Client for the Dakara server.
-        kara_folder_path (path.Path): Path to the scanned folder containing karaoke
-            files.
-        songs_per_chunk (int): Number of songs per chunk to send to server when
-            creating songs.
+        kara_folder (dakara_feeder.kara_folder.KaraFolder): Roots of the
+            scanned folder containing karaoke files.
+        songs_per_chunk (int): Maximum number of songs per chunk to send to
+            server when creating songs.
+        chunker (dakara_feeder.utils.AdaptiveChunker): Divider of songs to
+            create in chunks.
+        parse_workers (int): Number of songs to parse at the same time. Parsing
+            is done in threads, so the custom song class must be thread safe
+            when this value is greater than 1.
         bar (function): Progress bar to use.
         song_class_module_name (str): Module name of the custom song class to
             use.
         song_class (type): Custom song class to use. Must be a subclass of
             `dakara_feeder.song.BaseSong`.
+        cache_config (dict): Config of the caches.
+        metadata_cache (dakara_feeder.cache.MetadataCache): Cache of metadata
+            of video files, if enabled.
+        fingerprint_cache (dakara_feeder.cache.FingerprintCache): Cache of
+            fingerprints of video files, if enabled.
+        journal (dakara_feeder.journal.Journal): Journal of songs being
+            created on the server, if enabled.
+        classifier (dakara_feeder.directory.FileClassifier): Classifier of
+            files found in the kara folder.
+        scan_workers (int): Number of file system operations to run at the
+            same time when scanning the kara folder.
+        scan_mounts (dict): Number of file system operations to run at the
+            same time, by mount point.
+        watch_config (dict): Config of the watch mode.
+        rename_config (dict): Config of the detection of renamed songs.
+        similarity_method (str): Method to compute the similarity of paths of
+            songs, see `dakara_feeder.similarity.SIMILARITY_METHODS`.
+        similarity_processes (int): Number of processes to compute the
+            similarity of paths of songs pair by pair.
+        songs_index (dakara_feeder.index.SongsIndex): ID of songs on the
+            server, by path. Updated as songs are added, updated or deleted.
+        songs_index_stale (bool): If `True`, the ID of some songs on the server
+            are not known by the index.
+        rejected_songs (list of tuple): Representation of each song rejected
+            by the server during the last synchronization, with the error it
+            caused.
+        rejected_videos (set of str): Paths of the video of songs rejected
+            by the server during the last synchronization.
     """
 
-    def __init__(self, config, force_update=False, prune=True, progress=True):
+    def __init__(
+        self,
+        config,
+        force_update=False,
+        prune=True,
+        progress=True,
+        parse_workers=None,
+        rescan=False,
+    ):
         # create objects
         self.http_client = HTTPClientDakara(config["server"], endpoint_prefix="api")
-        self.kara_folder_path = Path(config["kara_folder"])
+        self.kara_folder = KaraFolder.from_config(config["kara_folder"])
         self.force_update = force_update
         self.prune = prune
+        self.rescan = rescan
         self.songs_per_chunk = config["server"].get("songs_per_chunk", SONGS_PER_CHUNK)
+        self.chunker = AdaptiveChunker.from_config(
+            config["server"], self.songs_per_chunk
+        )
+        self.parse_workers = parse_workers or config.get("parse_workers", PARSE_WORKERS)
         self.bar = progress_bar if progress else null_bar
         self.song_class_module_name = config.get("custom_song_class")
         self.song_class = BaseSong
+        self.cache_config = config.get("cache") or {}
+        self.metadata_cache = None
+        self.fingerprint_cache = None
+        self.journal = None
+        self.watch_config = config.get("watch") or {}
+        self.rename_config = config.get("rename_detection") or {}
+
+        # check method to compute similarity of paths
+        self.similarity_method = self.rename_config.get(
+            "method", SIMILARITY_SEQUENCE_MATCHER
+        )
+        if self.similarity_method not in SIMILARITY_METHODS:
+            raise InvalidSimilarityMethodError(
+                "Invalid similarity method '{}', must be one of {}".format(
+                    self.similarity_method, ", ".join(SIMILARITY_METHODS)
+                )
+            )
+
+        if self.similarity_method == SIMILARITY_TRIGRAM:
+            check_numpy()
+
+        # get number of processes to compute similarity of paths
+        self.similarity_processes = self.rename_config.get("processes", 1)
+        if self.similarity_processes == "auto":
+            self.similarity_processes = get_available_cpu_count()
+        self.songs_index = SongsIndex()
+        self.songs_index_stale = False
+        self.rejected_songs = []
+        self.rejected_videos = set()
+
+        # create files classifier
+        scan_config = config.get("scan") or {}
+        self.classifier = FileClassifier(
+            scan_config.get("classification", CLASSIFICATION_SNIFF),
+            scan_config.get("extensions"),
+        )
+        self.scan_workers = scan_config.get("workers", 1)
+        self.scan_mounts = scan_config.get("mounts") or {}
 
     def load(self):
         """Execute side-effect initialization tasks."""
@@ -68,115 +205,1023 @@ class SongsFeeder:
         # check directory exists
         self.check_kara_folder_path()
 
+        # store detection of external tools
+        if self.cache_config.get("tools"):
+            registry.set_cache_path(
+                directories.user_cache_dir / CACHE_DIRECTORY_NAME / TOOLS_CACHE_FILE
+            )
+
+        # open cache of metadata, specific to the kara folder and to the
+        # metadata parser
+        if self.cache_config.get("metadata"):
+            self.metadata_cache = MetadataCache(
+                directories.user_cache_dir
+                / CACHE_DIRECTORY_NAME
+                / METADATA_CACHE_FILE.format(
+                    self.get_kara_folder_digest(),
+                    self.song_class.metadata_class.__name__,
+                )
+            )
+            self.metadata_cache.open()
+
+        # open cache of fingerprints
+        if self.rename_config.get("fingerprint"):
+            self.fingerprint_cache = FingerprintCache(
+                directories.user_cache_dir
+                / CACHE_DIRECTORY_NAME
+                / FINGERPRINT_CACHE_FILE.format(self.get_kara_folder_digest())
+            )
+            self.fingerprint_cache.open()
+
+        # open journal of songs being created
+        if self.cache_config.get("journal"):
+            self.journal = Journal(
+                directories.user_cache_dir
+                / CACHE_DIRECTORY_NAME
+                / JOURNAL_FILE.format(self.get_kara_folder_digest()),
+                {
+                    "root": self.kara_folder.get_identifier(),
+                    "song_class": self.song_class_module_name,
+                },
+            )
+            self.journal.open()
+
         # authenticate to server
         self.http_client.load()
         self.http_client.authenticate()
 
+    def close(self):
+        """Release the resources opened by the feeder.
+
+        The caches are saved and closed, the journal is closed keeping its
+        content, and the connections kept alive with the server are closed.
+        """
+        if self.metadata_cache is not None:
+            self.metadata_cache.close()
+
+        if self.fingerprint_cache is not None:
+            self.fingerprint_cache.close()
+
+        if self.journal is not None:
+            self.journal.close()
+
+        self.http_client.close()
+
     def check_kara_folder_path(self):
         """Check the kara folder is valid.
 
         Raises:
-            KaraFolderNotFound: If the karaoke folder does not exist.
+            KaraFolderNotFound: If a root of the karaoke folder does not exist.
         """
-        if not self.kara_folder_path.isdir():
-            raise KaraFolderNotFound(
-                "Karaoke folder '{}' does not exist".format(self.kara_folder_path)
-            )
+        for root in self.kara_folder.roots:
+            if not root.path.isdir():
+                raise KaraFolderNotFound(
+                    "Karaoke folder '{}' does not exist".format(root.path)
+                )
+
+    def get_kara_folder_digest(self, root=None):
+        """Get a short digest identifying the kara folder or one of its roots.
+
+        It is used to name files specific to the kara folder or to the root.
+
+        Args:
+            root (dakara_feeder.kara_folder.KaraRoot): Root of the kara
+                folder. If not given, the digest identifies the whole kara
+                folder.
+
+        Returns:
+            str: Digest of the absolute path of the root, or of the roots of
+            the kara folder.
+        """
+        identifier = (
+            self.kara_folder.get_identifier()
+            if root is None
+            else str(root.path.abspath())
+        )
+
+        return hashlib.sha1(identifier.encode()).hexdigest()[:16]
+
+    def get_scan_cache(self, root):
+        """Create the scan cache of a root of the kara folder, if enabled.
+
+        Args:
+            root (dakara_feeder.kara_folder.KaraRoot): Root of the kara
+                folder.
+
+        Returns:
+            dakara_feeder.cache.ScanCache: Scan cache, loaded unless a full
+            scan is requested. `None` if the scan cache is disabled.
+        """
+        if not self.cache_config.get("scan"):
+            return None
+
+        # there is one cache file per root
+        scan_cache = ScanCache(
+            directories.user_cache_dir
+            / CACHE_DIRECTORY_NAME
+            / SCAN_CACHE_FILE.format(self.get_kara_folder_digest(root)),
+            root.path.abspath(),
+            self.classifier.get_signature(),
+        )
+
+        if not self.rescan:
+            scan_cache.load()
+
+        return scan_cache
+
+    def get_song(self, song_paths):
+        """Create the song object of a song.
+
+        The song is created relatively to the root of the kara folder
+        containing it.
+
+        Args:
+            song_paths (directory.SongPaths): Paths of the song files,
+                relative to the kara folder.
+
+        Returns:
+            dakara_feeder.song.BaseSong: Song object.
+        """
+        root, root_song_paths = self.kara_folder.get_song_paths(song_paths)
+        song = self.song_class(root.path, root_song_paths)
+        song.metadata_cache = self.metadata_cache
+        song.prefix = root.prefix
+
+        return song
+
+    def get_song_representation(self, song_paths):
+        """Parse a song and get its representation.
+
+        Args:
+            song_paths (directory.SongPaths): Paths of the song files.
+
+        Returns:
+            dict: JSON-compiliant structure representing the song.
+        """
+        return self.get_song(song_paths).get_representation()
+
+    def get_journaled_song_representation(self, song_paths):
+        """Parse a song to create and get its representation.
+
+        If the journal is enabled, the representation is taken from it if the
+        song was parsed by an interrupted run, and stored in it otherwise.
+
+        Args:
+            song_paths (directory.SongPaths): Paths of the song files.
+
+        Returns:
+            dict: JSON-compiliant structure representing the song.
+        """
+        if self.journal is None:
+            return self.get_song_representation(song_paths)
+
+        root, root_song_paths = self.kara_folder.get_song_paths(song_paths)
+        song = self.journal.get(root.path, root_song_paths, root.prefix)
+        if song is None:
+            song = self.get_song_representation(song_paths)
+            self.journal.add(root.path, root_song_paths, song, root.prefix)
+
+        return song
+
+    def parse_songs(self, songs_paths, text, journaled=False):
+        """Parse songs concurrently.
+
+        Representations are given in the same order as the given songs, as
+        soon as they are ready.
+
+        Args:
+            songs_paths (list of directory.SongPaths): Paths of the songs files.
+            text (str): Text to display in the progress bar.
+            journaled (bool): If `True`, use the journal of songs being
+                created.
+
+        Returns:
+            iterator of dict: Representations of the songs.
+        """
+        return self.bar(
+            map_concurrently(
+                (
+                    self.get_journaled_song_representation
+                    if journaled
+                    else self.get_song_representation
+                ),
+                songs_paths,
+                self.parse_workers,
+            ),
+            text=text,
+            max_value=len(songs_paths),
+        )
+
+    def add_songs(self, songs_paths):
+        """Parse songs and create them on the server.
+
+        Parsing and uploading are pipelined: each chunk of songs is sent in
+        the background as soon as it is parsed, while the next songs are
+        parsed. Only a few chunks wait to be sent, so that memory usage does
+        not depend on the number of songs. The size of chunks is adapted to
+        the response time of the server.
+
+        Songs rejected by the server are quarantined, and the other songs of
+        their chunk are created anyway.
+
+        If the journal is enabled, parsed songs and chunks acknowledged by the
+        server are written to it.
+
+        Args:
+            songs_paths (list of directory.SongPaths): Paths of the songs files.
+        """
+        # chunks waiting for their response, in order
+        songs_chunks = deque()
+
+        def divide_chunks():
+            for songs_chunk in self.chunker.divide(
+                self.parse_songs(songs_paths, text="Adding songs", journaled=True)
+            ):
+                songs_chunks.append(songs_chunk)
+                yield songs_chunk
+
+        for response in self.http_client.post_songs(
+            divide_chunks(),
+            on_sent=self.chunker.record,
+            on_rejected=self.quarantine_song,
+        ):
+            songs_chunk = songs_chunks.popleft()
+            self.index_created_songs(response)
+
+            self.acknowledge_songs(songs_chunk)
 
     def feed(self):
         """Execute the feeding action."""
         # get list of songs on the server
-        old_songs = self.http_client.retrieve_songs()
-        logger.info("Found %i songs in server", len(old_songs))
-
-        old_songs_id_by_path = {song["path"]: song["id"] for song in old_songs}
-        old_songs_path = list(old_songs_id_by_path.keys())
+        self.retrieve_songs_index()
 
         # get list of songs on the local directory
-        new_songs_paths = list_directory(self.kara_folder_path)
+        new_songs_paths = self.list_songs()
+
+        # apply the differences
+        self.synchronize(self.songs_index.copy(), new_songs_paths)
+
+        # prune artists and works without songs
+        if self.prune:
+            self.prune_server()
+
+        self.update_caches(new_songs_paths)
+
+    def list_songs(self):
+        """List the songs of the kara folder.
+
+        The roots of the kara folder are listed at the same time, and their
+        songs are merged in one listing.
+
+        Returns:
+            list of directory.SongPaths: Paths of the local songs files.
+        """
+        roots = self.kara_folder.roots
+        new_songs_paths = [
+            song_paths
+            for root_songs_paths in map_concurrently(
+                self.list_root_songs, roots, len(roots)
+            )
+            for song_paths in root_songs_paths
+        ]
+
         logger.info("Found %i songs in local directory", len(new_songs_paths))
-        new_songs_video_path = [song.video for song in new_songs_paths]
+
+        return new_songs_paths
+
+    def list_root_songs(self, root):
+        """List the songs of a root of the kara folder.
+
+        Args:
+            root (dakara_feeder.kara_folder.KaraRoot): Root of the kara
+                folder.
+
+        Returns:
+            list of directory.SongPaths: Paths of the local songs files,
+            relative to the kara folder.
+        """
+        scan_cache = self.get_scan_cache(root)
+        songs_paths = list_directory(
+            root.path,
+            classifier=self.classifier,
+            scan_cache=scan_cache,
+            workers=get_scan_workers(root.path, self.scan_workers, self.scan_mounts),
+        )
+        if scan_cache is not None:
+            scan_cache.save()
+
+        if root.prefix:
+            songs_paths = [
+                song_paths.with_prefix(root.prefix) for song_paths in songs_paths
+            ]
+
+        return songs_paths
+
+    def update_caches(self, new_songs_paths):
+        """Update the caches after a full feed.
+
+        Args:
+            new_songs_paths (list of directory.SongPaths): Paths of the local
+                songs files.
+        """
+        # fingerprint songs that are not known yet
+        if self.fingerprint_cache is not None:
+            new_songs_video_path = [song.video for song in new_songs_paths]
+            self.update_fingerprints(
+                self.fingerprint_cache.get_missing(new_songs_video_path)
+            )
+            self.fingerprint_cache.evict(new_songs_video_path)
+
+        # remove files that do not exist anymore from the cache of metadata
+        if self.metadata_cache is not None:
+            self.metadata_cache.evict([song.video for song in new_songs_paths])
+            logger.info(
+                "Metadata cache: %i hits, %i misses",
+                self.metadata_cache.hits,
+                self.metadata_cache.misses,
+            )
+
+    def watch(self):
+        """Feed continuously as the kara folder changes.
+
+        A full feed is done first, then only the directories affected by
+        changes are processed, using the index of songs of the server kept in
+        memory.
+
+        Raises:
+            WatcherError: If the kara folder has several roots.
+        """
+        if len(self.kara_folder.roots) > 1:
+            raise WatcherError("Cannot watch a karaoke folder with several roots")
+
+        root = self.kara_folder.roots[0]
+        watcher = get_watcher(
+            root.path,
+            polling=self.watch_config.get("polling", False),
+            interval=self.watch_config.get("polling_interval", POLLING_INTERVAL),
+        )
+        debounce = self.watch_config.get("debounce", DEBOUNCE)
+
+        # start watching before the full feed to not miss any change
+        with watcher:
+            self.feed()
+            logger.info("Watching '%s' for changes", root.path)
+
+            while True:
+                directories, files = watcher.wait_changes(debounce)
+
+                # the watcher gives paths relative to the root
+                self.feed_changes(
+                    {root.get_kara_folder_path(path) for path in directories},
+                    {root.get_kara_folder_path(path) for path in files},
+                )
+
+    def feed_changes(self, directories, files=()):
+        """Feed the songs of the directories affected by changes.
+
+        Args:
+            directories (iterable of path.Path): Affected directories,
+                relative to the kara folder. Songs in sub directories are not
+                concerned.
+            files (iterable of path.Path): Files which content has changed,
+                relative to the kara folder. The songs they belong to are
+                updated.
+        """
+        directories = set(directories)
+        files = set(files)
+        logger.info("Detected changes in %i directories", len(directories))
+
+        # the index may not know the ID of songs created previously
+        if self.songs_index_stale:
+            self.retrieve_songs_index()
+
+        # get songs of affected directories on the local directory
+        new_songs_paths = []
+        for directory in sorted(directories):
+            directory_path = self.kara_folder.get_file_path(directory)
+            if not directory_path.isdir():
+                continue
+
+            root, root_directory = self.kara_folder.get_root(directory)
+            names, _ = list_entries(directory_path)
+            songs_paths = group_directory(
+                root_directory, names, root.path, self.classifier
+            )
+            if root.prefix:
+                songs_paths = [paths.with_prefix(root.prefix) for paths in songs_paths]
+
+            new_songs_paths.extend(songs_paths)
+
+        # get songs of affected directories on the server
+        old_songs_id_by_path = self.songs_index.subset(directories)
+
+        # songs with changed files must be updated
+        modified_songs_path = [
+            song.video
+            for song in new_songs_paths
+            if not files.isdisjoint(
+                [song.video_str, song.audio_str, song.subtitle_str, *song.others_str]
+            )
+        ]
+
+        deleted_count = self.synchronize(
+            old_songs_id_by_path, new_songs_paths, modified_songs_path
+        )
+
+        # prune artists and works without songs
+        if self.prune and deleted_count:
+            self.prune_server()
+
+        if self.metadata_cache is not None:
+            self.metadata_cache.commit()
+
+    def retrieve_songs_index(self):
+        """Get the songs of the server and keep their ID by path.
+
+        Songs are indexed as soon as they are received. If some songs were
+        missed, for instance because the library changed while it was
+        retrieved, songs are retrieved again once.
+        """
+        try:
+            self.index_songs(self.http_client.retrieve_songs())
+
+        except SongsCountMismatchError as error:
+            logger.warning("%s, retrieving songs again", error)
+            self.index_songs(self.http_client.retrieve_songs())
+
+    def index_songs(self, old_songs):
+        """Keep the ID by path of the songs of the server.
+
+        Args:
+            old_songs (iterable of dict): Songs of the server, with their path
+                and their ID.
+        """
+        self.songs_index = SongsIndex((song["path"], song["id"]) for song in old_songs)
+        self.songs_index_stale = False
+
+        logger.info("Found %i songs in server", len(self.songs_index))
+
+    def index_created_songs(self, response):
+        """Store the ID of songs just created on the server in the index.
+
+        Args:
+            response (list of dict): Songs created on the server, as returned
+                by the server.
+        """
+        if not isinstance(response, list) or not all(
+            isinstance(song, dict) and {"id", "directory", "filename"} <= song.keys()
+            for song in response
+        ):
+            # the response does not describe the created songs, the index
+            # will be retrieved again when needed
+            self.songs_index_stale = True
+            return
+
+        for song in response:
+            self.songs_index[Path(song["directory"]) / song["filename"]] = song["id"]
+
+    def quarantine_song(self, song, error):
+        """Put aside a song rejected by the server.
+
+        The song is not in the index, so that it is sent again on the next
+        synchronization.
+
+        Args:
+            song (dict): Representation of the song.
+            error (web_client.SongInvalidError): Error caused by the song.
+        """
+        logger.warning(
+            "Song '%s' rejected by the server: %s",
+            Path(song["directory"]) / song["filename"],
+            error,
+        )
+        self.rejected_songs.append((song, error))
+        self.rejected_videos.add(get_song_video_path(song))
+
+    def acknowledge_songs(self, songs_chunk):
+        """Store in the journal that the songs of a chunk have been created.
+
+        Songs of the chunk rejected by the server are not acknowledged, so
+        that their representation is kept in the journal.
+
+        Args:
+            songs_chunk (list of dict): Representation of the songs sent in
+                one chunk.
+        """
+        if self.journal is None:
+            return
+
+        created_songs = [
+            song
+            for song in songs_chunk
+            if get_song_video_path(song) not in self.rejected_videos
+        ]
+        if created_songs:
+            self.journal.acknowledge(created_songs)
+
+    def report_rejected_songs(self):
+        """Log the number of songs rejected during the synchronization."""
+        if self.rejected_songs:
+            logger.warning(
+                "%i songs were rejected by the server", len(self.rejected_songs)
+            )
+
+    def synchronize(
+        self, old_songs_id_by_path, new_songs_paths, modified_songs_path=()
+    ):
+        """Apply the differences between songs on the server and local songs.
+
+        Songs are added, updated or deleted on the server, and the index of
+        songs of the server is updated accordingly.
+
+        Args:
+            old_songs_id_by_path (dict or dakara_feeder.index.SongsIndex): ID
+                of songs on the server, by path.
+            new_songs_paths (list of directory.SongPaths): Paths of the local
+                songs files.
+            modified_songs_path (iterable of path.Path): Paths of the video of
+                unchanged songs that must be updated anyway.
+
+        Returns:
+            int: Number of songs deleted.
+        """
+        self.rejected_songs = []
+        self.rejected_videos = set()
+        added_songs_path, updated_songs_path, deleted_songs_path = self.get_changes(
+            old_songs_id_by_path, new_songs_paths, modified_songs_path
+        )
 
         # create map of new songs
         new_songs_paths_map = {song.video: song for song in new_songs_paths}
 
-        # compute the diffs
-        added_songs_path, deleted_songs_path, unchanged_songs_path = generate_diff(
-            old_songs_path, new_songs_video_path
+        # create added songs on server
+        # recover the song paths with the path of the video
+        if added_songs_path:
+            self.add_songs(
+                [new_songs_paths_map[song_path] for song_path in added_songs_path]
+            )
+
+        # update renamed songs on server
+        # recover the song paths with the path of the video
+        if updated_songs_path:
+            updated_songs = self.parse_songs(
+                [
+                    new_songs_paths_map[new_song_path]
+                    for new_song_path, _ in updated_songs_path
+                ],
+                text="Updating songs",
+            )
+            updated_songs_id = [
+                old_songs_id_by_path[old_song_path]
+                for _, old_song_path in updated_songs_path
+            ]
+            for song_id, (new_song_path, old_song_path) in zip(
+                self.http_client.put_songs(zip(updated_songs_id, updated_songs)),
+                updated_songs_path,
+            ):
+                self.songs_index.pop(old_song_path, None)
+                self.songs_index[new_song_path] = song_id
+
+        # remove deleted songs on server
+        if deleted_songs_path:
+            deleted_songs = self.http_client.delete_songs(
+                old_songs_id_by_path[song_path] for song_path in deleted_songs_path
+            )
+            for _, song_path in zip(
+                self.bar(
+                    deleted_songs,
+                    text="Deleting removed songs",
+                    max_value=len(deleted_songs_path),
+                ),
+                deleted_songs_path,
+            ):
+                self.songs_index.pop(song_path, None)
+
+        self.fingerprint_changes(
+            added_songs_path, updated_songs_path, deleted_songs_path
         )
 
+        self.report_rejected_songs()
+
+        # all songs have been sent, only rejected songs are kept to be sent
+        # again without being parsed
+        if self.journal is not None:
+            self.journal.keep(self.rejected_videos)
+
+        return len(deleted_songs_path)
+
+    def get_changes(
+        self, old_songs_id_by_path, new_songs_paths, modified_songs_path=()
+    ):
+        """Compute the differences between songs on the server and local songs.
+
+        Args:
+            old_songs_id_by_path (dict or dakara_feeder.index.SongsIndex): ID
+                of songs on the server, by path.
+            new_songs_paths (list of directory.SongPaths): Paths of the local
+                songs files.
+            modified_songs_path (iterable of path.Path): Paths of the video of
+                unchanged songs that must be updated anyway.
+
+        Returns:
+            tuple: Contains the list of paths of the video of songs to add, the
+            list of tuples of new path and old path of the video of songs to
+            update, and the list of paths of the video of songs to delete.
+        """
+        if not isinstance(old_songs_id_by_path, SongsIndex):
+            old_songs_id_by_path = SongsIndex(old_songs_id_by_path)
+
+        # compute the diffs
+        (
+            added_songs_path,
+            deleted_songs_path,
+            unchanged_songs_path,
+        ) = old_songs_id_by_path.diff(song.video for song in new_songs_paths)
+
         # try to find renamed/moved files
-        updated_songs_path, added_songs_path, deleted_songs_path = match_similar(
-            added_songs_path, deleted_songs_path, calculate_file_path_similarity
+        updated_songs_path, added_songs_path, deleted_songs_path = self.match_renamed(
+            added_songs_path, deleted_songs_path
         )
 
         # when force_update is true, unchanged files are added to update list
         if self.force_update:
             updated_songs_path.extend([(path, path) for path in unchanged_songs_path])
 
+        # otherwise, only unchanged files that have been modified are
+        else:
+            modified_songs_path = set(modified_songs_path)
+            updated_songs_path.extend(
+                [
+                    (path, path)
+                    for path in unchanged_songs_path
+                    if path in modified_songs_path
+                ]
+            )
+
         logger.info("Found %i songs to add", len(added_songs_path))
         logger.info("Found %i songs to delete", len(deleted_songs_path))
         logger.info("Found %i songs to update", len(updated_songs_path))
 
-        # songs to add
-        # recover the song paths with the path of the video
-        added_songs = []
-        if added_songs_path:
-            added_songs = [
-                self.song_class(
-                    self.kara_folder_path, new_songs_paths_map[song_path]
-                ).get_representation()
-                for song_path in self.bar(added_songs_path, text="Parsing songs to add")
-            ]
+        return added_songs_path, updated_songs_path, deleted_songs_path
 
-        # songs to update
-        # recover the song paths with the path of the video
-        updated_songs = []
-        if updated_songs_path:
-            updated_songs = [
-                (
-                    self.song_class(
-                        self.kara_folder_path, new_songs_paths_map[new_song_path]
-                    ).get_representation(),
-                    old_songs_id_by_path[old_song_path],
+    def fingerprint_changes(
+        self, added_songs_path, updated_songs_path, deleted_songs_path
+    ):
+        """Remember the identity of video files of synchronized songs.
+
+        Args:
+            added_songs_path (list of path.Path): Paths of the video of added
+                songs.
+            updated_songs_path (list of tuple): New path and old path of the
+                video of updated songs.
+            deleted_songs_path (list of path.Path): Paths of the video of
+                deleted songs.
+        """
+        if self.fingerprint_cache is None:
+            return
+
+        self.update_fingerprints(
+            added_songs_path
+            + [new_song_path for new_song_path, _ in updated_songs_path],
+            deleted_songs_path
+            + [
+                old_song_path
+                for new_song_path, old_song_path in updated_songs_path
+                if old_song_path != new_song_path
+            ],
+        )
+
+    def match_renamed(self, added_songs_path, deleted_songs_path):
+        """Find songs that have been renamed or moved.
+
+        If enabled, songs which video file is the same, or has the same
+        content, according to their fingerprint are matched first. Then,
+        songs moved to another directory with the same file name are matched,
+        then, if enabled, songs which file name only changed by its
+        extension. This is done in linear time. Remaining songs are matched
+        by similarity of their path.
+
+        Args:
+            added_songs_path (list of path.Path): Paths of the video of songs
+                only present locally.
+            deleted_songs_path (list of path.Path): Paths of the video of songs
+                only present on the server.
+
+        Returns:
+            tuple of list: Contains 3 lists:
+
+            1. List of tuple with the new path and the old path of renamed
+               songs;
+            2. List of paths of added songs;
+            3. List of paths of deleted songs.
+        """
+        updated_songs_path = []
+
+        if self.fingerprint_cache is not None and deleted_songs_path:
+            (
+                identical_songs_path,
+                added_songs_path,
+                deleted_songs_path,
+            ) = self.match_fingerprints(added_songs_path, deleted_songs_path)
+            updated_songs_path.extend(identical_songs_path)
+
+        moved_songs_path, added_songs_path, deleted_songs_path = match_identical(
+            added_songs_path, deleted_songs_path, Path.basename
+        )
+        updated_songs_path.extend(moved_songs_path)
+
+        if self.rename_config.get("match_stem", False):
+            renamed_songs_path, added_songs_path, deleted_songs_path = match_identical(
+                added_songs_path, deleted_songs_path, lambda path: path.stem
+            )
+            updated_songs_path.extend(renamed_songs_path)
+
+        threshold = self.rename_config.get("threshold", SIMILARITY_THRESHOLD)
+        if self.similarity_method == SIMILARITY_TRIGRAM:
+            similar_songs_path, added_songs_path, deleted_songs_path = match_similar(
+                added_songs_path,
+                deleted_songs_path,
+                calculate_file_path_similarities,
+                threshold,
+                batch=True,
+            )
+
+        else:
+            similar_songs_path, added_songs_path, deleted_songs_path = match_similar(
+                added_songs_path,
+                deleted_songs_path,
+                calculate_file_path_similarity,
+                threshold,
+                generate_candidates=generate_file_path_candidates,
+                processes=self.similarity_processes,
+            )
+
+        updated_songs_path.extend(similar_songs_path)
+
+        return updated_songs_path, added_songs_path, deleted_songs_path
+
+    def match_fingerprints(self, added_songs_path, deleted_songs_path):
+        """Find songs which video file has been renamed by their fingerprint.
+
+        The fingerprint of the video of added songs is compared with the
+        fingerprint stored for deleted songs. The same file (same inode and
+        content) is matched first, then a file with the same content. This is
+        done in linear time.
+
+        Args:
+            added_songs_path (list of path.Path): Paths of the video of songs
+                only present locally.
+            deleted_songs_path (list of path.Path): Paths of the video of songs
+                only present on the server.
+
+        Returns:
+            tuple of list: Contains 3 lists:
+
+            1. List of tuple with the new path and the old path of renamed
+               songs;
+            2. List of paths of added songs;
+            3. List of paths of deleted songs.
+        """
+        fingerprints = {
+            path: self.fingerprint_cache.get(path) for path in deleted_songs_path
+        }
+
+        # no need to read added files if no deleted file is known
+        if not any(fingerprints.values()):
+            return [], added_songs_path, deleted_songs_path
+
+        fingerprints.update(
+            {
+                path: get_file_fingerprint(self.kara_folder.get_file_path(path))
+                for path in added_songs_path
+            }
+        )
+
+        # same file
+        updated_songs_path, added_songs_path, deleted_songs_path = match_identical(
+            added_songs_path, deleted_songs_path, fingerprints.get
+        )
+
+        # same content
+        copied_songs_path, added_songs_path, deleted_songs_path = match_identical(
+            added_songs_path,
+            deleted_songs_path,
+            lambda path: fingerprints[path][1:] if fingerprints[path] else None,
+        )
+        updated_songs_path.extend(copied_songs_path)
+
+        logger.debug("Found %i songs by fingerprint", len(updated_songs_path))
+
+        return updated_songs_path, added_songs_path, deleted_songs_path
+
+    def update_fingerprints(self, new_songs_path, removed_songs_path=()):
+        """Update the stored fingerprints of videos of songs.
+
+        Args:
+            new_songs_path (list of path.Path): Paths of the video of songs to
+                fingerprint.
+            removed_songs_path (list of path.Path): Paths of the video of songs
+                to forget.
+        """
+        for song_path in removed_songs_path:
+            self.fingerprint_cache.delete(song_path)
+
+        for song_path in new_songs_path:
+            self.fingerprint_cache.set(
+                song_path,
+                get_file_fingerprint(self.kara_folder.get_file_path(song_path)),
+            )
+
+        self.fingerprint_cache.commit()
+
+    def prune_server(self):
+        """Prune artists and works without songs on the server."""
+        artists_deleted_count = self.http_client.prune_artists()
+        logger.info("Deleted %i artists without songs on server", artists_deleted_count)
+
+        works_deleted_count = self.http_client.prune_works()
+        logger.info("Deleted %i works without songs on server", works_deleted_count)
+
+    async def feed_async(self):
+        """Execute the feeding action asynchronously.
+
+        Songs of the server are retrieved while the kara folder is listed,
+        then songs are parsed and sent to the server on the event loop. No
+        more than `parse_workers` songs are parsed at the same time, and no
+        more than the concurrency of the client requests are sent at the same
+        time.
+        """
+        loop = asyncio.get_running_loop()
+        with AsyncHTTPClientDakara(self.http_client) as http_client:
+            # get list of songs on the server and on the local directory
+            _, new_songs_paths = await asyncio.gather(
+                loop.run_in_executor(None, self.retrieve_songs_index),
+                loop.run_in_executor(None, self.list_songs),
+            )
+
+            # apply the differences
+            await self.synchronize_async(
+                http_client, self.songs_index.copy(), new_songs_paths
+            )
+
+            # prune artists and works without songs
+            if self.prune:
+                await self.prune_server_async(http_client)
+
+        self.update_caches(new_songs_paths)
+
+    async def get_song_representation_async(self, song_paths):
+        """Parse a song and get its representation asynchronously.
+
+        Args:
+            song_paths (directory.SongPaths): Paths of the song files.
+
+        Returns:
+            dict: JSON-compiliant structure representing the song.
+        """
+        return await self.get_song(song_paths).get_representation_async()
+
+    async def synchronize_async(
+        self, http_client, old_songs_id_by_path, new_songs_paths
+    ):
+        """Apply the differences between songs on the server and local songs.
+
+        Asynchronous counterpart of `synchronize`. Chunks of added songs,
+        updated songs and deleted songs are processed concurrently.
+
+        Args:
+            http_client (web_client.AsyncHTTPClientDakara): Client for the
+                Dakara server.
+            old_songs_id_by_path (dict or dakara_feeder.index.SongsIndex): ID
+                of songs on the server, by path.
+            new_songs_paths (list of directory.SongPaths): Paths of the local
+                songs files.
+
+        Returns:
+            int: Number of songs deleted.
+        """
+        self.rejected_songs = []
+        self.rejected_videos = set()
+        added_songs_path, updated_songs_path, deleted_songs_path = self.get_changes(
+            old_songs_id_by_path, new_songs_paths
+        )
+
+        # create map of new songs
+        new_songs_paths_map = {song.video: song for song in new_songs_paths}
+
+        parse_semaphore = asyncio.Semaphore(self.parse_workers)
+        limit = max(self.parse_workers, http_client.concurrency) * 2
+
+        async def parse_song(song_path):
+            async with parse_semaphore:
+                return await self.get_song_representation_async(
+                    new_songs_paths_map[song_path]
                 )
-                for new_song_path, old_song_path in self.bar(
-                    updated_songs_path, text="Parsing songs to update"
+
+        async def parse_added_song(song_path):
+            if self.journal is None:
+                return await parse_song(song_path)
+
+            root, root_song_paths = self.kara_folder.get_song_paths(
+                new_songs_paths_map[song_path]
+            )
+            song = self.journal.get(root.path, root_song_paths, root.prefix)
+            if song is None:
+                song = await parse_song(song_path)
+                self.journal.add(root.path, root_song_paths, song, root.prefix)
+
+            return song
+
+        async def add_songs(songs_path):
+            songs = await asyncio.gather(*map(parse_added_song, songs_path))
+            for songs_chunk in self.chunker.divide(songs):
+                self.index_created_songs(
+                    await http_client.post_songs_chunk(
+                        songs_chunk,
+                        on_sent=self.chunker.record,
+                        on_rejected=self.quarantine_song,
+                    )
                 )
-            ]
+
+                self.acknowledge_songs(songs_chunk)
+
+        async def update_song(new_song_path, old_song_path):
+            song = await parse_song(new_song_path)
+            song_id = old_songs_id_by_path[old_song_path]
+            await http_client.put_song(song_id, song)
+            self.songs_index.pop(old_song_path, None)
+            self.songs_index[new_song_path] = song_id
+
+        async def delete_song(song_path):
+            await http_client.delete_song(old_songs_id_by_path[song_path])
+            self.songs_index.pop(song_path, None)
 
         # create added songs on server
-        # send them by chunks
-        if added_songs:
-            for songs_chunk in self.bar(
-                list(divide_chunks(added_songs, self.songs_per_chunk)),
-                text="Uploading added songs",
-            ):
-                self.http_client.post_song(songs_chunk)
+        if added_songs_path:
+            added_songs_chunks = list(
+                divide_chunks(added_songs_path, self.songs_per_chunk)
+            )
+            await run_concurrently(
+                (
+                    add_songs(songs_path)
+                    for songs_path in self.bar(
+                        added_songs_chunks,
+                        text="Adding songs",
+                        max_value=len(added_songs_chunks),
+                    )
+                ),
+                http_client.concurrency * 2,
+            )
 
         # update renamed songs on server
-        if updated_songs:
-            for song, song_id in self.bar(
-                updated_songs, text="Uploading updated songs"
-            ):
-                self.http_client.put_song(song_id, song)
+        if updated_songs_path:
+            await run_concurrently(
+                (
+                    update_song(new_song_path, old_song_path)
+                    for new_song_path, old_song_path in self.bar(
+                        updated_songs_path, text="Updating songs"
+                    )
+                ),
+                limit,
+            )
 
         # remove deleted songs on server
         if deleted_songs_path:
-            for song_path in self.bar(
-                deleted_songs_path, text="Deleting removed songs"
-            ):
-                self.http_client.delete_song(old_songs_id_by_path[song_path])
-
-        # prune artists and works without songs
-        if self.prune:
-            artists_deleted_count = self.http_client.prune_artists()
-            logger.info(
-                "Deleted %i artists without songs on server", artists_deleted_count
+            await run_concurrently(
+                (
+                    delete_song(song_path)
+                    for song_path in self.bar(
+                        deleted_songs_path, text="Deleting removed songs"
+                    )
+                ),
+                http_client.concurrency * 2,
             )
 
-            works_deleted_count = self.http_client.prune_works()
-            logger.info("Deleted %i works without songs on server", works_deleted_count)
+        self.fingerprint_changes(
+            added_songs_path, updated_songs_path, deleted_songs_path
+        )
+
+        self.report_rejected_songs()
+
+        # all songs have been sent, only rejected songs are kept to be sent
+        # again without being parsed
+        if self.journal is not None:
+            self.journal.keep(self.rejected_videos)
+
+        return len(deleted_songs_path)
+
+    async def prune_server_async(self, http_client):
+        """Prune artists and works without songs on the server asynchronously.
+
+        Args:
+            http_client (web_client.AsyncHTTPClientDakara): Client for the
+                Dakara server.
+        """
+        artists_deleted_count, works_deleted_count = await asyncio.gather(
+            http_client.prune_artists(), http_client.prune_works()
+        )
+        logger.info("Deleted %i artists without songs on server", artists_deleted_count)
+        logger.info("Deleted %i works without songs on server", works_deleted_count)
 
 
 class KaraFolderNotFound(DakaraError):
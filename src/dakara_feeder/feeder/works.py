@@ -1,13 +1,14 @@
 """Feeder for works."""
 
 import logging
+import time
 
 from dakara_base.exceptions import DakaraError
 from dakara_base.progress_bar import null_bar, progress_bar
 
 from dakara_feeder.difference import generate_diff
 from dakara_feeder.json import get_json_file_content
-from dakara_feeder.utils import divide_chunks
+from dakara_feeder.utils import AdaptiveChunker
 from dakara_feeder.version import check_version
 from dakara_feeder.web_client import HTTPClientDakara
 
@@ -33,6 +34,10 @@ class WorksFeeder:
         works_file_path (path.Path): Path to the JSON file containing works.
         update_only (bool): If `True`, will not create works that do not exist on
             the server.
+        works_per_chunk (int): Maximum number of works per chunk to send to
+            server when creating works.
+        chunker (dakara_feeder.utils.AdaptiveChunker): Divider of works to
+            create in chunks.
     """
 
     def __init__(self, config, works_file_path, update_only=False, progress=True):
@@ -42,6 +47,9 @@ class WorksFeeder:
         self.works_file_path = works_file_path
         self.update_only = update_only
         self.works_per_chunk = config["server"].get("works_per_chunk", WORKS_PER_CHUNK)
+        self.chunker = AdaptiveChunker.from_config(
+            config["server"], self.works_per_chunk
+        )
 
     def load(self):
         """Execute side-effect initialization tasks."""
@@ -160,13 +168,15 @@ class WorksFeeder:
         # works to add
         if not self.update_only and added_works_str:
             # upload to server by chunks
-            for work_str_chunk in self.bar(
-                list(divide_chunks(added_works_str, self.works_per_chunk)),
-                text="Uploading added works",
-            ):
-                self.http_client.post_work(
-                    [new_works_by_str[ws] for ws in work_str_chunk]
+            for works_chunk in self.chunker.divide(
+                self.bar(
+                    [new_works_by_str[ws] for ws in added_works_str],
+                    text="Uploading added works",
                 )
+            ):
+                start = time.monotonic()
+                self.http_client.post_work(works_chunk)
+                self.chunker.record(time.monotonic() - start)
 
         # works to update
         if updated_works_str:
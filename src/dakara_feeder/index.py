@@ -0,0 +1,225 @@
+"""Index of the songs of the server.
+
+The index gives the ID of each song of the server by the path of its video,
+like a dictionary, but with a much smaller memory footprint for large
+libraries:
+
+>>> index = SongsIndex({Path("directory") / "song.mp4": 42})
+>>> index[Path("directory") / "song.mp4"]
+42
+>>> added, deleted, unchanged = index.diff([Path("directory") / "other.mp4"])
+
+Each directory is stored once and songs are stored by directory, with
+their IDs in an array. Paths are only created when the index is iterated
+over.
+"""
+
+import os
+from array import array
+from collections.abc import MutableMapping
+
+from path import Path
+
+
+class SongsIndex(MutableMapping):
+    """ID of songs by path of their video.
+
+    Directories are interned: each one is stored once and given a number.
+    For each directory, the row of each song is stored by file name. The ID
+    of the song of each row is stored in an array. Rows of removed songs are
+    reused by added songs.
+
+    Args:
+        songs (dict or iterable of tuple): Initial songs, as a mapping or as
+            pairs of path and ID.
+
+    Attributes:
+        directories (list of str): Interned directories, by number.
+        directory_numbers (dict): Number of each interned directory.
+        rows (list of dict): Row of each song by file name, by number of
+            directory.
+        ids (array.array): ID of the song of each row.
+        free_rows (list of int): Rows of removed songs.
+    """
+
+    def __init__(self, songs=()):
+        self.directories = []
+        self.directory_numbers = {}
+        self.rows = []
+        self.ids = array("q")
+        self.free_rows = []
+        self.update(songs)
+
+    @staticmethod
+    def split(path):
+        """Split a path in directory and file name.
+
+        Args:
+            path (str): Path of the video of a song.
+
+        Returns:
+            tuple of str: Directory and file name.
+        """
+        return os.path.split(path)
+
+    def get_rows(self, directory, create=False):
+        """Get the rows of the songs of a directory.
+
+        Args:
+            directory (str): Directory.
+            create (bool): If `True`, intern the directory if it is unknown.
+
+        Returns:
+            dict: Row of each song of the directory by file name, or `None`
+            if the directory is unknown and not created.
+        """
+        number = self.directory_numbers.get(directory)
+        if number is None:
+            if not create:
+                return None
+
+            number = len(self.directories)
+            directory = str(directory)
+            self.directories.append(directory)
+            self.directory_numbers[directory] = number
+            self.rows.append({})
+
+        return self.rows[number]
+
+    def set_song(self, directory, filename, song_id):
+        """Set the ID of a song from its directory and file name.
+
+        Args:
+            directory (str): Directory of the video of the song.
+            filename (str): File name of the video of the song.
+            song_id (int): ID of the song.
+        """
+        rows = self.get_rows(directory, create=True)
+        row = rows.get(filename)
+        if row is not None:
+            self.ids[row] = song_id
+            return
+
+        if self.free_rows:
+            row = self.free_rows.pop()
+            self.ids[row] = song_id
+
+        else:
+            row = len(self.ids)
+            self.ids.append(song_id)
+
+        rows[str(filename)] = row
+
+    def __getitem__(self, path):
+        directory, filename = self.split(path)
+        rows = self.get_rows(directory)
+        if rows is None or filename not in rows:
+            raise KeyError(path)
+
+        return self.ids[rows[filename]]
+
+    def __setitem__(self, path, song_id):
+        self.set_song(*self.split(path), song_id)
+
+    def __delitem__(self, path):
+        directory, filename = self.split(path)
+        rows = self.get_rows(directory)
+        if rows is None or filename not in rows:
+            raise KeyError(path)
+
+        self.free_rows.append(rows.pop(filename))
+
+    def __contains__(self, path):
+        directory, filename = self.split(path)
+        rows = self.get_rows(directory)
+        return rows is not None and filename in rows
+
+    def __iter__(self):
+        for directory, rows in zip(self.directories, self.rows):
+            for filename in rows:
+                yield Path(directory) / filename
+
+    def __len__(self):
+        return len(self.ids) - len(self.free_rows)
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, dict(self.items()))
+
+    def copy(self):
+        """Get a copy of the index.
+
+        Returns:
+            SongsIndex: Independent copy of the index.
+        """
+        index = self.__class__()
+        index.directories = list(self.directories)
+        index.directory_numbers = dict(self.directory_numbers)
+        index.rows = [dict(rows) for rows in self.rows]
+        index.ids = array("q", self.ids)
+        index.free_rows = list(self.free_rows)
+
+        return index
+
+    def subset(self, directories):
+        """Get the songs of some directories.
+
+        Only the songs of the given directories are visited, not the whole
+        index.
+
+        Args:
+            directories (iterable of str): Directories of the songs.
+
+        Returns:
+            SongsIndex: Index of the songs of the directories.
+        """
+        index = self.__class__()
+        for directory in directories:
+            rows = self.get_rows(directory)
+            if not rows:
+                continue
+
+            for filename, row in rows.items():
+                index.set_song(directory, filename, self.ids[row])
+
+        return index
+
+    def diff(self, paths):
+        """Compare the songs of the index with a listing of paths.
+
+        Each path is looked up in the index, then the songs of the index that
+        were not looked up are collected. This is done in linear time,
+        without creating a set of the paths of the index.
+
+        Args:
+            paths (iterable of path.Path): Paths of the video of songs.
+
+        Returns:
+            tuple of list: Contains 3 lists:
+
+            1. List of paths only in the listing;
+            2. List of paths only in the index;
+            3. List of paths in both.
+        """
+        seen = bytearray(len(self.ids))
+        added = []
+        unchanged = []
+        for path in paths:
+            directory, filename = self.split(path)
+            rows = self.get_rows(directory)
+            row = None if rows is None else rows.get(filename)
+            if row is None:
+                added.append(path)
+                continue
+
+            if not seen[row]:
+                seen[row] = 1
+                unchanged.append(path)
+
+        deleted = [
+            Path(directory) / filename
+            for directory, rows in zip(self.directories, self.rows)
+            for filename, row in rows.items()
+            if not seen[row]
+        ]
+
+        return added, deleted, unchanged
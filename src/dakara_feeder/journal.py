@@ -0,0 +1,321 @@
+"""Journal of songs being created on the server.
+
+When songs are created, the journal stores on disk the representation of each
+parsed song, then the songs of each chunk acknowledged by the server. If the
+feeder is interrupted, the next run reuses the representations of the songs
+that were parsed but not sent, as long as their files have not changed:
+
+>>> journal = Journal(Path("path/to/journal.jsonl"), header)
+>>> journal.open()
+>>> song = journal.get(base_directory, song_paths)
+>>> if song is None:
+...     song = parse(song_paths)
+...     journal.add(base_directory, song_paths, song)
+>>> send([song])
+>>> journal.acknowledge([song])
+>>> journal.keep(rejected_videos)
+
+Once all songs are sent, only the songs rejected by the server are kept, so
+that they are not parsed again on the next run.
+
+The journal is a JSON lines file, so that an entry is written at once and a
+truncated last entry can be ignored. Its content is discarded if it was
+created for another directory or another song class.
+"""
+
+import json
+import logging
+import os
+from threading import Lock
+
+from path import Path
+
+from dakara_feeder.cache import get_file_identity
+
+logger = logging.getLogger(__name__)
+
+
+def get_song_signature(base_directory, song_paths):
+    """Get the values identifying the content of the files of a song.
+
+    Args:
+        base_directory (path.Path): Path of the directory containing the
+            files of the song.
+        song_paths (directory.SongPaths): Paths of the song files, relative to
+            the directory.
+
+    Returns:
+        list: Path, then size, modification time in nanoseconds and inode of
+        each file of the song. The values are `None` for a file that cannot be
+        accessed.
+    """
+    video, audio, subtitle, others = song_paths.as_tuple()
+
+    signature = []
+    for path in (video, audio, subtitle, *others):
+        if path is None:
+            continue
+
+        identity = get_file_identity(base_directory / path)
+        signature.append([path, *(identity or (None, None, None))])
+
+    return signature
+
+
+def get_song_video_path(song):
+    """Get the path of the video of a song from its representation.
+
+    Args:
+        song (dict): Representation of the song.
+
+    Returns:
+        str: Path of the video file, relative to the karaoke folder.
+    """
+    return str(Path(song["directory"]) / song["filename"])
+
+
+class Journal:
+    """Journal of songs being created on the server, stored in a JSON lines file.
+
+    The file is created on the first entry, and removed when the journal is
+    cleared. The journal can be used by several threads at the same time.
+
+    Args:
+        journal_path (path.Path): Path to the JSON lines file.
+        header (dict): Values that must match to reuse the content of the
+            file.
+
+    Attributes:
+        journal_path (path.Path): Path to the JSON lines file.
+        header (dict): Values that must match to reuse the content of the
+            file.
+        songs (dict): Signature and representation of songs parsed but not
+            sent, by path of their video.
+        sent_count (int): Number of songs sent since the journal was
+            created.
+        file (io.TextIOWrapper): File the entries are appended to, if opened.
+    """
+
+    VERSION = 1
+
+    def __init__(self, journal_path, header):
+        self.journal_path = journal_path
+        self.header = header
+        self.songs = {}
+        self.sent_count = 0
+        self.file = None
+        self.lock = Lock()
+
+    def get_header(self):
+        """Get the values that must match to reuse the content of the file.
+
+        Returns:
+            dict: Header of the file.
+        """
+        return {"version": self.VERSION, **self.header}
+
+    def open(self):
+        """Load the journal of an interrupted run.
+
+        Songs that were sent are forgotten, and the file is rewritten with
+        the remaining songs only.
+        """
+        self.load()
+
+        if self.songs or self.sent_count:
+            logger.info(
+                "Resuming from journal: %i songs were sent, %i parsed songs can "
+                "be reused",
+                self.sent_count,
+                len(self.songs),
+            )
+
+        # rewrite the file without sent songs
+        with self.lock:
+            self.rewrite_file()
+
+    def load(self):
+        """Read the entries of the file.
+
+        The content of the file is ignored if its header does not match, or
+        if it cannot be read.
+        """
+        self.songs = {}
+        self.sent_count = 0
+
+        if not self.journal_path.exists():
+            return
+
+        try:
+            with open(self.journal_path, encoding="utf-8") as file:
+                lines = iter(file)
+                if json.loads(next(lines, "null")) != self.get_header():
+                    logger.debug("Journal is outdated, ignoring it")
+                    return
+
+                for line in lines:
+                    try:
+                        entry = json.loads(line)
+
+                    # the run was interrupted while writing the entry
+                    except ValueError:
+                        break
+
+                    self.load_entry(entry)
+
+        except (OSError, ValueError) as error:
+            logger.debug("Cannot read journal: %s", error)
+            self.songs = {}
+            self.sent_count = 0
+
+    def load_entry(self, entry):
+        """Apply an entry of the file.
+
+        Args:
+            entry (dict): Entry of the file.
+        """
+        if "sent" in entry:
+            for video in entry["sent"]:
+                if self.songs.pop(video, None) is not None:
+                    self.sent_count += 1
+
+            return
+
+        self.songs[entry["video"]] = (entry["signature"], entry["song"])
+
+    def rewrite_file(self):
+        """Rewrite the file with the current songs only, the lock must be held.
+
+        The file is removed if there are no songs.
+        """
+        self.close_file()
+        if not self.songs:
+            self.remove_file()
+            return
+
+        temporary_path = self.journal_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            file.write(json.dumps(self.get_header()) + "\n")
+            for video, (signature, song) in self.songs.items():
+                file.write(
+                    json.dumps({"video": video, "signature": signature, "song": song})
+                    + "\n"
+                )
+
+        os.replace(temporary_path, self.journal_path)
+        self.file = open(self.journal_path, "a", encoding="utf-8")
+
+    def close(self):
+        """Close the file of the journal, keeping its content."""
+        with self.lock:
+            self.close_file()
+
+    def close_file(self):
+        """Close the file if opened, the lock must be held."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def remove_file(self):
+        """Remove the file if it exists, the lock must be held."""
+        try:
+            os.remove(self.journal_path)
+
+        except FileNotFoundError:
+            pass
+
+    def write(self, entry):
+        """Append an entry to the file.
+
+        The file is created with its header if needed. The entry is flushed
+        immediately, so that it survives the interruption of the process.
+
+        Args:
+            entry (dict): Entry to write.
+        """
+        line = json.dumps(entry) + "\n"
+
+        with self.lock:
+            if self.file is None:
+                self.journal_path.parent.makedirs_p()
+                self.file = open(self.journal_path, "w", encoding="utf-8")
+                self.file.write(json.dumps(self.get_header()) + "\n")
+
+            self.file.write(line)
+            self.file.flush()
+
+    def get(self, base_directory, song_paths, prefix=""):
+        """Get the representation of a song parsed by an interrupted run.
+
+        Args:
+            base_directory (path.Path): Path of the directory containing the
+                files of the song.
+            song_paths (directory.SongPaths): Paths of the song files,
+                relative to the directory.
+            prefix (str): Directory of the directory inside the karaoke
+                folder, if the karaoke folder has several roots.
+
+        Returns:
+            dict: Representation of the song, or `None` if the song was not
+            parsed, or if its files have changed since.
+        """
+        entry = self.songs.get(os.path.join(prefix, song_paths.video_str))
+        if entry is None:
+            return None
+
+        signature, song = entry
+        if signature != get_song_signature(base_directory, song_paths):
+            return None
+
+        return song
+
+    def add(self, base_directory, song_paths, song, prefix=""):
+        """Store the representation of a parsed song.
+
+        Args:
+            base_directory (path.Path): Path of the directory containing the
+                files of the song.
+            song_paths (directory.SongPaths): Paths of the song files,
+                relative to the directory.
+            song (dict): Representation of the song.
+            prefix (str): Directory of the directory inside the karaoke
+                folder, if the karaoke folder has several roots.
+        """
+        video = os.path.join(prefix, song_paths.video_str)
+        signature = get_song_signature(base_directory, song_paths)
+        self.songs[video] = (signature, song)
+        self.write({"video": video, "signature": signature, "song": song})
+
+    def acknowledge(self, songs):
+        """Store that songs have been created on the server.
+
+        Args:
+            songs (list of dict): Representation of the songs.
+        """
+        videos = [get_song_video_path(song) for song in songs]
+        for video in videos:
+            self.songs.pop(video, None)
+
+        self.sent_count += len(videos)
+        self.write({"sent": videos})
+
+    def keep(self, videos):
+        """Forget all songs but the given ones, and rewrite the file.
+
+        Args:
+            videos (set of str): Paths of the video of the songs to keep.
+        """
+        with self.lock:
+            self.songs = {
+                video: entry for video, entry in self.songs.items() if video in videos
+            }
+            self.sent_count = 0
+            self.rewrite_file()
+
+    def clear(self):
+        """Forget all songs and remove the file."""
+        with self.lock:
+            self.close_file()
+            self.remove_file()
+            self.songs = {}
+            self.sent_count = 0
@@ -0,0 +1,215 @@
+"""Karaoke folder made of one or several roots.
+
+The karaoke folder is usually one directory. It can also be made of several
+directories, called roots, for instance one per disk. Each root has a prefix,
+which is the first directory of the path of its songs relative to the
+karaoke folder, so that songs of different roots do not collide:
+
+>>> kara_folder = KaraFolder.from_config(
+...     [{"path": "/mnt/disk1", "prefix": "anime"}, "/mnt/disk2"]
+... )
+>>> kara_folder.get_file_path(Path("disk2") / "directory" / "song.mkv")
+Path('/mnt/disk2/directory/song.mkv')
+
+Songs are parsed relatively to the path of their root, the prefix is only
+added to their directory when they are sent to the server.
+"""
+
+import os
+
+from dakara_base.exceptions import DakaraError
+from path import Path
+
+
+class KaraRoot:
+    """Directory of songs of the karaoke folder.
+
+    Args:
+        path (path.Path): Path of the directory.
+        prefix (str): First directory of the path of the songs of this root,
+            relative to the karaoke folder. Empty if the root is the whole
+            karaoke folder.
+
+    Attributes:
+        path (path.Path): Path of the directory.
+        prefix (str): First directory of the path of the songs of this root,
+            relative to the karaoke folder. Empty if the root is the whole
+            karaoke folder.
+    """
+
+    def __init__(self, path, prefix=""):
+        self.path = Path(path)
+        self.prefix = prefix
+
+    def get_kara_folder_path(self, path):
+        """Get the path relative to the karaoke folder of a path of the root.
+
+        Args:
+            path (str): Path relative to the root.
+
+        Returns:
+            path.Path: Path relative to the karaoke folder.
+        """
+        if not self.prefix:
+            return Path(path)
+
+        if not path:
+            return Path(self.prefix)
+
+        return Path(self.prefix) / path
+
+
+class KaraFolder:
+    """Karaoke folder made of one or several roots.
+
+    Args:
+        roots (list of KaraRoot): Roots of the folder. A root without prefix
+            must be the only one.
+
+    Attributes:
+        roots (list of KaraRoot): Roots of the folder.
+        roots_by_prefix (dict): Roots of the folder, by prefix.
+    """
+
+    def __init__(self, roots):
+        self.roots = roots
+        self.roots_by_prefix = {root.prefix: root for root in roots}
+
+    @classmethod
+    def from_config(cls, config):
+        """Create the karaoke folder from its config.
+
+        Args:
+            config (str or list): Path of the karaoke folder, or list of
+                roots. Each root is either a path, the name of the directory
+                being its prefix, or a dictionary with the keys "path" and
+                optionally "prefix".
+
+        Returns:
+            KaraFolder: Karaoke folder.
+
+        Raises:
+            InvalidKaraFolderError: If the list of roots is invalid.
+        """
+        if not isinstance(config, list):
+            return cls([KaraRoot(config)])
+
+        if not config:
+            raise InvalidKaraFolderError("The list of karaoke folders is empty")
+
+        roots = []
+        for root_config in config:
+            if not isinstance(root_config, dict):
+                root_config = {"path": root_config}
+
+            if not root_config.get("path"):
+                raise InvalidKaraFolderError("A karaoke folder of the list has no path")
+
+            path = Path(root_config["path"])
+            prefix = str(
+                root_config.get("prefix") or path.abspath().normpath().basename()
+            )
+
+            if (
+                prefix in ("", os.curdir, os.pardir)
+                or os.sep in prefix
+                or (os.altsep and os.altsep in prefix)
+            ):
+                raise InvalidKaraFolderError(
+                    "Invalid prefix '{}' for karaoke folder '{}', it must be a "
+                    "directory name".format(prefix, path)
+                )
+
+            if any(root.prefix == prefix for root in roots):
+                raise InvalidKaraFolderError(
+                    "Several karaoke folders have the prefix '{}'".format(prefix)
+                )
+
+            roots.append(KaraRoot(path, prefix))
+
+        return cls(roots)
+
+    def get_identifier(self):
+        """Get a text identifying the roots of the karaoke folder.
+
+        Returns:
+            str: Absolute path of the root if there is only one root without
+            prefix, otherwise prefix and absolute path of each root.
+        """
+        if len(self.roots) == 1 and not self.roots[0].prefix:
+            return str(self.roots[0].path.abspath())
+
+        return "\n".join(
+            "{}:{}".format(root.prefix, root.path.abspath()) for root in self.roots
+        )
+
+    def get_root(self, path):
+        """Get the root containing a path.
+
+        Args:
+            path (str): Path relative to the karaoke folder.
+
+        Returns:
+            tuple: Contains the root and the path relative to this root.
+
+        Raises:
+            UnknownKaraRootError: If no root has the prefix of the path.
+        """
+        root = self.roots_by_prefix.get("")
+        if root is not None:
+            return root, Path(path)
+
+        prefix, _, relative_path = str(path).partition(os.sep)
+        root = self.roots_by_prefix.get(prefix)
+        if root is None:
+            raise UnknownKaraRootError(
+                "Path '{}' is not in any karaoke folder".format(path)
+            )
+
+        return root, Path(relative_path)
+
+    def get_file_path(self, path):
+        """Get the real path of a file of the karaoke folder.
+
+        Args:
+            path (str): Path relative to the karaoke folder.
+
+        Returns:
+            path.Path: Path of the file inside its root.
+
+        Raises:
+            UnknownKaraRootError: If no root has the prefix of the path.
+        """
+        root, relative_path = self.get_root(path)
+        if not relative_path:
+            return root.path
+
+        return root.path / relative_path
+
+    def get_song_paths(self, song_paths):
+        """Get the root containing a song.
+
+        Args:
+            song_paths (dakara_feeder.directory.SongPaths): Paths of the song,
+                relative to the karaoke folder.
+
+        Returns:
+            tuple: Contains the root and the paths of the song relative to
+            this root.
+
+        Raises:
+            UnknownKaraRootError: If no root has the prefix of the song.
+        """
+        root, _ = self.get_root(song_paths.video)
+        if not root.prefix:
+            return root, song_paths
+
+        return root, song_paths.without_prefix(root.prefix)
+
+
+class InvalidKaraFolderError(DakaraError):
+    """Error raised when the config of the karaoke folder is invalid."""
+
+
+class UnknownKaraRootError(DakaraError):
+    """Error raised when a path is not in any root of the karaoke folder."""
@@ -1,5 +1,6 @@
 """Parse metadata from song files."""
 
+import asyncio
 import json
 import subprocess
 import sys
@@ -9,6 +10,8 @@ from datetime import timedelta
 from dakara_base.exceptions import DakaraError
 from pymediainfo import MediaInfo
 
+from dakara_feeder.tools import registry
+
 
 class MetadataParser(ABC):
     """Base class for metadata parser.
@@ -37,6 +40,19 @@ class MetadataParser(ABC):
             filename (str): Path of the file to parse.
         """
 
+    @classmethod
+    async def parse_async(cls, filename):
+        """Parse metadata from file name asynchronously.
+
+        By default, the file is parsed with `parse` in a thread of the default
+        executor of the event loop.
+
+        Args:
+            filename (str): Path of the file to parse.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, cls.parse, filename)
+
     @abstractmethod
     def get_duration(self):
         """Get duration as timedelta object.
@@ -95,6 +111,72 @@ class NullMetadataParser(MetadataParser):
         return 0
 
 
+class CachedMetadataParser(MetadataParser):
+    """Metadata parser serving values extracted previously.
+
+    The parser only stores the duration and the number of audio and subtitle
+    tracks, which are the values stored in the metadata cache. It cannot parse
+    files by itself, it is created from the values of another parser.
+
+    It can be used with:
+
+    >>> from Path import path
+    >>> file_path = Path("path/to/file")
+    >>> metadata = CachedMetadataParser.from_parser(
+    ...     FFProbeMetadataParser.parse(file_path)
+    ... )
+    >>> metadata.get_duration()
+    datetime.timedelta(seconds=42)
+    """
+
+    @staticmethod
+    def is_available():
+        # the parser cannot parse files by itself
+        return False
+
+    @classmethod
+    def parse(cls, filename):
+        """Parse metadata from file name.
+
+        Args:
+            filename (str): Path of the file to parse.
+
+        Raises:
+            CachedMetadataParseError: Always, as cached metadata can only be
+                created from another parser.
+        """
+        raise CachedMetadataParseError(
+            "Cached metadata cannot be parsed from file '{}'".format(filename)
+        )
+
+    @classmethod
+    def from_parser(cls, parser):
+        """Store the values of another parser.
+
+        Args:
+            parser (MetadataParser): Parser to get the values from.
+
+        Returns:
+            CachedMetadataParser: Parser containing the values.
+        """
+        return cls(
+            {
+                "duration": parser.get_duration().total_seconds(),
+                "audio_tracks_count": parser.get_audio_tracks_count(),
+                "subtitle_tracks_count": parser.get_subtitle_tracks_count(),
+            }
+        )
+
+    def get_duration(self):
+        return timedelta(seconds=self.metadata["duration"])
+
+    def get_audio_tracks_count(self):
+        return self.metadata["audio_tracks_count"]
+
+    def get_subtitle_tracks_count(self):
+        return self.metadata["subtitle_tracks_count"]
+
+
 class MediainfoMetadataParser(MetadataParser):
     """Metadata parser based on PyMediaInfo (wrapper for MediaInfo).
 
@@ -114,7 +196,7 @@ class MediainfoMetadataParser(MetadataParser):
 
     @staticmethod
     def is_available():
-        return MediaInfo.can_parse()
+        return registry.get("mediainfo").available
 
     @classmethod
     def parse(cls, filename):
@@ -183,16 +265,7 @@ class FFProbeMetadataParser(MetadataParser):
 
     @staticmethod
     def is_available():
-        try:
-            subprocess.run(
-                ["ffprobe", "-version"],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
-            return True
-
-        except FileNotFoundError:
-            return False
+        return registry.get("ffprobe").available
 
     @classmethod
     def parse(cls, filename):
@@ -209,7 +282,49 @@ class FFProbeMetadataParser(MetadataParser):
         if not cls.is_available():
             raise FFProbeNotInstalledError("FFProbe not installed")
 
-        command = [
+        process = subprocess.run(
+            cls.get_command(filename), stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        )
+
+        return cls.from_output(filename, process.returncode, process.stdout)
+
+    @classmethod
+    async def parse_async(cls, filename):
+        """Parse metadata from file name asynchronously.
+
+        The command is run as a subprocess of the event loop.
+
+        Args:
+            filename (path.Path): Path of the file to parse.
+
+        Raises:
+            FFProbeNotInstalledError: If FFProbe is not installed.
+            MediaNotFoundError: If the media file cannot be found.
+            MediaParseError: If the media file cannot be parsed.
+        """
+        if not cls.is_available():
+            raise FFProbeNotInstalledError("FFProbe not installed")
+
+        process = await asyncio.create_subprocess_exec(
+            *cls.get_command(filename),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        stdout, _ = await process.communicate()
+
+        return cls.from_output(filename, process.returncode, stdout)
+
+    @staticmethod
+    def get_command(filename):
+        """Get the command to probe a file.
+
+        Args:
+            filename (path.Path): Path of the file to parse.
+
+        Returns:
+            list: Command and its arguments.
+        """
+        return [
             "ffprobe",
             "-loglevel",
             "quiet",
@@ -220,12 +335,24 @@ class FFProbeMetadataParser(MetadataParser):
             filename,
         ]
 
-        process = subprocess.run(
-            command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
-        )
+    @classmethod
+    def from_output(cls, filename, returncode, output):
+        """Create the parser from the output of the command.
+
+        Args:
+            filename (path.Path): Path of the parsed file.
+            returncode (int): Return code of the command.
+            output (bytes): Standard output of the command.
 
+        Returns:
+            FFProbeMetadataParser: Parser of the file.
+
+        Raises:
+            MediaNotFoundError: If the media file cannot be found.
+            MediaParseError: If the media file cannot be parsed.
+        """
         # check errors
-        if process.returncode:
+        if returncode:
             # check the file exists
             if not filename.exists():
                 raise MediaNotFoundError("Media file '{}' not found".format(filename))
@@ -235,7 +362,7 @@ class FFProbeMetadataParser(MetadataParser):
                 "Error when processing media file '{}'".format(filename)
             )
 
-        return cls(json.loads(process.stdout.decode(sys.stdout.encoding)))
+        return cls(json.loads(output.decode(sys.stdout.encoding)))
 
     def get_duration(self):
         # try in generic location
@@ -274,6 +401,10 @@ class MediaParseError(DakaraError):
     """Error if the metadata cannot be parsed."""
 
 
+class CachedMetadataParseError(MediaParseError):
+    """Error if CachedMetadataParser is used to parse a file."""
+
+
 class MediaNotFoundError(DakaraError, FileNotFoundError):
     """Error if the metadata file does not exist."""
 
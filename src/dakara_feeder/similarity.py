@@ -1,6 +1,37 @@
-"""Compute similarities."""
+"""Compute similarities.
 
+Similarity of paths can be computed pair by pair with
+`calculate_file_path_similarity`, or for two lists of paths at once with
+`calculate_file_path_similarity_matrix`, which requires NumPy:
+
+>>> matrix = calculate_file_path_similarity_matrix(paths1, paths2)
+>>> matrix[0, 1]
+0.92
+"""
+
+import math
+import zlib
+from collections import Counter, defaultdict
 from difflib import SequenceMatcher
+from itertools import chain, product
+
+from dakara_base.exceptions import DakaraError
+
+try:
+    import numpy
+
+except ImportError:
+    numpy = None
+
+# margin to absorb rounding errors when comparing bounds of similarity
+EPSILON = 1e-9
+
+TRIGRAM_DIMENSIONS = 2048
+BLOCK_SIZE = 1024
+
+SIMILARITY_SEQUENCE_MATCHER = "sequence_matcher"
+SIMILARITY_TRIGRAM = "trigram"
+SIMILARITY_METHODS = (SIMILARITY_SEQUENCE_MATCHER, SIMILARITY_TRIGRAM)
 
 
 def calculate_file_path_similarity(path1, path2, weight_dirname=1, weight_basename=8):
@@ -49,3 +80,364 @@ def compute_symmetric_gestalt_pattern_matching(val1, val2):
         SequenceMatcher(None, val1, val2).ratio()
         + SequenceMatcher(None, val2, val1).ratio()
     )
+
+
+def get_character_tokens(value):
+    """Get the characters of a string, with their number of occurrence.
+
+    The number of tokens two strings have in common is the number of
+    characters they have in common, regardless of their position.
+
+    Args:
+        value (str): String to split.
+
+    Returns:
+        list of tuple: Each character of the string, with the number of times
+        it has been seen so far.
+    """
+    counts = Counter()
+    tokens = []
+    for character in value:
+        counts[character] += 1
+        tokens.append((character, counts[character]))
+
+    return tokens
+
+
+def get_prefix_length(length, minimal_ratio):
+    """Get the number of rarest tokens to index for a string.
+
+    Two strings which ratio of common tokens is at least the minimal ratio
+    necessarily share at least one token among their prefix.
+
+    Args:
+        length (int): Number of tokens of the string.
+        minimal_ratio (float): Minimal ratio of common tokens.
+
+    Returns:
+        int: Length of the prefix.
+    """
+    minimal_overlap = math.ceil(minimal_ratio * length / (2 - minimal_ratio) - EPSILON)
+    return min(length, max(length - minimal_overlap + 1, 0))
+
+
+def get_common_characters_ratio(counts1, length1, counts2, length2):
+    """Compute the ratio of characters two strings have in common.
+
+    This ratio is an upper bound of the ratio computed by `SequenceMatcher`.
+
+    Args:
+        counts1 (dict): Number of occurrences of each character of the first
+            string.
+        length1 (int): Length of the first string.
+        counts2 (dict): Number of occurrences of each character of the second
+            string.
+        length2 (int): Length of the second string.
+
+    Returns:
+        float: Ratio of common characters, between 0 and 1.
+    """
+    if not length1 and not length2:
+        return 1.0
+
+    common = 0
+    for character, count in counts1.items():
+        other_count = counts2.get(character)
+        if other_count:
+            common += count if count < other_count else other_count
+
+    return 2 * common / (length1 + length2)
+
+
+def generate_file_path_candidates(
+    paths1, paths2, threshold, weight_dirname=1, weight_basename=8
+):
+    """Generate pairs of paths which similarity may be higher than a threshold.
+
+    The similarity of two paths, as computed by
+    `calculate_file_path_similarity` with the same weights, cannot be higher
+    than the threshold if their base names do not have enough characters in
+    common. Paths are indexed by the rarest characters of their base name,
+    so that only pairs sharing at least one of them are considered. Pairs
+    which lengths or numbers of common characters are too different are then
+    discarded. No pair which similarity is higher than the threshold is
+    missed.
+
+    Args:
+        paths1 (list of path.Path): Paths to compare.
+        paths2 (list of path.Path): Paths to compare.
+        threshold (float): Minimal similarity value.
+        weight_dirname (float): Importance of the directory name in similarity
+            calculation.
+        weight_basename (float): Importance of the base name in similarity
+            calculation.
+
+    Yields:
+        tuple of int: Index in the first list and index in the second list of
+        each candidate pair.
+    """
+    total_weight = weight_dirname + weight_basename
+
+    # minimal similarity of base names, for identical directory names
+    minimal_ratio = (threshold * total_weight - weight_dirname) / weight_basename
+
+    if minimal_ratio <= 0:
+        yield from product(range(len(paths1)), range(len(paths2)))
+        return
+
+    basenames1 = [path.basename() for path in paths1]
+    basenames2 = [path.basename() for path in paths2]
+    tokens1 = [get_character_tokens(basename) for basename in basenames1]
+    tokens2 = [get_character_tokens(basename) for basename in basenames2]
+
+    # sort tokens from the rarest to the most common
+    frequencies = Counter(chain.from_iterable(chain(tokens1, tokens2)))
+    for tokens in chain(tokens1, tokens2):
+        tokens.sort(key=lambda token: (frequencies[token], token))
+
+    # index the prefix of each path of the second list
+    index = defaultdict(list)
+    empty2 = []
+    for index2, tokens in enumerate(tokens2):
+        if not tokens:
+            empty2.append(index2)
+
+        for token in tokens[: get_prefix_length(len(tokens), minimal_ratio)]:
+            index[token].append(index2)
+
+    counts2 = [Counter(basename) for basename in basenames2]
+    dirnames2 = [path.dirname() for path in paths2]
+    dirnames_counts2 = [Counter(dirname) for dirname in dirnames2]
+
+    for index1, tokens in enumerate(tokens1):
+        # empty base names are only similar to empty base names
+        if not tokens:
+            yield from ((index1, index2) for index2 in empty2)
+            continue
+
+        candidates = set()
+        for token in tokens[: get_prefix_length(len(tokens), minimal_ratio)]:
+            candidates.update(index.get(token, ()))
+
+        length1 = len(tokens)
+        counts1 = Counter(basenames1[index1])
+        dirname1 = paths1[index1].dirname()
+        dirname_counts1 = Counter(dirname1)
+        for index2 in sorted(candidates):
+            length2 = len(tokens2[index2])
+
+            # discard pairs with too different lengths
+            if 2 * min(length1, length2) / (length1 + length2) < (
+                minimal_ratio - EPSILON
+            ):
+                continue
+
+            # discard pairs with not enough common characters
+            basename_bound = get_common_characters_ratio(
+                counts1, length1, counts2[index2], length2
+            )
+            if basename_bound < minimal_ratio - EPSILON:
+                continue
+
+            dirname_bound = get_common_characters_ratio(
+                dirname_counts1,
+                len(dirname1),
+                dirnames_counts2[index2],
+                len(dirnames2[index2]),
+            )
+            if (
+                weight_dirname * dirname_bound + weight_basename * basename_bound
+            ) / total_weight < threshold - EPSILON:
+                continue
+
+            yield index1, index2
+
+
+def check_numpy():
+    """Check NumPy can be used.
+
+    Raises:
+        NumpyNotAvailableError: If NumPy is not installed.
+    """
+    if numpy is None:
+        raise NumpyNotAvailableError(
+            "NumPy is required to compute similarities of trigrams"
+        )
+
+
+def get_trigram_vectors(values, dimensions=TRIGRAM_DIMENSIONS):
+    """Convert strings to vectors of counts of their character trigrams.
+
+    Trigrams are hashed to a fixed number of dimensions. Strings are padded,
+    so that the empty string has a trigram too.
+
+    Args:
+        values (list of str): Strings to convert.
+        dimensions (int): Number of dimensions of the vectors.
+
+    Returns:
+        numpy.ndarray: Matrix with one normalized vector per string.
+    """
+    check_numpy()
+
+    rows = []
+    columns = []
+    for row, value in enumerate(values):
+        padded = "\x02\x02{}\x03".format(value)
+        for start in range(len(padded) - 2):
+            rows.append(row)
+            columns.append(
+                zlib.crc32(padded[start : start + 3].encode(errors="surrogatepass"))
+                % dimensions
+            )
+
+    vectors = numpy.zeros((len(values), dimensions), dtype=numpy.float32)
+    numpy.add.at(vectors, (rows, columns), 1)
+    vectors /= numpy.linalg.norm(vectors, axis=1, keepdims=True)
+
+    return vectors
+
+
+def get_file_path_vectors(paths):
+    """Convert paths to vectors of trigrams of their base name and directory.
+
+    Directories are often shared, so that the vector of each directory is
+    computed only once.
+
+    Args:
+        paths (list of path.Path): Paths to convert.
+
+    Returns:
+        tuple: Contains:
+
+        1. numpy.ndarray: Matrix with one vector per base name;
+        2. numpy.ndarray: Matrix with one vector per distinct directory;
+        3. numpy.ndarray: Index of the directory of each path in the
+           previous matrix.
+    """
+    check_numpy()
+
+    dirnames, dirnames_indexes = numpy.unique(
+        [str(path.dirname()) for path in paths], return_inverse=True
+    )
+
+    return (
+        get_trigram_vectors([path.basename() for path in paths]),
+        get_trigram_vectors(dirnames.tolist()),
+        dirnames_indexes.ravel(),
+    )
+
+
+def calculate_vectors_similarity_matrix(
+    vectors1, vectors2, weight_dirname=1, weight_basename=8
+):
+    """Calculate the similarity of each pair of paths from their vectors.
+
+    Args:
+        vectors1 (tuple): Vectors of paths to compare, as given by
+            `get_file_path_vectors`.
+        vectors2 (tuple): Vectors of paths to compare, as given by
+            `get_file_path_vectors`.
+        weight_dirname (float): Importance of the directory name in similarity
+            calculation. Result is divided by the sum of all weights.
+        weight_basename (float): Importance of the base name in similarity
+            calculation. Result is divided by the sum of all weights.
+
+    Returns:
+        numpy.ndarray: Matrix of similarity values, between 0 and 1, with one
+        row per path of the first vectors and one column per path of the
+        second vectors.
+    """
+    basename_vectors1, dirname_vectors1, dirnames_indexes1 = vectors1
+    basename_vectors2, dirname_vectors2, dirnames_indexes2 = vectors2
+
+    basename_similarity = numpy.dot(basename_vectors1, basename_vectors2.T)
+    dirname_similarity = numpy.dot(dirname_vectors1, dirname_vectors2.T)[
+        numpy.ix_(dirnames_indexes1, dirnames_indexes2)
+    ]
+
+    return numpy.clip(
+        (dirname_similarity * weight_dirname + basename_similarity * weight_basename)
+        / (weight_dirname + weight_basename),
+        0,
+        1,
+    )
+
+
+def calculate_file_path_similarity_matrix(
+    paths1, paths2, weight_dirname=1, weight_basename=8
+):
+    """Calculate the similarity of each pair of paths of two lists.
+
+    The similarity of two strings is the cosine of their vectors of trigrams.
+    Like `calculate_file_path_similarity`, a weighted sum of the similarity
+    of directory names and of base names is used. Values are comparable but
+    not identical to the ones of `calculate_file_path_similarity`.
+
+    Args:
+        paths1 (list of path.Path): Paths to compare.
+        paths2 (list of path.Path): Paths to compare.
+        weight_dirname (float): Importance of the directory name in similarity
+            calculation. Result is divided by the sum of all weights.
+        weight_basename (float): Importance of the base name in similarity
+            calculation. Result is divided by the sum of all weights.
+
+    Returns:
+        numpy.ndarray: Matrix of similarity values, between 0 and 1, with one
+        row per path of the first list and one column per path of the second
+        list.
+    """
+    return calculate_vectors_similarity_matrix(
+        get_file_path_vectors(paths1),
+        get_file_path_vectors(paths2),
+        weight_dirname,
+        weight_basename,
+    )
+
+
+def calculate_file_path_similarities(
+    paths1, paths2, threshold, weight_dirname=1, weight_basename=8
+):
+    """Calculate the similarity of pairs of paths higher than a threshold.
+
+    This is a batch version of `calculate_file_path_similarity` to use with
+    `dakara_feeder.difference.match_similar`. The similarity matrix is
+    computed by blocks of rows with `calculate_vectors_similarity_matrix`,
+    so that memory usage is bounded. The vectors of the second list are
+    computed once for all blocks.
+
+    Args:
+        paths1 (list of path.Path): Paths to compare.
+        paths2 (list of path.Path): Paths to compare.
+        threshold (float): Only consider pairs with similarity higher than this
+            value.
+        weight_dirname (float): Importance of the directory name in similarity
+            calculation.
+        weight_basename (float): Importance of the base name in similarity
+            calculation.
+
+    Yields:
+        tuple: Similarity value, index in the first list and index in the
+        second list of each pair.
+    """
+    if not paths1 or not paths2:
+        return
+
+    vectors2 = get_file_path_vectors(paths2)
+    for start in range(0, len(paths1), BLOCK_SIZE):
+        matrix = calculate_vectors_similarity_matrix(
+            get_file_path_vectors(paths1[start : start + BLOCK_SIZE]),
+            vectors2,
+            weight_dirname,
+            weight_basename,
+        )
+        for index1, index2 in zip(*numpy.nonzero(matrix > threshold)):
+            yield float(matrix[index1, index2]), start + int(index1), int(index2)
+
+
+class InvalidSimilarityMethodError(DakaraError):
+    """Error raised when the method to compute similarities is unknown."""
+
+
+class NumpyNotAvailableError(DakaraError):
+    """Error raised when NumPy is required but not installed."""
@@ -1,7 +1,10 @@
 """Song class to extract data from media file."""
 
+import asyncio
 import logging
 
+from path import Path
+
 from dakara_feeder.metadata import (
     FFProbeMetadataParser,
     MediaParseError,
@@ -62,11 +65,21 @@ class BaseSong:
 
     Metadata are available when calling `pre_process`.
 
+    If a metadata cache is given with the `metadata_cache` attribute, metadata
+    of unchanged video files are served from it, with a
+    `dakara_feeder.metadata.CachedMetadataParser`. Only the duration and the
+    number of audio and subtitle tracks are available from the cache.
+
     If the metadata cannot be extracted from the video file for any reason, the
     `metadata` attribute will contain a
     `dakara_feeder.metadata.NullMetadataParser` that always return null
     values (e.g. 0 seconds duration).
 
+    When feeding asynchronously, `get_representation_async` parses metadata
+    with `parse_metadata_async`, then builds the representation with
+    `build_representation`. If `get_representation` or `parse_metadata` are
+    overriden, `get_representation` is called in a thread instead.
+
     Args:
         base_directory (path.Path): Path to the scanned directory.
         paths (directory_lister.SongPaths): Paths of the song file.
@@ -85,6 +98,10 @@ class BaseSong:
             relative to the base directory.
         metadata (dakara_feeder.metadata.MetadataParser): Object for
             containing metadata of the video file.
+        metadata_cache (dakara_feeder.cache.MetadataCache): Cache of metadata
+            to use, if any.
+        prefix (str): Directory of the scanned directory inside the karaoke
+            folder, if the karaoke folder has several roots. Empty otherwise.
     """
 
     metadata_class = FFProbeMetadataParser
@@ -96,16 +113,69 @@ class BaseSong:
         self.subtitle_path = paths.subtitle
         self.others_path = paths.others
         self.metadata = NullMetadataParser.parse(self.video_path)
+        self.metadata_cache = None
+        self.prefix = ""
 
     def parse_metadata(self):
-        """Use the requested metadata parser to parse video file."""
+        """Use the requested metadata parser to parse video file.
+
+        If a metadata cache is set, metadata are taken from it if possible.
+        """
+        file_path = self.base_directory / self.video_path
+
+        # try to get metadata from the cache
+        if self.metadata_cache is not None:
+            metadata = self.metadata_cache.get(self.get_kara_folder_path(), file_path)
+            if metadata is not None:
+                self.metadata = metadata
+                return
+
         try:
-            self.metadata = self.metadata_class.parse(
-                self.base_directory / self.video_path
+            self.metadata = self.metadata_class.parse(file_path)
+
+        except MediaParseError as error:
+            logger.error("Cannot parse metadata: {}".format(error))
+            return
+
+        if self.metadata_cache is not None:
+            self.metadata_cache.set(
+                self.get_kara_folder_path(), file_path, self.metadata
             )
 
+    async def parse_metadata_async(self):
+        """Use the requested metadata parser to parse video file asynchronously.
+
+        If a metadata cache is set, metadata are taken from it if possible.
+        """
+        file_path = self.base_directory / self.video_path
+
+        # try to get metadata from the cache
+        if self.metadata_cache is not None:
+            metadata = self.metadata_cache.get(self.get_kara_folder_path(), file_path)
+            if metadata is not None:
+                self.metadata = metadata
+                return
+
+        try:
+            self.metadata = await self.metadata_class.parse_async(file_path)
+
         except MediaParseError as error:
             logger.error("Cannot parse metadata: {}".format(error))
+            return
+
+        if self.metadata_cache is not None:
+            self.metadata_cache.set(
+                self.get_kara_folder_path(), file_path, self.metadata
+            )
+
+    def get_kara_folder_path(self):
+        """Get the path of the song file relative to the karaoke folder.
+
+        Returns:
+            path.Path: Path to the song file, prefixed by the directory of the
+            scanned directory inside the karaoke folder.
+        """
+        return Path(self.prefix) / self.video_path
 
     def pre_process(self):
         """Process preparative actions.
@@ -314,11 +384,54 @@ class BaseSong:
             dict: JSON-compiliant structure representing the song.
         """
         self.parse_metadata()
+
+        return self.build_representation()
+
+    async def get_representation_async(self):
+        """Get the simple representation of the song asynchronously.
+
+        Metadata are parsed asynchronously, then the representation is built
+        in a thread of the default executor of the event loop, as custom
+        methods may access files. If `get_representation` or `parse_metadata`
+        are overriden, `get_representation` is called in the executor instead,
+        so that the representation is the same as when feeding synchronously.
+
+        Returns:
+            dict: JSON-compiliant structure representing the song.
+        """
+        loop = asyncio.get_running_loop()
+
+        if self.is_overriden("get_representation") or self.is_overriden(
+            "parse_metadata"
+        ):
+            return await loop.run_in_executor(None, self.get_representation)
+
+        await self.parse_metadata_async()
+
+        return await loop.run_in_executor(None, self.build_representation)
+
+    def is_overriden(self, name):
+        """Tell if a method of the base class is overriden by the song class.
+
+        Args:
+            name (str): Name of the method.
+
+        Returns:
+            bool: True if the song class defines its own method.
+        """
+        return getattr(type(self), name) is not getattr(BaseSong, name)
+
+    def build_representation(self):
+        """Build the simple representation of the song from parsed metadata.
+
+        Returns:
+            dict: JSON-compiliant structure representing the song.
+        """
         self.pre_process()
         representation = {
             "title": self.get_title(),
             "filename": str(self.video_path.basename()),
-            "directory": str(self.video_path.dirname()),
+            "directory": str(self.get_kara_folder_path().dirname()),
             "duration": self.get_duration(),
             "has_instrumental": self.get_has_instrumental(),
             "version": self.get_version(),
@@ -7,6 +7,8 @@ from abc import ABC, abstractmethod
 from dakara_base.exceptions import DakaraError
 from path import TempDir
 
+from dakara_feeder.tools import registry
+
 logger = logging.getLogger(__name__)
 
 
@@ -53,16 +55,7 @@ class FFmpegSubtitleExtractor(SubtitleExtractor):
 
     @staticmethod
     def is_available():
-        try:
-            subprocess.run(
-                ["ffmpeg", "-version"],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
-            return True
-
-        except FileNotFoundError:
-            return False
+        return registry.get("ffmpeg").available
 
     @classmethod
     def extract(cls, input_file_path):
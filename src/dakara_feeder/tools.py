@@ -0,0 +1,287 @@
+"""Detect external tools used to extract data from media files.
+
+Tools are detected once per process and their capabilities are shared among
+the metadata parsers and the subtitle extractors:
+
+>>> tool = registry.get("ffprobe")
+>>> tool.available
+True
+>>> tool.version
+'6.1.1'
+
+Detection of binaries can be stored on disk, keyed by the path and the
+modification time of the binary, so that it is not repeated on each run:
+
+>>> registry.set_cache_path(Path("path/to/tools.json"))
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+from threading import Lock
+
+from dakara_base.exceptions import DakaraError
+from pymediainfo import MediaInfo
+
+logger = logging.getLogger(__name__)
+
+
+class Tool:
+    """Capabilities of an external tool.
+
+    Args:
+        name (str): Name of the tool.
+        path (str): Path to the binary of the tool, if any.
+        available (bool): `True` if the tool can be used.
+        version (str): Version of the tool, if it can be determined.
+        features (list of str): Features the tool was built with.
+
+    Attributes:
+        name (str): Name of the tool.
+        path (str): Path to the binary of the tool, if any.
+        available (bool): `True` if the tool can be used.
+        version (str): Version of the tool, if it can be determined.
+        features (list of str): Features the tool was built with.
+    """
+
+    def __init__(self, name, path=None, available=False, version=None, features=None):
+        self.name = name
+        self.path = path
+        self.available = available
+        self.version = version
+        self.features = [] if features is None else features
+
+    def __repr__(self):
+        return "{} {} ({})".format(
+            self.name, self.version, "available" if self.available else "missing"
+        )
+
+    def to_dict(self):
+        """Get a JSON-compliant representation of the tool.
+
+        Returns:
+            dict: Representation of the tool.
+        """
+        return {
+            "name": self.name,
+            "path": self.path,
+            "available": self.available,
+            "version": self.version,
+            "features": self.features,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a tool from its representation.
+
+        Args:
+            data (dict): Representation of the tool.
+
+        Returns:
+            Tool: Tool instance.
+        """
+        return cls(
+            data["name"],
+            path=data.get("path"),
+            available=data.get("available", False),
+            version=data.get("version"),
+            features=data.get("features"),
+        )
+
+
+def detect_ffmpeg_binary(name, path):
+    """Detect capabilities of a binary from FFmpeg.
+
+    Args:
+        name (str): Name of the tool.
+        path (str): Path to the binary.
+
+    Returns:
+        Tool: Capabilities of the binary.
+    """
+    try:
+        process = subprocess.run(
+            [path, "-version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+
+    except OSError:
+        return Tool(name, path)
+
+    if process.returncode:
+        return Tool(name, path)
+
+    output = process.stdout.decode(errors="replace")
+    match = re.search(r"version (\S+)", output)
+
+    return Tool(
+        name,
+        path,
+        available=True,
+        version=match.group(1) if match else None,
+        features=sorted(set(re.findall(r"--enable-([\w-]+)", output))),
+    )
+
+
+def detect_mediainfo_library(name):
+    """Detect capabilities of the MediaInfo library.
+
+    Args:
+        name (str): Name of the tool.
+
+    Returns:
+        Tool: Capabilities of the library.
+    """
+    try:
+        library, handle, version, _ = MediaInfo._get_library()
+
+    except Exception:
+        return Tool(name)
+
+    library.MediaInfo_Close(handle)
+    library.MediaInfo_Delete(handle)
+
+    return Tool(name, available=True, version=version)
+
+
+class ToolsRegistry:
+    """Registry of the external tools.
+
+    Each tool is detected the first time it is requested, then its
+    capabilities are kept for the lifetime of the registry. The registry can
+    be used by several threads at the same time.
+
+    Args:
+        cache_path (path.Path): Path to the file where to store the detection
+            of binaries. If not given, detection is not stored.
+
+    Attributes:
+        BINARIES (dict): Function to detect the capabilities of each binary,
+            by name.
+        LIBRARIES (dict): Function to detect the capabilities of each library,
+            by name.
+        cache_path (path.Path): Path to the file where to store the detection
+            of binaries.
+        tools (dict): Detected tools, by name.
+    """
+
+    BINARIES = {"ffmpeg": detect_ffmpeg_binary, "ffprobe": detect_ffmpeg_binary}
+    LIBRARIES = {"mediainfo": detect_mediainfo_library}
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.tools = {}
+        self.lock = Lock()
+
+    def set_cache_path(self, cache_path):
+        """Set the file where to store the detection of binaries.
+
+        Args:
+            cache_path (path.Path): Path to the file. If `None`, detection is
+                not stored.
+        """
+        self.cache_path = cache_path
+
+    def clear(self):
+        """Forget detected tools."""
+        with self.lock:
+            self.tools.clear()
+
+    def get(self, name):
+        """Get the capabilities of a tool.
+
+        Args:
+            name (str): Name of the tool.
+
+        Returns:
+            Tool: Capabilities of the tool.
+
+        Raises:
+            UnknownToolError: If the tool is not managed by the registry.
+        """
+        with self.lock:
+            if name not in self.tools:
+                self.tools[name] = self.detect(name)
+                logger.debug("Detected tool %s", self.tools[name])
+
+            return self.tools[name]
+
+    def detect(self, name):
+        """Detect the capabilities of a tool.
+
+        Args:
+            name (str): Name of the tool.
+
+        Returns:
+            Tool: Capabilities of the tool.
+
+        Raises:
+            UnknownToolError: If the tool is not managed by the registry.
+        """
+        if name in self.LIBRARIES:
+            return self.LIBRARIES[name](name)
+
+        if name not in self.BINARIES:
+            raise UnknownToolError("Unknown tool {}".format(name))
+
+        path = shutil.which(name)
+        if path is None:
+            return Tool(name)
+
+        # try to get the detection from the cache
+        mtime = os.stat(path).st_mtime
+        cache = self.load_cache()
+        entry = cache.get(path)
+        if entry is not None and entry.get("mtime") == mtime:
+            return Tool.from_dict(entry)
+
+        tool = self.BINARIES[name](name, path)
+
+        # store the detection in the cache
+        if tool.available:
+            cache[path] = {**tool.to_dict(), "mtime": mtime}
+            self.save_cache(cache)
+
+        return tool
+
+    def load_cache(self):
+        """Load the detection of binaries from disk.
+
+        Returns:
+            dict: Representation of tools, by path of binary. Empty if there
+            is no cache, or if it cannot be read.
+        """
+        if self.cache_path is None or not self.cache_path.exists():
+            return {}
+
+        try:
+            return json.loads(self.cache_path.read_text())
+
+        except (OSError, ValueError) as error:
+            logger.debug("Cannot read tools cache: %s", error)
+            return {}
+
+    def save_cache(self, cache):
+        """Save the detection of binaries on disk.
+
+        Args:
+            cache (dict): Representation of tools, by path of binary.
+        """
+        if self.cache_path is None:
+            return
+
+        try:
+            self.cache_path.parent.makedirs_p()
+            self.cache_path.write_text(json.dumps(cache))
+
+        except OSError as error:
+            logger.debug("Cannot write tools cache: %s", error)
+
+
+class UnknownToolError(DakaraError):
+    """Error if a tool not managed by the registry is requested."""
+
+
+registry = ToolsRegistry()
@@ -1,19 +1,147 @@
 """Various utilities."""
 
+import asyncio
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+CHUNK_MAX_BYTES = 512 * 1024
+CHUNK_MIN_ITEMS = 1
+CHUNK_TARGET_DURATION = 5
+
 
 def divide_chunks(listing, size):
     """Yield successive chunks from given listing.
 
+    The listing is consumed lazily, so it can be a generator.
+
     Args:
-        listing (list): List of objects to slice.
+        listing (iterable): Objects to slice.
         size (int): Maximum size of each chunk.
 
     Yield:
         list: List of objects of limited size.
     """
-    # looping till length listing
-    for i in range(0, len(listing), size):
-        yield listing[i : i + size]
+    iterator = iter(listing)
+
+    # looping till the listing is exhausted
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+
+        yield chunk
+
+
+class AdaptiveChunker:
+    """Divide items in chunks of limited serialized size.
+
+    Items are put in a chunk until its size in JSON reaches a maximum number
+    of bytes, or until it contains the current number of items per chunk. An
+    item larger than the maximum size is put alone in its chunk.
+
+    The number of items per chunk is adapted from the duration of the requests
+    sending the chunks, as given by `record`: it is halved when a request is
+    slower than the target duration, and increased by a quarter when it is
+    twice as fast, within the given bounds.
+
+    >>> chunker = AdaptiveChunker(max_items=100)
+    >>> for chunk in chunker.divide(items):
+    ...     start = time.monotonic()
+    ...     send(chunk)
+    ...     chunker.record(time.monotonic() - start)
+
+    Args:
+        max_items (int): Maximum number of items per chunk, also used as the
+            initial number of items per chunk.
+        max_bytes (int): Maximum size of a chunk in JSON in bytes.
+        min_items (int): Minimum number of items per chunk.
+        target_duration (float): Expected duration of a request in seconds.
+
+    Attributes:
+        max_items (int): Maximum number of items per chunk.
+        max_bytes (int): Maximum size of a chunk in JSON in bytes.
+        min_items (int): Minimum number of items per chunk.
+        target_duration (float): Expected duration of a request in seconds.
+        size (int): Current number of items per chunk.
+    """
+
+    def __init__(
+        self,
+        max_items,
+        max_bytes=CHUNK_MAX_BYTES,
+        min_items=CHUNK_MIN_ITEMS,
+        target_duration=CHUNK_TARGET_DURATION,
+    ):
+        self.max_items = max(max_items, 1)
+        self.max_bytes = max_bytes
+        self.min_items = min(max(min_items, 1), self.max_items)
+        self.target_duration = target_duration
+        self.size = self.max_items
+
+    @classmethod
+    def from_config(cls, config, max_items):
+        """Create a chunker from the config of the server.
+
+        Args:
+            config (dict): Config of the server.
+            max_items (int): Maximum number of items per chunk.
+
+        Returns:
+            AdaptiveChunker: Chunker.
+        """
+        return cls(
+            max_items,
+            max_bytes=config.get("chunk_max_bytes", CHUNK_MAX_BYTES),
+            min_items=config.get("chunk_min_items", CHUNK_MIN_ITEMS),
+            target_duration=config.get("chunk_target_duration", CHUNK_TARGET_DURATION),
+        )
+
+    def divide(self, items):
+        """Yield successive chunks from given items.
+
+        The items are consumed lazily, so they can come from a generator.
+
+        Args:
+            items (iterable of dict): JSON-compliant objects to divide.
+
+        Yield:
+            list: List of objects of limited size.
+        """
+        chunk = []
+        chunk_bytes = 2
+        for item in items:
+            # two more bytes for the separator between items
+            item_bytes = len(json.dumps(item)) + 2
+
+            if chunk and (
+                len(chunk) >= self.size or chunk_bytes + item_bytes > self.max_bytes
+            ):
+                yield chunk
+                chunk = []
+                chunk_bytes = 2
+
+            chunk.append(item)
+            chunk_bytes += item_bytes
+
+        if chunk:
+            yield chunk
+
+    def record(self, duration):
+        """Adapt the number of items per chunk from the duration of a request.
+
+        Args:
+            duration (float): Duration of the request sending a chunk in
+                seconds.
+        """
+        if duration > self.target_duration:
+            self.size = max(self.size // 2, self.min_items)
+            return
+
+        if duration < self.target_duration / 2:
+            self.size = min(self.size + max(self.size // 4, 1), self.max_items)
 
 
 def clean_dict(target, keys):
@@ -28,3 +156,96 @@ def clean_dict(target, keys):
         dict: Dictionary with requested keys.
     """
     return {key: target[key] for key in keys if key in target}
+
+
+def map_concurrently(function, iterable, workers=1, background=False):
+    """Apply a function on each item of an iterable with a pool of threads.
+
+    Results are yielded in the same order as the items of the iterable. No
+    more than twice the number of workers items are processed in advance, so
+    pending results do not pile up in memory.
+
+    Args:
+        function (function): Function to apply, taking one item as argument.
+        iterable (iterable): Items to process.
+        workers (int): Number of threads to use. If 1 or less, items are
+            processed sequentially in the calling thread, unless `background`
+            is set.
+        background (bool): If `True`, items are always processed in other
+            threads, so that producing the items of the iterable overlaps with
+            processing them, even with one worker.
+
+    Yield:
+        anything: Result of the function for each item.
+    """
+    if workers <= 1 and not background:
+        yield from map(function, iterable)
+        return
+
+    workers = max(workers, 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        try:
+            for item in iterable:
+                pending.append(executor.submit(function, item))
+
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+
+        finally:
+            # do not wait for items that will never be consumed
+            for future in pending:
+                future.cancel()
+
+
+async def run_concurrently(coroutines, limit=1):
+    """Run coroutines with a limited number of them at the same time.
+
+    The iterable of coroutines is consumed lazily, so it can be a generator
+    creating each coroutine only when it can be run. If a coroutine raises an
+    error, the error is raised and the running coroutines are canceled.
+
+    Args:
+        coroutines (iterable of coroutine): Coroutines to run.
+        limit (int): Maximum number of coroutines running at the same time.
+    """
+    pending = set()
+    try:
+        for coroutine in coroutines:
+            pending.add(asyncio.ensure_future(coroutine))
+
+            if len(pending) >= limit:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    task.result()
+
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                task.result()
+
+    finally:
+        # do not leave coroutines running after an error
+        for task in pending:
+            task.cancel()
+
+
+def get_available_cpu_count():
+    """Get the number of CPUs the current process can use.
+
+    Returns:
+        int: Number of CPUs available for the process, at least 1.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+
+    # not available on Windows and MacOS
+    except AttributeError:
+        return os.cpu_count() or 1
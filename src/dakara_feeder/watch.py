@@ -0,0 +1,486 @@
+"""Watch the karaoke folder for changes.
+
+Two watchers are available: `InotifyWatcher`, which relies on the inotify API
+of Linux, and `PollingWatcher`, which periodically compares the modification
+time of directories. Both report the directories affected by a change,
+relative to the watched folder:
+
+>>> with get_watcher(Path("path/to/kara")) as watcher:
+...     while True:
+...         directories, files = watcher.wait_changes(debounce=2)
+
+A burst of events is reported at once: changes are accumulated until no new
+event happens during the debounce delay.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+from abc import ABC, abstractmethod
+
+from dakara_base.exceptions import DakaraError
+from path import Path
+
+from dakara_feeder.directory import list_entries
+
+logger = logging.getLogger(__name__)
+
+
+DEBOUNCE = 2
+POLLING_INTERVAL = 10
+
+# constants from `sys/inotify.h`
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+def list_directories(path):
+    """List recursively the directories of a folder.
+
+    Args:
+        path (path.Path): Path of the folder.
+
+    Returns:
+        list of path.Path: Paths of the directories, relative to the folder,
+        including the folder itself as an empty path.
+    """
+    directories = []
+    stack = [Path("")]
+    while stack:
+        directory = stack.pop()
+        directories.append(directory)
+
+        try:
+            _, subdirectories = list_entries(path / directory)
+
+        except OSError:
+            continue
+
+        stack.extend(directory / name for name in sorted(subdirectories))
+
+    return directories
+
+
+def get_subdirectories(directories, directory):
+    """Get the known directories contained in a directory.
+
+    Args:
+        directories (iterable of path.Path): Known directories.
+        directory (path.Path): Parent directory.
+
+    Returns:
+        set of path.Path: Directories contained in the parent directory, at
+        any depth, including the parent directory.
+    """
+    prefix = directory + os.sep
+    return {
+        known
+        for known in directories
+        if known == directory or not directory or known.startswith(prefix)
+    }
+
+
+class BaseWatcher(ABC):
+    """Abstract class for a watcher of a folder.
+
+    Args:
+        path (path.Path): Path of the watched folder.
+
+    Attributes:
+        path (path.Path): Path of the watched folder.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+    @staticmethod
+    def is_available():
+        """Check if the watcher can be used.
+
+        Returns:
+            bool: `True` if the watcher can be used.
+        """
+        return True
+
+    @abstractmethod
+    def start(self):
+        """Start watching the folder."""
+
+    @abstractmethod
+    def stop(self):
+        """Stop watching the folder."""
+
+    @abstractmethod
+    def poll(self, timeout=None):
+        """Collect changes.
+
+        Args:
+            timeout (float): Maximum time to wait for changes in seconds. If
+                `None`, wait until something happens.
+
+        Returns:
+            tuple: Contains the set of affected directories and the set of
+            files which content has changed, relative to the watched folder.
+            Both sets can be empty.
+        """
+
+    def wait_changes(self, debounce=DEBOUNCE):
+        """Wait for changes in the folder.
+
+        Changes are accumulated until nothing happens during the debounce
+        delay.
+
+        Args:
+            debounce (float): Delay in seconds without new changes before
+                returning.
+
+        Returns:
+            tuple: Contains the set of affected directories and the set of
+            files which content has changed, relative to the watched folder.
+            The set of directories is never empty.
+        """
+        directories = set()
+        files = set()
+        while True:
+            new_directories, new_files = self.poll(
+                timeout=debounce if directories or files else None
+            )
+
+            if not new_directories and not new_files:
+                if directories or files:
+                    # files can only change inside a directory
+                    directories.update(file.dirname() for file in files)
+                    return directories, files
+
+                continue
+
+            directories.update(new_directories)
+            files.update(new_files)
+
+
+class PollingWatcher(BaseWatcher):
+    """Watcher comparing the modification time of directories periodically.
+
+    Only addition, removal and renaming of files are detected this way, as
+    they change the modification time of the parent directory. Changes of
+    the content of a file are not detected.
+
+    Args:
+        path (path.Path): Path of the watched folder.
+        interval (float): Delay between two comparisons in seconds.
+
+    Attributes:
+        path (path.Path): Path of the watched folder.
+        interval (float): Delay between two comparisons in seconds.
+        snapshot (dict): Modification time in nanoseconds of each directory.
+    """
+
+    def __init__(self, path, interval=POLLING_INTERVAL):
+        super().__init__(path)
+        self.interval = interval
+        self.snapshot = {}
+
+    def take_snapshot(self):
+        """Get the modification time of each directory of the folder.
+
+        Returns:
+            dict: Modification time in nanoseconds, by directory relative to
+            the folder.
+        """
+        snapshot = {}
+        for directory in list_directories(self.path):
+            try:
+                snapshot[directory] = os.stat(self.path / directory).st_mtime_ns
+
+            except OSError:
+                continue
+
+        return snapshot
+
+    def start(self):
+        self.snapshot = self.take_snapshot()
+        logger.debug("Polling %i directories", len(self.snapshot))
+
+    def stop(self):
+        self.snapshot = {}
+
+    def poll(self, timeout=None):
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+
+        snapshot = self.take_snapshot()
+        directories = {
+            directory
+            for directory in snapshot.keys() | self.snapshot.keys()
+            if snapshot.get(directory) != self.snapshot.get(directory)
+        }
+        self.snapshot = snapshot
+
+        return directories, set()
+
+
+class InotifyWatcher(BaseWatcher):
+    """Watcher using the inotify API of Linux.
+
+    Each directory of the folder is watched. Directories created or moved in
+    the folder are watched as they appear, and all their content is
+    considered as changed.
+
+    Args:
+        path (path.Path): Path of the watched folder.
+
+    Attributes:
+        path (path.Path): Path of the watched folder.
+        fd (int): File descriptor of the inotify instance, set when the
+            watcher is started.
+        libc (ctypes.CDLL): C library providing the inotify functions, set
+            when the watcher is started.
+        directories_by_descriptor (dict): Watched directory relative to the
+            folder, by watch descriptor.
+        descriptors_by_directory (dict): Watch descriptor, by watched directory
+            relative to the folder.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.fd = None
+        self.libc = None
+        self.directories_by_descriptor = {}
+        self.descriptors_by_directory = {}
+
+    @staticmethod
+    def get_libc():
+        """Get the C library providing the inotify functions.
+
+        Returns:
+            ctypes.CDLL: C library, or `None` if it cannot be loaded or does
+            not support inotify.
+        """
+        name = ctypes.util.find_library("c")
+        if name is None:
+            return None
+
+        try:
+            libc = ctypes.CDLL(name, use_errno=True)
+
+        except OSError:
+            return None
+
+        if not hasattr(libc, "inotify_init1"):
+            return None
+
+        return libc
+
+    @classmethod
+    def is_available(cls):
+        return cls.get_libc() is not None
+
+    def start(self):
+        self.libc = self.get_libc()
+        if self.libc is None:
+            raise WatcherError("Inotify is not available on this system")
+
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise WatcherError(
+                "Cannot initialize inotify: {}".format(os.strerror(ctypes.get_errno()))
+            )
+
+        self.add_watches(Path(""))
+        logger.debug("Watching %i directories", len(self.descriptors_by_directory))
+
+    def stop(self):
+        if self.fd is None:
+            return
+
+        os.close(self.fd)
+        self.fd = None
+        self.directories_by_descriptor.clear()
+        self.descriptors_by_directory.clear()
+
+    def add_watches(self, directory):
+        """Watch a directory and all its sub directories.
+
+        Args:
+            directory (path.Path): Directory to watch, relative to the folder.
+
+        Returns:
+            list of path.Path: Newly watched directories.
+        """
+        added = []
+        for subdirectory in list_directories(self.path / directory):
+            relative_directory = (directory / subdirectory).normpath()
+            if relative_directory == ".":
+                relative_directory = Path("")
+
+            descriptor = self.libc.inotify_add_watch(
+                self.fd,
+                os.fsencode(self.path / relative_directory),
+                WATCH_MASK,
+            )
+
+            if descriptor < 0:
+                logger.warning(
+                    "Cannot watch directory '%s': %s",
+                    relative_directory,
+                    os.strerror(ctypes.get_errno()),
+                )
+                continue
+
+            self.directories_by_descriptor[descriptor] = relative_directory
+            self.descriptors_by_directory[relative_directory] = descriptor
+            added.append(relative_directory)
+
+        return added
+
+    def remove_watches(self, directory):
+        """Forget a directory and all its sub directories.
+
+        The kernel removes the watches of deleted directories by itself.
+
+        Args:
+            directory (path.Path): Directory to forget, relative to the
+                folder.
+
+        Returns:
+            set of path.Path: Forgotten directories.
+        """
+        removed = get_subdirectories(self.descriptors_by_directory, directory)
+        for subdirectory in removed:
+            descriptor = self.descriptors_by_directory.pop(subdirectory)
+            self.directories_by_descriptor.pop(descriptor, None)
+
+        return removed
+
+    def read_events(self):
+        """Read pending events.
+
+        Yields:
+            tuple: Contains the watch descriptor, the mask and the name of
+            each event.
+        """
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+
+            except BlockingIOError:
+                return
+
+            offset = 0
+            while offset < len(data):
+                descriptor, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+
+                yield descriptor, mask, name
+
+    def poll(self, timeout=None):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set(), set()
+
+        directories = set()
+        files = set()
+        for descriptor, mask, name in self.read_events():
+            # events were lost, consider everything has changed
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("Too many events, watching the whole folder again")
+                directories.update(self.descriptors_by_directory)
+                self.stop()
+                self.start()
+                directories.update(self.descriptors_by_directory)
+                return directories, set()
+
+            directory = self.directories_by_descriptor.get(descriptor)
+            if directory is None:
+                continue
+
+            if mask & IN_IGNORED:
+                self.directories_by_descriptor.pop(descriptor, None)
+                if self.descriptors_by_directory.get(directory) == descriptor:
+                    del self.descriptors_by_directory[directory]
+
+                continue
+
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                directories.add(directory)
+                continue
+
+            directories.add(directory)
+            path = directory / name
+
+            if mask & IN_ISDIR:
+                # all the content of a removed directory has changed
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    directories.update(self.remove_watches(path))
+
+                # all the content of a new directory has changed
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    directories.update(self.add_watches(path))
+
+                continue
+
+            if mask & IN_CLOSE_WRITE:
+                files.add(path)
+
+        return directories, files
+
+
+def get_watcher(path, polling=False, interval=POLLING_INTERVAL):
+    """Get the best watcher for a folder.
+
+    Args:
+        path (path.Path): Path of the watched folder.
+        polling (bool): If `True`, force to use the polling watcher.
+        interval (float): Delay between two comparisons in seconds for the
+            polling watcher.
+
+    Returns:
+        BaseWatcher: Watcher for the folder.
+    """
+    if not polling:
+        if InotifyWatcher.is_available():
+            return InotifyWatcher(path)
+
+        logger.debug("Inotify is not available, polling the folder instead")
+
+    return PollingWatcher(path, interval)
+
+
+class WatcherError(DakaraError):
+    """Error raised when a folder cannot be watched."""
@@ -1,39 +1,483 @@
 """HTTP client for the Dakara server."""
 
+import asyncio
+import gzip
+import json
 import logging
-
-from dakara_base.http_client import HTTPClient, ResponseInvalidError
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain
+from threading import Lock
+
+import requests
+from dakara_base.exceptions import DakaraError
+from dakara_base.http_client import (
+    HTTPClient,
+    MethodError,
+    ResponseInvalidError,
+    ResponseRequestError,
+)
+from dakara_base.utils import create_url, truncate_message
 from path import Path
+from requests.adapters import HTTPAdapter
+
+from dakara_feeder.utils import map_concurrently
+
+try:
+    import zstandard
+
+except ImportError:
+    zstandard = None
 
 logger = logging.getLogger(__name__)
 
 
+CONCURRENCY = 1
+SONGS_PER_PAGE = 1000
+METHODS = ("get", "post", "put", "patch", "delete")
+
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSIONS = (COMPRESSION_GZIP, COMPRESSION_ZSTD)
+COMPRESSION_THRESHOLD = 1024
+GZIP_LEVEL = 6
+
+
 class HTTPClientDakara(HTTPClient):
-    """Client to communicate with the Dakara server."""
+    """Client to communicate with the Dakara server.
+
+    Requests are sent through one session, which keeps connections to the
+    server alive between requests. Methods dispatching several requests send
+    them with at most `concurrency` requests at the same time.
+
+    JSON bodies can be compressed with the `Content-Encoding` header, if the
+    server or its reverse proxy is able to decompress them. Bodies smaller
+    than the compression threshold are sent as is.
+
+    Args:
+        config (dict): Config of the server. The key `concurrency` gives the
+            number of requests that can be sent at the same time, the key
+            `compression` gives the algorithm to compress JSON bodies, if any,
+            the key `compression_threshold` the minimal size in bytes of
+            a JSON body to compress, and the key `songs_per_page` the number
+            of songs per page when retrieving songs.
+        endpoint_prefix (str): Prefix of the endpoint, added to the URL.
+        mute_raise (bool): If true, no exception will be raised when
+            performing connections with the server (but authentication), only
+            logged.
+
+    Attributes:
+        concurrency (int): Number of requests that can be sent at the same
+            time by methods dispatching several requests.
+        session (requests.Session): Session used to send requests, created
+            on first request.
+        compression (str): Algorithm to compress JSON bodies, see
+            `COMPRESSIONS`, or `None` to not compress them.
+        compression_threshold (int): Minimal size in bytes of a JSON body to
+            compress.
+        songs_per_page (int): Number of songs per page requested when
+            retrieving songs, if the server paginates them.
+
+    Raises:
+        InvalidCompressionError: If the compression algorithm is unknown.
+        CompressionNotAvailableError: If the library for the compression
+            algorithm is not installed.
+    """
+
+    def __init__(self, config, endpoint_prefix="", mute_raise=False):
+        super().__init__(config, endpoint_prefix=endpoint_prefix, mute_raise=mute_raise)
+        self.concurrency = max(config.get("concurrency", CONCURRENCY), 1)
+        self.session = None
+        self.session_lock = Lock()
+
+        self.compression = config.get("compression") or None
+        self.compression_threshold = config.get(
+            "compression_threshold", COMPRESSION_THRESHOLD
+        )
+        self.songs_per_page = config.get("songs_per_page", SONGS_PER_PAGE)
+
+        if self.compression is not None and self.compression not in COMPRESSIONS:
+            raise InvalidCompressionError(
+                "Invalid compression '{}', must be one of: {}".format(
+                    self.compression, ", ".join(COMPRESSIONS)
+                )
+            )
+
+        if self.compression == COMPRESSION_ZSTD and zstandard is None:
+            raise CompressionNotAvailableError(
+                "Zstandard is required to compress requests with zstd"
+            )
+
+    def get_session(self):
+        """Get the session used to send requests.
+
+        The session is created on first call. Its pool of connections is large
+        enough to keep one connection per concurrent request alive.
+
+        Returns:
+            requests.Session: Session.
+        """
+        with self.session_lock:
+            if self.session is None:
+                self.session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=self.concurrency)
+                self.session.mount("http://", adapter)
+                self.session.mount("https://", adapter)
+
+            return self.session
+
+    def close(self):
+        """Close the connections kept alive with the server."""
+        with self.session_lock:
+            if self.session is not None:
+                self.session.close()
+                self.session = None
+
+    def send_request_raw(
+        self,
+        method,
+        endpoint,
+        *args,
+        message_on_error="",
+        function_on_error=None,
+        **kwargs
+    ):
+        """Generic method to send requests to the server.
+
+        It behaves like the method of the parent class, but sends requests
+        through the session of the client, and compresses JSON bodies if
+        requested.
+
+        Args:
+            method (str): Name of the HTTP method to use.
+            endpoint (str): Endpoint to send the request to. Will be added to
+                the end of the server URL.
+            message_on_error (str): Message to display in logs in case of
+                error. It should describe what the request was about.
+            function_on_error (function): Fuction called if the request is not
+                successful, it will receive the response and must return an
+                exception that will be raised. If not provided, a basic error
+                management is done.
+            Extra arguments are passed to the get/post/put/patch/delete
+                methods of the session.
+
+        Returns:
+            requests.models.Response: Response object.
+
+        Raises:
+            MethodError: If the method is not supported.
+            ResponseRequestError: For any error when communicating with the server.
+            ResponseInvalidError: If the response has an error code different
+                to 2**.
+        """
+        # handle method function
+        if method not in METHODS:
+            raise MethodError("Method {} not supported".format(method))
+
+        send_method = getattr(self.get_session(), method)
+
+        # handle message on error
+        if not message_on_error:
+            message_on_error = "Unable to request the server"
+
+        # compress JSON body
+        if self.compression is not None and kwargs.get("json") is not None:
+            kwargs = self.compress_json(kwargs)
+
+        # forge URL
+        url = create_url(url=self.server_url, path=endpoint)
+        logger.debug("Sending %s request to %s", method.upper(), url)
+
+        try:
+            # send request to the server
+            response = send_method(url, *args, **kwargs)
+
+        except requests.exceptions.RequestException as error:
+            # handle connection error
+            logger.error("%s, communication error", message_on_error)
+            raise ResponseRequestError(
+                "Error when communicating with the server: {}".format(error)
+            ) from error
+
+        # return here if the request was made without error
+        if response.ok:
+            return response
+
+        # otherwise call custom error management function
+        if function_on_error:
+            raise function_on_error(response)
+
+        # otherwise manage error generically
+        logger.error(message_on_error)
+        logger.debug(
+            "Error %i: %s", response.status_code, truncate_message(response.text)
+        )
+
+        raise ResponseInvalidError(
+            "Error {} when communicating with the server: {}".format(
+                response.status_code, response.text
+            )
+        )
+
+    def compress_json(self, kwargs):
+        """Replace the JSON body of a request by its compressed version.
+
+        The JSON body is serialized the same way requests does. If it is
+        smaller than the compression threshold, it is sent as is.
+
+        Args:
+            kwargs (dict): Extra arguments of the request, containing the JSON
+                body with the key `json`.
+
+        Returns:
+            dict: Extra arguments of the request, containing the compressed
+            body with the key `data`.
+        """
+        kwargs = dict(kwargs)
+        body = json.dumps(kwargs.pop("json"), allow_nan=False).encode("utf-8")
+        headers = {**(kwargs.get("headers") or {}), "Content-Type": "application/json"}
+
+        if len(body) >= self.compression_threshold:
+            if self.compression == COMPRESSION_ZSTD:
+                compressed_body = zstandard.ZstdCompressor().compress(body)
+
+            else:
+                compressed_body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+            logger.debug(
+                "Compressed request body from %i to %i bytes",
+                len(body),
+                len(compressed_body),
+            )
+            body = compressed_body
+            headers["Content-Encoding"] = self.compression
+
+        kwargs["data"] = body
+        kwargs["headers"] = headers
+
+        return kwargs
+
+    def dispatch(self, function, items):
+        """Call a function on each item with concurrent requests.
+
+        Requests are sent in other threads, so that the items can be produced
+        while previous requests are sent. An error raised by a request is
+        raised when its result is reached, and pending requests are canceled.
+
+        Args:
+            function (function): Function sending a request, taking one item
+                as argument.
+            items (iterable): Items to send.
+
+        Yields:
+            anything: Result of the function for each item, in the same order
+            as the items.
+        """
+        return map_concurrently(function, items, self.concurrency, background=True)
 
     def retrieve_songs(self):
         """Retreive the songs of the library containing their path.
 
-        Returns:
-            list: List of path on the songs.
+        If the server paginates the songs, the first page gives the number of
+        pages, then the next pages are retrieved concurrently. Songs are given
+        as soon as their page is received, so that only a few pages are in
+        memory at the same time. If the server does not paginate the songs,
+        they are all retrieved at once.
+
+        Yields:
+            dict: Path and ID of each song.
+
+        Raises:
+            SongsCountMismatchError: If the number of songs received differs
+                from the number of songs announced by the server, for
+                instance if the library changed between pages.
         """
         endpoint = "library/songs/retrieve/"
-        songs = self.get(endpoint)
+
+        def get_page(page):
+            return self.get(
+                endpoint, params={"page": page, "page_size": self.songs_per_page}
+            )
+
+        response = get_page(1)
+
+        # the server does not paginate songs
+        if isinstance(response, list):
+            count = len(response)
+            pages = [response]
+
+        else:
+            count = response["count"]
+            logger.debug(
+                "Retrieving %i songs in %i pages",
+                response["count"],
+                response["pagination"]["last"],
+            )
+            pages = chain(
+                [response["results"]],
+                (
+                    page_response["results"]
+                    for page_response in self.dispatch(
+                        get_page, range(2, response["pagination"]["last"] + 1)
+                    )
+                ),
+            )
 
         # join the directory and the filename
-        return [
-            {"path": Path(song["directory"]) / song["filename"], "id": song["id"]}
-            for song in songs
-        ]
+        received_count = 0
+        for songs in pages:
+            received_count += len(songs)
+            for song in songs:
+                yield {
+                    "path": Path(song["directory"]) / song["filename"],
+                    "id": song["id"],
+                }
+
+        # songs may have been skipped by pages
+        if received_count != count:
+            raise SongsCountMismatchError(
+                "Received {} songs from the server instead of {}".format(
+                    received_count, count
+                )
+            )
 
     def post_song(self, song):
         """Create one or several songs on the server.
 
         Args:
             song (dict or list of dict): New song(s) representation.
+
+        Returns:
+            dict or list of dict: Created song(s), as returned by the server.
+
+        Raises:
+            SongInvalidError: If the server rejects the song(s), i.e. if the
+                server returns 400.
+            dakara_base.http_client.ResponseInvalidError: If the response of
+                the server is not OK.
         """
+
+        def on_error(response):
+            if response.status_code == 400:
+                return SongInvalidError(
+                    "Song rejected by the server: {}".format(
+                        truncate_message(response.text)
+                    )
+                )
+
+            return ResponseInvalidError(
+                "Error {} when communicating with the server: {}".format(
+                    response.status_code, response.text
+                )
+            )
+
         endpoint = "library/songs/"
-        self.post(endpoint, json=song)
+        return self.post(endpoint, json=song, function_on_error=on_error)
+
+    def post_songs_chunk(self, songs, on_sent=None, on_rejected=None):
+        """Create a chunk of songs on the server.
+
+        If the server rejects the chunk and `on_rejected` is given, the chunk
+        is bisected to isolate the invalid songs, and the valid songs are
+        created anyway.
+
+        Args:
+            songs (list of dict): New songs representations.
+            on_sent (function): Function called with the duration in seconds
+                of the request of the whole chunk once it is sent.
+            on_rejected (function): Function called with the representation
+                of each invalid song and the `SongInvalidError` it caused. If
+                not given, the error is raised.
+
+        Returns:
+            list of dict: Created songs, as returned by the server.
+
+        Raises:
+            SongInvalidError: If the server rejects the chunk and
+                `on_rejected` is not given.
+        """
+        start = time.monotonic()
+        try:
+            response = self.post_song(songs)
+            error = None
+
+        except SongInvalidError as invalid_error:
+            if on_rejected is None:
+                raise
+
+            error = invalid_error
+
+        if on_sent is not None:
+            on_sent(time.monotonic() - start)
+
+        if error is None:
+            return response
+
+        return self.bisect_songs(songs, error, on_rejected)
+
+    def bisect_songs(self, songs, error, on_rejected):
+        """Create the valid songs of a chunk rejected by the server.
+
+        The chunk is split in halves which are sent again, recursively, until
+        the invalid songs are isolated. This costs a number of requests
+        logarithmic in the size of the chunk for each invalid song.
+
+        Args:
+            songs (list of dict): New songs representations of the rejected
+                chunk.
+            error (SongInvalidError): Error raised when the chunk was sent.
+            on_rejected (function): Function called with the representation
+                of each invalid song and the `SongInvalidError` it caused.
+
+        Returns:
+            list of dict: Created songs, as returned by the server, or `None`
+            if the server does not describe them.
+        """
+        if len(songs) == 1:
+            on_rejected(songs[0], error)
+            return []
+
+        middle = len(songs) // 2
+        created_songs = []
+        for half in (songs[:middle], songs[middle:]):
+            try:
+                response = self.post_song(half)
+
+            except SongInvalidError as half_error:
+                response = self.bisect_songs(half, half_error, on_rejected)
+
+            # the server does not describe the created songs
+            if not isinstance(response, list) or created_songs is None:
+                created_songs = None
+                continue
+
+            created_songs.extend(response)
+
+        return created_songs
+
+    def post_songs(self, songs_chunks, on_sent=None, on_rejected=None):
+        """Create several chunks of songs on the server concurrently.
+
+        Args:
+            songs_chunks (iterable of list of dict): Chunks of new songs
+                representations.
+            on_sent (function): Function called with the duration in seconds
+                of the request of each chunk once it is sent, from the thread
+                sending it.
+            on_rejected (function): Function called with the representation
+                of each song rejected by the server and the `SongInvalidError`
+                it caused, from the thread sending it. If not given, the
+                error of a rejected chunk is raised.
+
+        Yields:
+            list of dict: Created songs of each chunk, as returned by the
+            server, in the same order as the chunks.
+        """
+        return self.dispatch(
+            partial(self.post_songs_chunk, on_sent=on_sent, on_rejected=on_rejected),
+            songs_chunks,
+        )
 
     def put_song(self, song_id, song):
         """Update one song on the server.
@@ -45,6 +489,24 @@ class HTTPClientDakara(HTTPClient):
         endpoint = "library/songs/{}/".format(song_id)
         self.put(endpoint, json=song)
 
+    def put_songs(self, songs):
+        """Update several songs on the server concurrently.
+
+        Args:
+            songs (iterable of tuple): ID and representation of each song to
+                update.
+
+        Yields:
+            int: ID of each updated song, in the same order as the songs.
+        """
+
+        def put_song(item):
+            song_id, song = item
+            self.put_song(song_id, song)
+            return song_id
+
+        return self.dispatch(put_song, songs)
+
     def delete_song(self, song_id):
         """Delete one song on the server.
 
@@ -54,6 +516,22 @@ class HTTPClientDakara(HTTPClient):
         endpoint = "library/songs/{}/".format(song_id)
         self.delete(endpoint)
 
+    def delete_songs(self, songs_id):
+        """Delete several songs on the server concurrently.
+
+        Args:
+            songs_id (iterable of int): ID of each song to delete.
+
+        Yields:
+            int: ID of each deleted song, in the same order as the songs.
+        """
+
+        def delete_song(song_id):
+            self.delete_song(song_id)
+            return song_id
+
+        return self.dispatch(delete_song, songs_id)
+
     def prune_artists(self):
         """Prune artists without songs.
 
@@ -153,6 +631,132 @@ class HTTPClientDakara(HTTPClient):
         self.post(endpoint, work_type, function_on_error=on_error)
 
 
+class AsyncHTTPClientDakara:
+    """Asynchronous client to communicate with the Dakara server.
+
+    It is the asynchronous counterpart of `HTTPClientDakara`, which it wraps.
+    Requests are sent by the wrapped client in a pool of threads, so that the
+    event loop is not blocked, and no more than `concurrency` requests are
+    sent at the same time:
+
+    >>> with AsyncHTTPClientDakara(http_client) as async_http_client:
+    ...     await async_http_client.put_song(song_id, song)
+
+    Args:
+        http_client (HTTPClientDakara): Client to wrap, already authenticated.
+
+    Attributes:
+        http_client (HTTPClientDakara): Wrapped client.
+        executor (concurrent.futures.ThreadPoolExecutor): Pool of threads
+            sending requests.
+    """
+
+    def __init__(self, http_client):
+        self.http_client = http_client
+        self.executor = ThreadPoolExecutor(max_workers=http_client.concurrency)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @property
+    def concurrency(self):
+        """int: Number of requests that can be sent at the same time."""
+        return self.http_client.concurrency
+
+    def close(self):
+        """Stop the pool of threads."""
+        self.executor.shutdown()
+
+    async def run(self, function, *args):
+        """Call a method of the wrapped client in the pool of threads.
+
+        Args:
+            function (function): Method to call.
+            Extra arguments are passed to the method.
+
+        Returns:
+            anything: Result of the method.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(function, *args))
+
+    async def post_songs_chunk(self, songs, on_sent=None, on_rejected=None):
+        """Create a chunk of songs on the server, isolating invalid songs.
+
+        Args:
+            songs (list of dict): New songs representations.
+            on_sent (function): Function called with the duration in seconds
+                of the request of the whole chunk once it is sent, from the
+                thread sending it.
+            on_rejected (function): Function called with the representation
+                of each invalid song and the `SongInvalidError` it caused,
+                from the thread sending it. If not given, the error is raised.
+
+        Returns:
+            list of dict: Created songs, as returned by the server.
+        """
+        return await self.run(
+            partial(
+                self.http_client.post_songs_chunk,
+                on_sent=on_sent,
+                on_rejected=on_rejected,
+            ),
+            songs,
+        )
+
+    async def put_song(self, song_id, song):
+        """Update one song on the server.
+
+        Args:
+            song_id (int): ID of the song to update.
+            song (dict): Song representation.
+        """
+        await self.run(self.http_client.put_song, song_id, song)
+
+    async def delete_song(self, song_id):
+        """Delete one song on the server.
+
+        Args:
+            song_id (int): ID of the song to delete.
+        """
+        await self.run(self.http_client.delete_song, song_id)
+
+    async def prune_artists(self):
+        """Prune artists without songs.
+
+        Returns:
+            int: Number of deleted artists.
+        """
+        return await self.run(self.http_client.prune_artists)
+
+    async def prune_works(self):
+        """Prune works without songs.
+
+        Returns:
+            int: Number of deleted works.
+        """
+        return await self.run(self.http_client.prune_works)
+
+
+class SongInvalidError(ResponseInvalidError):
+    """Error raised when the server rejects songs."""
+
+
+class SongsCountMismatchError(DakaraError):
+    """Error raised when songs of the server are not all retrieved."""
+
+
+class InvalidCompressionError(DakaraError):
+    """Error raised when the compression algorithm is unknown."""
+
+
+class CompressionNotAvailableError(DakaraError):
+    """Error raised when the library to compress requests is not installed."""
+
+
 class TagAlreadyExistsError(Exception):
     """Error if a tag already exists."""
 
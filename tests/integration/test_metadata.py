@@ -1,3 +1,4 @@
+import asyncio
 from datetime import timedelta
 from unittest import TestCase, skipUnless
 
@@ -99,3 +100,13 @@ class FFProbeMetadataParserIntegrationTestCase(TestCase):
             parser = FFProbeMetadataParser.parse(Path(file))
 
         self.assertEqual(parser.get_subtitle_tracks_count(), 1)
+
+    def test_parse_async(self):
+        """Test to extract metadata asynchronously."""
+        with path("tests.resources.media", "dummy.mkv") as file:
+            parser = asyncio.run(FFProbeMetadataParser.parse_async(Path(file)))
+
+        self.assertEqual(
+            parser.get_duration(), timedelta(seconds=2, microseconds=23000)
+        )
+        self.assertEqual(parser.get_audio_tracks_count(), 2)
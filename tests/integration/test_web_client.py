@@ -0,0 +1,148 @@
+import gzip
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from unittest import TestCase, skipIf
+
+from dakara_feeder import web_client
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Handler of a stand-in server decompressing and recording requests."""
+
+    def do_POST(self):
+        self.handle_json()
+
+    def do_PUT(self):
+        self.handle_json()
+
+    def handle_json(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        encoding = self.headers.get("Content-Encoding")
+
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+
+        elif encoding == "zstd":
+            body = web_client.zstandard.ZstdDecompressor().decompress(body)
+
+        data = json.loads(body)
+        self.server.requests.append(
+            {
+                "method": self.command,
+                "path": self.path,
+                "encoding": encoding,
+                "data": data,
+            }
+        )
+
+        response = json.dumps(data).encode()
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HTTPClientDakaraIntegrationTestCase(TestCase):
+    """Integration tests for the HTTP client against a stand-in server."""
+
+    def setUp(self):
+        # create the stand-in server
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        self.server.requests = []
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+        # create songs with long lyrics
+        self.songs = [
+            {
+                "title": "Song {}".format(i),
+                "filename": "song_{}.mp4".format(i),
+                "directory": "directory",
+                "lyrics": "La la la, this is the song number {}\n".format(i) * 100,
+            }
+            for i in range(10)
+        ]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def create_client(self, **config):
+        """Create a client connected to the stand-in server.
+
+        Args:
+            Extra arguments are added to the config of the server.
+
+        Returns:
+            web_client.HTTPClientDakara: Client.
+        """
+        http_client = web_client.HTTPClientDakara(
+            {"address": "127.0.0.1:{}".format(self.server.server_port), **config},
+            endpoint_prefix="api",
+        )
+        http_client.token = "token"
+
+        return http_client
+
+    def send_songs(self, http_client):
+        """Create and update songs on the stand-in server.
+
+        Args:
+            http_client (web_client.HTTPClientDakara): Client.
+
+        Returns:
+            list: Created songs, as returned by the stand-in server.
+        """
+        created_songs = http_client.post_song(self.songs)
+        http_client.put_song(1, self.songs[1])
+        http_client.put_song(2, {"title": "Short"})
+        http_client.close()
+
+        return created_songs
+
+    def assert_same_data(self, requests, encodings):
+        """Assert received requests contain the songs that were sent.
+
+        Args:
+            requests (list of dict): Requests received by the stand-in server.
+            encodings (list of str): Expected content encoding of each request.
+        """
+        self.assertListEqual(
+            [(request["method"], request["path"]) for request in requests],
+            [
+                ("POST", "/api/library/songs/"),
+                ("PUT", "/api/library/songs/1/"),
+                ("PUT", "/api/library/songs/2/"),
+            ],
+        )
+        self.assertListEqual(
+            [request["data"] for request in requests],
+            [self.songs, self.songs[1], {"title": "Short"}],
+        )
+        self.assertListEqual([request["encoding"] for request in requests], encodings)
+
+    def test_send_gzip(self):
+        """Test compressed and uncompressed uploads give identical data."""
+        created_songs = self.send_songs(self.create_client())
+        uncompressed_requests = list(self.server.requests)
+        self.server.requests.clear()
+
+        created_songs_gzip = self.send_songs(self.create_client(compression="gzip"))
+        compressed_requests = list(self.server.requests)
+
+        self.assert_same_data(uncompressed_requests, [None, None, None])
+        self.assert_same_data(compressed_requests, ["gzip", "gzip", None])
+        self.assertListEqual(created_songs, created_songs_gzip)
+
+    @skipIf(web_client.zstandard is None, "Zstandard not installed")
+    def test_send_zstd(self):
+        """Test zstd compressed uploads give identical data."""
+        self.send_songs(self.create_client(compression="zstd"))
+
+        self.assert_same_data(self.server.requests, ["zstd", "zstd", None])
@@ -0,0 +1,339 @@
+import os
+import time
+from datetime import timedelta
+from unittest import TestCase
+from unittest.mock import patch
+
+from path import Path, TempDir
+
+from dakara_feeder.cache import (
+    FingerprintCache,
+    MetadataCache,
+    ScanCache,
+    get_file_fingerprint,
+)
+from dakara_feeder.directory import FileClassifier, SongPaths, list_directory
+from dakara_feeder.metadata import FFProbeMetadataParser
+
+
+class GetFileFingerprintTestCase(TestCase):
+    """Test the fingerprint of files."""
+
+    def test_small_file(self):
+        """Test to fingerprint a file smaller than a block."""
+        with TempDir() as temp:
+            file_path = temp / "video.mkv"
+            file_path.write_bytes(b"content")
+
+            inode, size, head, tail = get_file_fingerprint(file_path, block_size=16)
+
+            self.assertEqual(inode, os.stat(file_path).st_ino)
+
+        self.assertEqual(size, 7)
+        self.assertEqual(head, tail)
+
+    def test_large_file(self):
+        """Test to fingerprint a file larger than a block."""
+        with TempDir() as temp:
+            file_path_1 = temp / "video_1.mkv"
+            file_path_1.write_bytes(b"head" + b"0" * 100 + b"tail")
+            file_path_2 = temp / "video_2.mkv"
+            file_path_2.write_bytes(b"head" + b"1" * 100 + b"tail")
+            file_path_3 = temp / "video_3.mkv"
+            file_path_3.write_bytes(b"head" + b"0" * 100 + b"TAIL")
+
+            fingerprint_1 = get_file_fingerprint(file_path_1, block_size=4)
+            fingerprint_2 = get_file_fingerprint(file_path_2, block_size=4)
+            fingerprint_3 = get_file_fingerprint(file_path_3, block_size=4)
+
+        # the middle of the file is not read
+        self.assertEqual(fingerprint_1[1:], fingerprint_2[1:])
+        self.assertNotEqual(fingerprint_1[1:], fingerprint_3[1:])
+        self.assertNotEqual(fingerprint_1[2], fingerprint_1[3])
+
+    def test_missing_file(self):
+        """Test to fingerprint a file that does not exist."""
+        with TempDir() as temp:
+            self.assertIsNone(get_file_fingerprint(temp / "video.mkv"))
+
+
+class FingerprintCacheTestCase(TestCase):
+    """Test the cache of fingerprints."""
+
+    def test_get_set(self):
+        """Test to store and retrieve fingerprints."""
+        with TempDir() as temp:
+            with FingerprintCache(temp / "fingerprints.sqlite") as cache:
+                cache.set(Path("video.mkv"), (1, 2, "head", "tail"))
+
+            # read the database again
+            with FingerprintCache(temp / "fingerprints.sqlite") as cache:
+                self.assertEqual(cache.get(Path("video.mkv")), (1, 2, "head", "tail"))
+                self.assertIsNone(cache.get(Path("other.mkv")))
+
+                # remove the entry
+                cache.set(Path("video.mkv"), None)
+                self.assertIsNone(cache.get(Path("video.mkv")))
+
+    def test_get_missing_evict(self):
+        """Test to find unknown files and remove old ones."""
+        with TempDir() as temp:
+            with FingerprintCache(temp / "fingerprints.sqlite") as cache:
+                cache.set(Path("video_1.mkv"), (1, 2, "head", "tail"))
+                cache.set(Path("video_2.mkv"), (3, 4, "head", "tail"))
+
+                self.assertListEqual(
+                    cache.get_missing([Path("video_1.mkv"), Path("video_3.mkv")]),
+                    [Path("video_3.mkv")],
+                )
+
+                self.assertEqual(cache.evict([Path("video_1.mkv")]), 1)
+                self.assertIsNone(cache.get(Path("video_2.mkv")))
+                self.assertIsNotNone(cache.get(Path("video_1.mkv")))
+
+
+class MetadataCacheTestCase(TestCase):
+    """Test the cache of metadata."""
+
+    def setUp(self):
+        # create metadata
+        self.metadata = FFProbeMetadataParser(
+            {
+                "format": {"duration": "42.5"},
+                "streams": [{"codec_type": "audio"}, {"codec_type": "audio"}],
+            }
+        )
+
+    def test_get_set(self):
+        """Test to store and retrieve metadata."""
+        with TempDir() as temp:
+            file_path = temp / "video.mkv"
+            file_path.write_text("content")
+
+            with MetadataCache(temp / "cache" / "metadata.sqlite") as cache:
+                self.assertIsNone(cache.get(Path("video.mkv"), file_path))
+                cache.set(Path("video.mkv"), file_path, self.metadata)
+
+            with MetadataCache(temp / "cache" / "metadata.sqlite") as cache:
+                metadata = cache.get(Path("video.mkv"), file_path)
+
+        self.assertEqual(metadata.get_duration(), timedelta(seconds=42.5))
+        self.assertEqual(metadata.get_audio_tracks_count(), 2)
+        self.assertEqual(metadata.get_subtitle_tracks_count(), 0)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 0)
+
+    def test_get_changed(self):
+        """Test metadata of a changed file are not served."""
+        with TempDir() as temp:
+            file_path = temp / "video.mkv"
+            file_path.write_text("content")
+
+            with MetadataCache(temp / "metadata.sqlite") as cache:
+                cache.set(Path("video.mkv"), file_path, self.metadata)
+                file_path.write_text("other content")
+
+                self.assertIsNone(cache.get(Path("video.mkv"), file_path))
+
+        self.assertEqual(cache.hits, 0)
+        self.assertEqual(cache.misses, 1)
+
+    def test_evict(self):
+        """Test to remove entries of files that do not exist anymore."""
+        with TempDir() as temp:
+            file_path_1 = temp / "video_1.mkv"
+            file_path_1.write_text("content")
+            file_path_2 = temp / "video_2.mkv"
+            file_path_2.write_text("content")
+
+            with MetadataCache(temp / "metadata.sqlite") as cache:
+                cache.set(Path("video_1.mkv"), file_path_1, self.metadata)
+                cache.set(Path("video_2.mkv"), file_path_2, self.metadata)
+
+                self.assertEqual(cache.evict([Path("video_1.mkv")]), 1)
+                self.assertIsNotNone(cache.get(Path("video_1.mkv"), file_path_1))
+                self.assertIsNone(cache.get(Path("video_2.mkv"), file_path_2))
+
+
+class ScanCacheTestCase(TestCase):
+    """Test the cache of scans."""
+
+    def setUp(self):
+        self.signature = FileClassifier("extension").get_signature()
+
+    def backdate(self, kara_folder):
+        """Set the modification time of the directories a minute ago."""
+        mtime = time.time_ns() - 60_000_000_000
+        for directory in [kara_folder, *kara_folder.walkdirs()]:
+            os.utime(directory, ns=(mtime, mtime))
+
+    def scan(self, kara_folder, cache_path, load=True, workers=1):
+        """Scan the kara folder with a scan cache."""
+        scan_cache = ScanCache(cache_path, kara_folder, self.signature)
+        if load:
+            scan_cache.load()
+
+        with self.assertLogs("dakara_feeder.directory", "DEBUG"):
+            listing = list_directory(
+                kara_folder,
+                classifier=FileClassifier("extension"),
+                scan_cache=scan_cache,
+                workers=workers,
+            )
+
+        scan_cache.save()
+
+        return listing, scan_cache
+
+    def test_reuse_unchanged(self):
+        """Test unchanged directories are not listed again."""
+        with TempDir() as temp:
+            kara_folder = temp / "kara"
+            (kara_folder / "directory").makedirs_p()
+            (kara_folder / "directory" / "song.mkv").touch()
+            (kara_folder / "directory" / "song.ass").touch()
+            cache_path = temp / "cache" / "scan.json"
+            self.backdate(kara_folder)
+
+            # first scan
+            listing1, scan_cache = self.scan(kara_folder, cache_path)
+            self.assertEqual(scan_cache.misses, 2)
+
+            # second scan
+            with patch("dakara_feeder.directory.list_entries") as mocked_list_entries:
+                listing2, scan_cache = self.scan(kara_folder, cache_path)
+
+            mocked_list_entries.assert_not_called()
+            self.assertEqual(scan_cache.hits, 2)
+
+        expected = [
+            SongPaths(
+                Path("directory") / "song.mkv",
+                subtitle=Path("directory") / "song.ass",
+            )
+        ]
+        self.assertListEqual(listing1, expected)
+        self.assertListEqual(listing2, expected)
+
+    def test_reuse_unchanged_parallel(self):
+        """Test unchanged directories are not listed again by a parallel scan."""
+        with TempDir() as temp:
+            kara_folder = temp / "kara"
+            (kara_folder / "directory").makedirs_p()
+            (kara_folder / "directory" / "song.mkv").touch()
+            (kara_folder / "other").makedirs_p()
+            (kara_folder / "other" / "song.mp4").touch()
+            cache_path = temp / "scan.json"
+            self.backdate(kara_folder)
+
+            # first scan
+            listing1, scan_cache = self.scan(kara_folder, cache_path, workers=2)
+            self.assertEqual(scan_cache.misses, 3)
+
+            # second scan
+            with patch("dakara_feeder.directory.list_entries") as mocked_list_entries:
+                listing2, scan_cache = self.scan(kara_folder, cache_path, workers=2)
+
+            mocked_list_entries.assert_not_called()
+            self.assertEqual(scan_cache.hits, 3)
+
+        expected = [
+            SongPaths(Path("directory") / "song.mkv"),
+            SongPaths(Path("other") / "song.mp4"),
+        ]
+        self.assertListEqual(listing1, expected)
+        self.assertListEqual(listing2, expected)
+
+    def test_changed(self):
+        """Test changed directories are listed again."""
+        with TempDir() as temp:
+            kara_folder = temp / "kara"
+            (kara_folder / "directory").makedirs_p()
+            (kara_folder / "directory" / "song.mkv").touch()
+            cache_path = temp / "scan.json"
+            self.backdate(kara_folder)
+
+            # first scan
+            self.scan(kara_folder, cache_path)
+
+            # add a file and make sure the modification time changed
+            (kara_folder / "directory" / "other.mkv").touch()
+            stat = os.stat(kara_folder / "directory")
+            os.utime(
+                kara_folder / "directory",
+                ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000),
+            )
+
+            # second scan
+            listing, scan_cache = self.scan(kara_folder, cache_path)
+
+        self.assertEqual(scan_cache.hits, 1)
+        self.assertEqual(scan_cache.misses, 1)
+        self.assertCountEqual(
+            listing,
+            [
+                SongPaths(Path("directory") / "song.mkv"),
+                SongPaths(Path("directory") / "other.mkv"),
+            ],
+        )
+
+    def test_changed_same_tick(self):
+        """Test directories modified just before the scan are listed again."""
+        with TempDir() as temp:
+            kara_folder = temp / "kara"
+            (kara_folder / "directory").makedirs_p()
+            (kara_folder / "directory" / "song.mkv").touch()
+            cache_path = temp / "scan.json"
+            self.backdate(kara_folder)
+            stat = os.stat(kara_folder / "directory")
+            os.utime(kara_folder / "directory", ns=(stat.st_atime_ns, time.time_ns()))
+
+            # first scan
+            _, scan_cache = self.scan(kara_folder, cache_path)
+            self.assertListEqual(list(scan_cache.new_entries), [""])
+
+            # add a file in the same tick of the modification time
+            stat = os.stat(kara_folder / "directory")
+            (kara_folder / "directory" / "other.mkv").touch()
+            os.utime(kara_folder / "directory", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+            # second scan
+            listing, scan_cache = self.scan(kara_folder, cache_path)
+
+        self.assertEqual(scan_cache.hits, 1)
+        self.assertEqual(scan_cache.misses, 1)
+        self.assertCountEqual(
+            listing,
+            [
+                SongPaths(Path("directory") / "song.mkv"),
+                SongPaths(Path("directory") / "other.mkv"),
+            ],
+        )
+
+    def test_different_signature(self):
+        """Test the cache is discarded if files are classified differently."""
+        with TempDir() as temp:
+            kara_folder = temp / "kara"
+            kara_folder.makedirs_p()
+            cache_path = temp / "scan.json"
+            self.scan(kara_folder, cache_path)
+
+            scan_cache = ScanCache(
+                cache_path, kara_folder, FileClassifier("sniff").get_signature()
+            )
+            scan_cache.load()
+
+        self.assertDictEqual(scan_cache.entries, {})
+
+    def test_rescan(self):
+        """Test to not load the cache."""
+        with TempDir() as temp:
+            kara_folder = temp / "kara"
+            kara_folder.makedirs_p()
+            cache_path = temp / "scan.json"
+            self.scan(kara_folder, cache_path)
+
+            _, scan_cache = self.scan(kara_folder, cache_path, load=False)
+
+        self.assertEqual(scan_cache.hits, 0)
+        self.assertEqual(scan_cache.misses, 1)
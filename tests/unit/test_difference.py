@@ -1,9 +1,18 @@
 from unittest import TestCase
+from unittest.mock import patch
 
 from path import Path
 
 from dakara_feeder import difference
-from dakara_feeder.similarity import calculate_file_path_similarity
+from dakara_feeder.similarity import (
+    calculate_file_path_similarity,
+    generate_file_path_candidates,
+)
+
+
+def compute_length_similarity(item1, item2):
+    """Compute a similarity from the length of strings."""
+    return 1 - abs(len(item1) - len(item2)) / max(len(item1), len(item2))
 
 
 class GenerateDiffTestCase(TestCase):
@@ -46,6 +55,47 @@ class GenerateDiffTestCase(TestCase):
         self.assertCountEqual(["a", "b"], unchanged)
 
 
+class MatchIdenticalTestCase(TestCase):
+    """Test match_identical method."""
+
+    def test_basename(self):
+        """Test to match paths with the same base name."""
+        list1 = [
+            Path("directory/file.mp4"),
+            Path("other/file.mp4"),
+            Path("other/unique.mp4"),
+            Path("other/new.mp4"),
+        ]
+
+        list2 = [
+            Path("old/file.mp4"),
+            Path("old/unique.mp4"),
+            Path("old/old.mp4"),
+        ]
+
+        similar, remaining1, remaining2 = difference.match_identical(
+            list1, list2, Path.basename
+        )
+
+        self.assertListEqual(similar, [("other/unique.mp4", "old/unique.mp4")])
+        self.assertListEqual(
+            remaining1, ["directory/file.mp4", "other/file.mp4", "other/new.mp4"]
+        )
+        self.assertListEqual(remaining2, ["old/file.mp4", "old/old.mp4"])
+
+    def test_no_key(self):
+        """Test elements without key are not matched."""
+        keys = {"a": None, "b": 1, "c": None, "d": 1}
+
+        similar, remaining1, remaining2 = difference.match_identical(
+            ["a", "b"], ["c", "d"], keys.get
+        )
+
+        self.assertListEqual(similar, [("b", "d")])
+        self.assertListEqual(remaining1, ["a"])
+        self.assertListEqual(remaining2, ["c"])
+
+
 class MatchSimilarTestCase(TestCase):
     """Test match_similar method."""
 
@@ -80,3 +130,70 @@ class MatchSimilarTestCase(TestCase):
         )
         self.assertCountEqual(remaining1, ["directory/newfile.mkv"])
         self.assertCountEqual(remaining2, ["directory/oldfile.mkv"])
+
+    def test_candidates(self):
+        """Test matching only candidate pairs gives the same result."""
+        list1 = [
+            Path("directory/file.mp4"),
+            Path("directory/other.mp4"),
+            Path("other/file.mp4"),
+            Path("directory/newfile.mkv"),
+        ]
+
+        list2 = [
+            Path("directory/fil.mp4"),
+            Path("other/other.mp4"),
+            Path("other/fil.mp4"),
+            Path("directory/oldfile.mkv"),
+        ]
+
+        self.assertEqual(
+            difference.match_similar(
+                list1,
+                list2,
+                calculate_file_path_similarity,
+                generate_candidates=generate_file_path_candidates,
+            ),
+            difference.match_similar(list1, list2, calculate_file_path_similarity),
+        )
+
+    def test_same_similarity(self):
+        """Test pairs with the same similarity are matched in order."""
+        similar, remaining1, remaining2 = difference.match_similar(
+            ["a", "b"], ["c", "d"], lambda item1, item2: 1
+        )
+
+        self.assertListEqual(similar, [("a", "c"), ("b", "d")])
+        self.assertListEqual(remaining1, [])
+        self.assertListEqual(remaining2, [])
+
+    def test_batch(self):
+        """Test to match using a batch similarity function."""
+
+        def compute_similarities(list1, list2, threshold):
+            yield 0.9, 0, 1
+            yield 0.95, 1, 1
+            yield 0.85, 0, 0
+
+        similar, remaining1, remaining2 = difference.match_similar(
+            ["a", "b", "c"], ["d", "e"], compute_similarities, batch=True
+        )
+
+        self.assertListEqual(similar, [("b", "e"), ("a", "d")])
+        self.assertListEqual(remaining1, ["c"])
+        self.assertListEqual(remaining2, [])
+
+    @patch.object(difference, "PROCESSES_MINIMAL_PAIRS", 0)
+    def test_processes(self):
+        """Test matching with several processes gives the same result."""
+        list1 = ["a" * length for length in range(1, 40, 3)]
+        list2 = ["b" * length for length in range(2, 40, 2)]
+
+        self.assertEqual(
+            difference.match_similar(
+                list1, list2, compute_length_similarity, threshold=0.5, processes=2
+            ),
+            difference.match_similar(
+                list1, list2, compute_length_similarity, threshold=0.5
+            ),
+        )
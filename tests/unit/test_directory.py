@@ -1,3 +1,4 @@
+import pickle
 from unittest import TestCase
 from unittest.mock import patch
 
@@ -10,39 +11,111 @@ except ImportError:
     from importlib_resources import path
 
 from dakara_feeder.directory import (
+    CLASSIFICATION_EXTENSION,
+    FileClassifier,
+    InvalidClassificationModeError,
     SongPaths,
     get_main_type,
+    get_scan_workers,
     group_by_type,
+    group_directory,
     list_directory,
+    walk_directory,
 )
 
 
+class SongPathsTestCase(TestCase):
+    """Test the paths of a song."""
+
+    def test_paths(self):
+        """Test to access the paths of a song."""
+        song_paths = SongPaths(
+            Path("directory") / "song.mkv",
+            subtitle=Path("directory") / "song.ass",
+            others=[Path("directory") / "song.jpg"],
+        )
+
+        self.assertIsInstance(song_paths.video, Path)
+        self.assertEqual(song_paths.video, Path("directory") / "song.mkv")
+        self.assertIsNone(song_paths.audio)
+        self.assertEqual(song_paths.subtitle, Path("directory") / "song.ass")
+        self.assertListEqual(song_paths.others, [Path("directory") / "song.jpg"])
+        self.assertIs(type(song_paths.video_str), str)
+
+    def test_hash_eq(self):
+        """Test songs with the same paths are equal."""
+        song_paths_1 = SongPaths(Path("song.mkv"), others=[Path("song.jpg")])
+        song_paths_2 = SongPaths("song.mkv", others=("song.jpg",))
+        song_paths_3 = SongPaths(Path("song.mkv"))
+
+        self.assertEqual(song_paths_1, song_paths_2)
+        self.assertEqual(hash(song_paths_1), hash(song_paths_2))
+        self.assertNotEqual(song_paths_1, song_paths_3)
+        self.assertNotEqual(song_paths_1, "song.mkv")
+        self.assertEqual(len({song_paths_1, song_paths_2, song_paths_3}), 2)
+
+    def test_immutable(self):
+        """Test paths of a song cannot be modified."""
+        song_paths = SongPaths(Path("song.mkv"))
+
+        with self.assertRaises(AttributeError):
+            song_paths.video = Path("other.mkv")
+
+        with self.assertRaises(AttributeError):
+            song_paths.extra = None
+
+    def test_with_prefix(self):
+        """Test to prefix the paths of a song."""
+        song_paths = SongPaths(
+            Path("directory") / "song.mkv",
+            subtitle=Path("directory") / "song.ass",
+            others=[Path("directory") / "song.jpg"],
+        )
+
+        self.assertEqual(
+            song_paths.with_prefix("disk1"),
+            SongPaths(
+                Path("disk1") / "directory" / "song.mkv",
+                subtitle=Path("disk1") / "directory" / "song.ass",
+                others=[Path("disk1") / "directory" / "song.jpg"],
+            ),
+        )
+
+    def test_pickle(self):
+        """Test to pickle paths of a song."""
+        song_paths = SongPaths(Path("song.mkv"), Path("song.ogg"))
+
+        self.assertEqual(pickle.loads(pickle.dumps(song_paths)), song_paths)
+
+
 class ListDirectoryTestCase(TestCase):
     """Test the directory lister."""
 
     @patch("dakara_feeder.directory.get_main_type", autoset=True)
-    @patch.object(Path, "walkfiles", autoset=True)
-    def test_list_directory(self, mocked_walkfiles, mocked_get_main_type):
+    def test_list_directory(self, mocked_get_main_type):
         """Test to list a directory."""
-        # mock directory structure
-        mocked_walkfiles.return_value = (
-            item.normpath()
-            for item in [
-                Path("directory/file0.mkv"),
-                Path("directory/file1.mkv"),
-                Path("directory/file1.ass"),
-                Path("directory/file1.ogg"),
-                Path("directory/subdirectory/file2.mkv"),
-                Path("directory/subdirectory/file3.mkv"),
-                Path("directory/subdirectory/file3.ass"),
-                Path("directory/subdirectory/empty"),
-                Path("directory/file0.ass"),
-            ]
-        )
         mocked_get_main_type.side_effect = get_main_type_mock
-        # call the function
-        with self.assertLogs("dakara_feeder.directory", "DEBUG") as logger:
-            listing = list_directory(Path("directory"))
+
+        with TempDir() as temp:
+            # create directory structure
+            create_files(
+                temp,
+                [
+                    Path("file0.mkv"),
+                    Path("file1.mkv"),
+                    Path("file1.ass"),
+                    Path("file1.ogg"),
+                    Path("subdirectory/file2.mkv"),
+                    Path("subdirectory/file3.mkv"),
+                    Path("subdirectory/file3.ass"),
+                    Path("subdirectory/empty"),
+                    Path("file0.ass"),
+                ],
+            )
+
+            # call the function
+            with self.assertLogs("dakara_feeder.directory", "DEBUG") as logger:
+                listing = list_directory(temp)
 
         # check the structure
         self.assertEqual(len(listing), 4)
@@ -67,31 +140,32 @@ class ListDirectoryTestCase(TestCase):
         self.assertListEqual(
             logger.output,
             [
-                "DEBUG:dakara_feeder.directory:Listing 'directory'",
+                "DEBUG:dakara_feeder.directory:Listing '{}'".format(temp),
                 "DEBUG:dakara_feeder.directory:Listed 9 files",
                 "DEBUG:dakara_feeder.directory:Found 4 different videos",
             ],
         )
 
     @patch("dakara_feeder.directory.get_main_type", autoset=True)
-    @patch.object(Path, "walkfiles", autoset=True)
-    def test_list_directory_same_stem(self, mocked_walkfiles, mocked_get_main_type):
+    def test_list_directory_same_stem(self, mocked_get_main_type):
         """Test case when files with the same name exists in different directories."""
-        # mock directory structure
-        mocked_walkfiles.return_value = (
-            item.normpath()
-            for item in [
-                Path("directory/file0.mkv"),
-                Path("directory/file0.ass"),
-                Path("directory/subdirectory/file0.mkv"),
-                Path("directory/subdirectory/file0.ass"),
-            ]
-        )
         mocked_get_main_type.side_effect = get_main_type_mock
 
-        # call the function
-        with self.assertLogs("dakara_feeder.directory", "DEBUG") as logger:
-            listing = list_directory(Path("directory"))
+        with TempDir() as temp:
+            # create directory structure
+            create_files(
+                temp,
+                [
+                    Path("file0.mkv"),
+                    Path("file0.ass"),
+                    Path("subdirectory/file0.mkv"),
+                    Path("subdirectory/file0.ass"),
+                ],
+            )
+
+            # call the function
+            with self.assertLogs("dakara_feeder.directory", "DEBUG") as logger:
+                listing = list_directory(temp)
 
         # check the structure
         self.assertEqual(len(listing), 2)
@@ -110,30 +184,31 @@ class ListDirectoryTestCase(TestCase):
         self.assertListEqual(
             logger.output,
             [
-                "DEBUG:dakara_feeder.directory:Listing 'directory'",
+                "DEBUG:dakara_feeder.directory:Listing '{}'".format(temp),
                 "DEBUG:dakara_feeder.directory:Listed 4 files",
                 "DEBUG:dakara_feeder.directory:Found 2 different videos",
             ],
         )
 
     @patch("dakara_feeder.directory.get_main_type", autoset=True)
-    @patch.object(Path, "walkfiles", autoset=True)
-    def test_list_dot_in_filename(self, mocked_walkfiles, mocked_get_main_type):
+    def test_list_dot_in_filename(self, mocked_get_main_type):
         """Test case with a dot in filename."""
-        # mock directory structure
-        mocked_walkfiles.return_value = (
-            item.normpath()
-            for item in [
-                Path("directory/file0.ass"),
-                Path("directory/file0.extra.ass"),
-                Path("directory/file0.mkv"),
-            ]
-        )
         mocked_get_main_type.side_effect = get_main_type_mock
 
-        # call the function
-        with self.assertLogs("dakara_feeder.directory", "DEBUG") as logger:
-            listing = list_directory(Path("directory"))
+        with TempDir() as temp:
+            # create directory structure
+            create_files(
+                temp,
+                [
+                    Path("file0.ass"),
+                    Path("file0.extra.ass"),
+                    Path("file0.mkv"),
+                ],
+            )
+
+            # call the function
+            with self.assertLogs("dakara_feeder.directory", "DEBUG") as logger:
+                listing = list_directory(temp)
 
         # check the structure
         self.assertEqual(len(listing), 1)
@@ -146,13 +221,164 @@ class ListDirectoryTestCase(TestCase):
         self.assertListEqual(
             logger.output,
             [
-                "DEBUG:dakara_feeder.directory:Listing 'directory'",
+                "DEBUG:dakara_feeder.directory:Listing '{}'".format(temp),
                 "DEBUG:dakara_feeder.directory:Listed 3 files",
                 "DEBUG:dakara_feeder.directory:Found 1 different videos",
             ],
         )
 
 
+@patch("dakara_feeder.directory.get_main_type", autoset=True)
+class WalkDirectoryTestCase(TestCase):
+    """Test the directory walker."""
+
+    def test_walk_directory(self, mocked_get_main_type):
+        """Test songs are yielded directory by directory."""
+        mocked_get_main_type.side_effect = get_main_type_mock
+
+        with TempDir() as temp:
+            # create directory structure
+            create_files(
+                temp,
+                [
+                    Path("b/file1.mkv"),
+                    Path("a/file0.mkv"),
+                    Path("a/c/file2.mkv"),
+                    Path("file3.mkv"),
+                ],
+            )
+
+            # call the function
+            walker = walk_directory(temp)
+
+            # check the songs of the root directory are yielded first
+            self.assertEqual(next(walker), SongPaths(Path("file3.mkv")))
+            self.assertListEqual(
+                list(walker),
+                [
+                    SongPaths(Path("a") / "file0.mkv"),
+                    SongPaths(Path("a") / "c" / "file2.mkv"),
+                    SongPaths(Path("b") / "file1.mkv"),
+                ],
+            )
+
+
+@patch("dakara_feeder.directory.get_main_type", autoset=True)
+class ScanDirectoryParallelTestCase(TestCase):
+    """Test the parallel directory scanner."""
+
+    def test_list_directory(self, mocked_get_main_type):
+        """Test to list a directory with several workers."""
+        mocked_get_main_type.side_effect = get_main_type_mock
+
+        with TempDir() as temp:
+            # create directory structure
+            create_files(
+                temp,
+                [
+                    Path("file0.mkv"),
+                    Path("file0.ass"),
+                    Path("b/file1.mkv"),
+                    Path("b/file1.flac"),
+                    Path("a/file2.mkv"),
+                    Path("a/c/file3.mkv"),
+                    Path("a/c/file3.ass"),
+                    Path("a/c/d/file4.mkv"),
+                    Path("a/c/d/empty"),
+                ],
+            )
+
+            # call the function
+            with self.assertLogs("dakara_feeder.directory", "DEBUG") as logger:
+                listing = list_directory(temp, workers=3)
+
+            with self.assertLogs("dakara_feeder.directory", "DEBUG"):
+                listing_serial = list_directory(temp)
+
+        # check the structure is the same as for a serial scan
+        self.assertListEqual(listing, listing_serial)
+        self.assertListEqual(
+            listing,
+            [
+                SongPaths(Path("file0.mkv"), subtitle=Path("file0.ass")),
+                SongPaths(Path("a") / "file2.mkv"),
+                SongPaths(
+                    Path("a") / "c" / "file3.mkv",
+                    subtitle=Path("a") / "c" / "file3.ass",
+                ),
+                SongPaths(Path("a") / "c" / "d" / "file4.mkv"),
+                SongPaths(Path("b") / "file1.mkv", audio=Path("b") / "file1.flac"),
+            ],
+        )
+
+        # check the logger was called
+        self.assertListEqual(
+            logger.output,
+            [
+                "DEBUG:dakara_feeder.directory:Listing '{}'".format(temp),
+                "DEBUG:dakara_feeder.directory:Listed 9 files",
+                "DEBUG:dakara_feeder.directory:Found 5 different videos",
+            ],
+        )
+
+    def test_list_directory_extension(self, mocked_get_main_type):
+        """Test files are not read when their extension is enough."""
+        with TempDir() as temp:
+            create_files(
+                temp, [Path("file0.mkv"), Path("file0.ass"), Path("a/file1.mp4")]
+            )
+
+            with self.assertLogs("dakara_feeder.directory", "DEBUG"):
+                listing = list_directory(
+                    temp, classifier=FileClassifier("extension"), workers=2
+                )
+
+        self.assertListEqual(
+            listing,
+            [
+                SongPaths(Path("file0.mkv"), subtitle=Path("file0.ass")),
+                SongPaths(Path("a") / "file1.mp4"),
+            ],
+        )
+        mocked_get_main_type.assert_not_called()
+
+    def test_list_directory_error(self, mocked_get_main_type):
+        """Test an error of the file system is raised."""
+        with TempDir() as temp:
+            with self.assertRaises(FileNotFoundError):
+                list_directory(temp / "missing", workers=2)
+
+
+class GetScanWorkersTestCase(TestCase):
+    """Test the number of workers to scan a directory."""
+
+    def test_default(self):
+        """Test to get the default number of workers."""
+        self.assertEqual(get_scan_workers(Path("kara"), workers=3), 3)
+
+    @patch("dakara_feeder.directory.get_mount_point", autoset=True)
+    def test_mount(self, mocked_get_mount_point):
+        """Test to get the number of workers of a mount point."""
+        mocked_get_mount_point.return_value = Path("/mnt/nas").realpath()
+
+        with self.assertLogs("dakara_feeder.directory", "DEBUG"):
+            workers = get_scan_workers(
+                Path("/mnt/nas/kara"), workers=1, mounts={"/mnt/nas": 16}
+            )
+
+        self.assertEqual(workers, 16)
+        mocked_get_mount_point.assert_called_with(Path("/mnt/nas/kara"))
+
+    @patch("dakara_feeder.directory.get_mount_point", autoset=True)
+    def test_other_mount(self, mocked_get_mount_point):
+        """Test to get the default number of workers for another mount point."""
+        mocked_get_mount_point.return_value = Path("/").realpath()
+
+        workers = get_scan_workers(Path("/kara"), workers=2, mounts={"/mnt/nas": 16})
+
+        self.assertEqual(workers, 2)
+
+
 class ListDirectoryIntegrationTestCase(TestCase):
     """Integration test for the directory lister."""
 
@@ -217,6 +443,131 @@ class GetMainTypeTestCase(TestCase):
             self.assertIsNone(get_main_type(Path(file)))
 
 
+@patch("dakara_feeder.directory.get_main_type", autoset=True)
+class FileClassifierTestCase(TestCase):
+    """Test the files classifier."""
+
+    def test_sniff(self, mocked_get_main_type):
+        """Test to classify files by their content."""
+        mocked_get_main_type.side_effect = get_main_type_mock
+        classifier = FileClassifier("sniff")
+
+        self.assertEqual(classifier.classify(Path("video.mp4"), Path("dir")), "video")
+        self.assertEqual(classifier.classify(Path("audio.ogg"), Path("dir")), "audio")
+        self.assertEqual(
+            classifier.classify(Path("subtitle.ass"), Path("dir")), "subtitle"
+        )
+        self.assertEqual(classifier.classify(Path("cover.jpg"), Path("dir")), "other")
+        self.assertEqual(mocked_get_main_type.call_count, 4)
+
+    def test_extension(self, mocked_get_main_type):
+        """Test to classify files by their extension."""
+        classifier = FileClassifier("extension")
+
+        self.assertEqual(classifier.classify(Path("video.MKV"), Path("dir")), "video")
+        self.assertEqual(classifier.classify(Path("audio.flac"), Path("dir")), "audio")
+        self.assertEqual(
+            classifier.classify(Path("subtitle.ass"), Path("dir")), "subtitle"
+        )
+        self.assertEqual(classifier.classify(Path("cover.jpg"), Path("dir")), "other")
+        self.assertEqual(classifier.classify(Path("file.kara"), Path("dir")), "other")
+        self.assertEqual(classifier.classify(Path("file.webm"), Path("dir")), "video")
+        mocked_get_main_type.assert_not_called()
+
+    def test_hybrid(self, mocked_get_main_type):
+        """Test to classify files by extension and content if needed."""
+        mocked_get_main_type.side_effect = get_main_type_mock
+        classifier = FileClassifier("hybrid")
+
+        self.assertEqual(classifier.classify(Path("video.mkv"), Path("dir")), "video")
+        self.assertEqual(classifier.classify(Path("cover.jpg"), Path("dir")), "other")
+        mocked_get_main_type.assert_not_called()
+
+        # ambiguous extension
+        self.assertEqual(classifier.classify(Path("audio.ogg"), Path("dir")), "audio")
+        mocked_get_main_type.assert_called_with(Path("dir") / "audio.ogg")
+
+        # unknown extension
+        self.assertEqual(classifier.classify(Path("file.kara"), Path("dir")), "other")
+        mocked_get_main_type.assert_called_with(Path("dir") / "file.kara")
+
+    def test_classify_by_extension(self, mocked_get_main_type):
+        """Test to tell if the header of files must be read."""
+        classifier = FileClassifier("hybrid")
+
+        self.assertEqual(classifier.classify_by_extension(Path("video.mkv")), "video")
+        self.assertIsNone(classifier.classify_by_extension(Path("audio.ogg")))
+        self.assertIsNone(classifier.classify_by_extension(Path("file.kara")))
+        self.assertIsNone(
+            FileClassifier("sniff").classify_by_extension(Path("video.mkv"))
+        )
+        mocked_get_main_type.assert_not_called()
+
+    def test_custom_extensions(self, mocked_get_main_type):
+        """Test to classify files with custom extensions."""
+        classifier = FileClassifier("extension", {"video": [".kara"]})
+
+        self.assertEqual(classifier.classify(Path("file.kara"), Path("dir")), "video")
+        self.assertEqual(classifier.classify(Path("file.mkv"), Path("dir")), "other")
+        self.assertEqual(classifier.classify(Path("file.mp3"), Path("dir")), "audio")
+
+    def test_invalid_mode(self, mocked_get_main_type):
+        """Test to create a classifier with an unknown mode."""
+        with self.assertRaisesRegex(
+            InvalidClassificationModeError, "Invalid classification mode 'guess'"
+        ):
+            FileClassifier("guess")
+
+
+class GroupDirectoryTestCase(TestCase):
+    """Test the grouping of files of a directory by song."""
+
+    def test_group(self):
+        """Test to group files by their name without extension."""
+        results = group_directory(
+            Path("directory"),
+            [
+                "song_1.ass",
+                "song_0.mkv",
+                "song_1.mkv",
+                "cover.jpg",
+                "song_0.ass",
+                "song_1.flac",
+            ],
+            Path("kara"),
+            FileClassifier(CLASSIFICATION_EXTENSION),
+        )
+
+        self.assertListEqual(
+            results,
+            [
+                SongPaths(
+                    Path("directory") / "song_0.mkv",
+                    subtitle=Path("directory") / "song_0.ass",
+                ),
+                SongPaths(
+                    Path("directory") / "song_1.mkv",
+                    audio=Path("directory") / "song_1.flac",
+                    subtitle=Path("directory") / "song_1.ass",
+                ),
+            ],
+        )
+        self.assertIsInstance(results[0].video, Path)
+
+    def test_group_root(self):
+        """Test to group files of the scanned directory itself."""
+        results = group_directory(
+            Path(""),
+            ["song.mkv", "song.ass"],
+            Path("kara"),
+            FileClassifier(CLASSIFICATION_EXTENSION),
+        )
+
+        self.assertListEqual(
+            results, [SongPaths(Path("song.mkv"), subtitle=Path("song.ass"))]
+        )
+
+
 @patch("dakara_feeder.directory.get_main_type", autoset=True)
 class GroupByTypeTestCase(TestCase):
     """Test the group_by_type function."""
@@ -354,3 +705,16 @@ def get_main_type_mock(path):
         return "audio"
 
     return None
+
+
+def create_files(directory, files):
+    """Create empty files in a directory.
+
+    Args:
+        directory (path.Path): Directory where to create the files.
+        files (list of path.Path): Path of the files to create, relative to
+            the directory.
+    """
+    for file in files:
+        (directory / file).parent.makedirs_p()
+        (directory / file).touch()
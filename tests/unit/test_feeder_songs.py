@@ -1,14 +1,54 @@
+import asyncio
+import json
 from datetime import timedelta
-from unittest import TestCase
-from unittest.mock import patch
+from unittest import TestCase, skipIf
+from unittest.mock import ANY, MagicMock, patch
 
-from path import Path
+from path import Path, TempDir
 
+from dakara_feeder import similarity
+from dakara_feeder.cache import FingerprintCache, get_file_fingerprint
 from dakara_feeder.directory import SongPaths
 from dakara_feeder.feeder.songs import KaraFolderNotFound, SongsFeeder
-from dakara_feeder.metadata import FFProbeMetadataParser
+from dakara_feeder.index import SongsIndex
+from dakara_feeder.journal import Journal
+from dakara_feeder.metadata import FFProbeMetadataParser, MediainfoMetadataParser
+from dakara_feeder.similarity import InvalidSimilarityMethodError
 from dakara_feeder.song import BaseSong
 from dakara_feeder.subtitle.parsing import Pysubs2SubtitleParser
+from dakara_feeder.watch import WatcherError
+from dakara_feeder.web_client import SongInvalidError, SongsCountMismatchError
+
+
+def set_dispatch(mocked_http_client):
+    """Make dispatch methods of a mocked client call its per-item methods.
+
+    Args:
+        mocked_http_client (unittest.mock.MagicMock): Mocked client.
+    """
+
+    def put_song(item):
+        mocked_http_client.put_song(*item)
+        return item[0]
+
+    def delete_song(song_id):
+        mocked_http_client.delete_song(song_id)
+        return song_id
+
+    mocked_http_client.post_songs_chunk.side_effect = (
+        lambda songs, on_sent=None, on_rejected=None: mocked_http_client.post_song(
+            songs
+        )
+    )
+    mocked_http_client.post_songs.side_effect = (
+        lambda chunks, on_sent=None, on_rejected=None: map(
+            mocked_http_client.post_song, chunks
+        )
+    )
+    mocked_http_client.put_songs.side_effect = lambda songs: map(put_song, songs)
+    mocked_http_client.delete_songs.side_effect = lambda songs_id: map(
+        delete_song, songs_id
+    )
 
 
 @patch("dakara_feeder.feeder.songs.HTTPClientDakara", autoset=True)
@@ -48,6 +88,48 @@ class SongsFeederTestCase(TestCase):
         mocked_check_kara_folder_path.assert_called_with()
         mocked_http_client_class.return_value.authenticate.assert_called_with()
 
+    @patch("dakara_feeder.feeder.songs.MetadataCache", autoset=True)
+    @patch("dakara_feeder.feeder.songs.directories", autoset=True)
+    @patch.object(SongsFeeder, "check_kara_folder_path", autoset=True)
+    @patch("dakara_feeder.feeder.songs.check_version", autoset=True)
+    def test_load_metadata_cache(
+        self,
+        mocked_check_version,
+        mocked_check_kara_folder_path,
+        mocked_directories,
+        mocked_metadata_cache_class,
+        mocked_http_client_class,
+    ):
+        """Test the metadata cache is specific to the kara folder and parser."""
+        mocked_directories.user_cache_dir = Path("cache")
+
+        class MySong(BaseSong):
+            metadata_class = MediainfoMetadataParser
+
+        # create the objects
+        config = {"server": {}, "kara_folder": "basepath", "cache": {"metadata": True}}
+        feeder = SongsFeeder(config, progress=False)
+        feeder.load()
+        feeder_other = SongsFeeder(
+            dict(config, kara_folder="otherpath"), progress=False
+        )
+        feeder_other.load()
+        feeder_parser = SongsFeeder(config, progress=False)
+        feeder_parser.song_class = MySong
+        feeder_parser.load()
+
+        # assert each feeder has its own cache file
+        paths = [call.args[0] for call in mocked_metadata_cache_class.call_args_list]
+        self.assertEqual(
+            paths[0],
+            Path("cache")
+            / "feeder"
+            / "metadata_{}_FFProbeMetadataParser.sqlite".format(
+                feeder.get_kara_folder_digest()
+            ),
+        )
+        self.assertEqual(len(set(paths)), 3)
+
     @patch.object(SongsFeeder, "check_kara_folder_path", autoset=True)
     @patch("dakara_feeder.feeder.songs.get_custom_song", autoset=True)
     @patch("dakara_feeder.feeder.songs.check_version", autoset=True)
@@ -88,6 +170,58 @@ class SongsFeederTestCase(TestCase):
         # assert the call
         mocked_get_custom_song.assert_called_with("module.MySong")
 
+    def test_close(self, mocked_http_client_class):
+        """Test to release the resources of the feeder."""
+        feeder = SongsFeeder(self.config)
+        feeder.metadata_cache = MagicMock()
+        feeder.fingerprint_cache = MagicMock()
+        feeder.journal = MagicMock()
+
+        # call the method
+        feeder.close()
+
+        # assert the calls
+        feeder.metadata_cache.close.assert_called_with()
+        feeder.fingerprint_cache.close.assert_called_with()
+        feeder.journal.close.assert_called_with()
+        mocked_http_client_class.return_value.close.assert_called_with()
+
+    def test_retrieve_songs_index_retry(self, mocked_http_client_class):
+        """Test to retrieve songs again if some songs were missed."""
+
+        # create the mocks
+        def retrieve_songs_missing():
+            yield {"id": 0, "path": Path("directory") / "song_0.mp4"}
+            raise SongsCountMismatchError("Received 1 songs instead of 2")
+
+        mocked_http_client_class.return_value.retrieve_songs.side_effect = [
+            retrieve_songs_missing(),
+            iter(
+                [
+                    {"id": 0, "path": Path("directory") / "song_0.mp4"},
+                    {"id": 1, "path": Path("directory") / "song_1.mp4"},
+                ]
+            ),
+        ]
+
+        # create the object
+        feeder = SongsFeeder(self.config)
+
+        # call the method
+        with self.assertLogs("dakara_feeder.feeder.songs") as logger:
+            feeder.retrieve_songs_index()
+
+        # assert the songs were retrieved again
+        self.assertEqual(
+            mocked_http_client_class.return_value.retrieve_songs.call_count, 2
+        )
+        self.assertEqual(len(feeder.songs_index), 2)
+        self.assertIn(
+            "WARNING:dakara_feeder.feeder.songs:Received 1 songs instead of 2, "
+            "retrieving songs again",
+            logger.output,
+        )
+
     @patch.object(Path, "isdir", autoset=True)
     def test_check_kara_folder_path_exists(
         self, mocked_isdir, mocked_http_client_class
@@ -133,6 +267,8 @@ class SongsFeederTestCase(TestCase):
         mocked_http_client_class,
     ):
         """Test to feed."""
+        set_dispatch(mocked_http_client_class.return_value)
+
         # create the mocks
         mocked_http_client_class.return_value.retrieve_songs.return_value = [
             {"id": 0, "path": Path("directory_0") / "song_0.mp4"},
@@ -163,7 +299,9 @@ class SongsFeederTestCase(TestCase):
 
         # assert the mocked calls
         mocked_http_client_class.return_value.retrieve_songs.assert_called_with()
-        mocked_list_directory.assert_called_with("basepath")
+        mocked_list_directory.assert_called_with(
+            "basepath", classifier=ANY, scan_cache=None, workers=1
+        )
         mocked_http_client_class.return_value.post_song.assert_called_with(
             [
                 {
@@ -207,8 +345,251 @@ class SongsFeederTestCase(TestCase):
         self.assertListEqual(
             logger_progress.output,
             [
-                "INFO:dakara_base.progress_bar:Parsing songs to add",
-                "INFO:dakara_base.progress_bar:Uploading added songs",
+                "INFO:dakara_base.progress_bar:Adding songs",
+                "INFO:dakara_base.progress_bar:Deleting removed songs",
+            ],
+        )
+
+    @patch.object(Path, "isdir", autoset=True)
+    def test_check_kara_folder_path_several_roots(
+        self, mocked_isdir, mocked_http_client_class
+    ):
+        """Test to check a kara folder with a root that does not exist."""
+        # setup the mock
+        mocked_isdir.side_effect = [True, False]
+
+        # create the object
+        config = {"server": {}, "kara_folder": ["disk1", "disk2"]}
+        feeder = SongsFeeder(config)
+
+        # call the method
+        with self.assertRaisesRegex(
+            KaraFolderNotFound, "Karaoke folder 'disk2' does not exist"
+        ):
+            feeder.check_kara_folder_path()
+
+    @patch.object(Pysubs2SubtitleParser, "parse", autoset=True)
+    @patch.object(FFProbeMetadataParser, "parse", autoset=True)
+    @patch("dakara_feeder.feeder.songs.list_directory", autoset=True)
+    def test_feed_several_roots(
+        self,
+        mocked_list_directory,
+        mocked_metadata_parse,
+        mocked_subtitle_parse,
+        mocked_http_client_class,
+    ):
+        """Test to feed a kara folder with several roots."""
+        set_dispatch(mocked_http_client_class.return_value)
+
+        # create the mocks
+        mocked_http_client_class.return_value.retrieve_songs.return_value = [
+            {"id": 0, "path": Path("disk1") / "directory_0" / "song_0.mp4"},
+            {"id": 1, "path": Path("anime") / "directory_1" / "music_1.mp4"},
+        ]
+        mocked_http_client_class.return_value.prune_artists.return_value = 0
+        mocked_http_client_class.return_value.prune_works.return_value = 0
+        songs_paths_by_root = {
+            Path("disk1"): [SongPaths(Path("directory_0") / "song_0.mp4")],
+            Path("disk2"): [
+                SongPaths(
+                    Path("directory_2") / "song_2.mp4",
+                    subtitle=Path("directory_2") / "song_2.ass",
+                )
+            ],
+        }
+        mocked_list_directory.side_effect = lambda path, **kwargs: songs_paths_by_root[
+            path
+        ]
+        mocked_metadata_parse.return_value.get_duration.return_value = timedelta(
+            seconds=1
+        )
+        mocked_metadata_parse.return_value.get_audio_tracks_count.return_value = 1
+        mocked_subtitle_parse.return_value.get_lyrics.return_value = "lyri lyri"
+
+        # create the object
+        config = {
+            "server": {},
+            "kara_folder": ["disk1", {"path": "disk2", "prefix": "anime"}],
+        }
+        feeder = SongsFeeder(config, progress=False)
+
+        # call the method
+        with self.assertLogs("dakara_feeder.feeder.songs", "DEBUG"):
+            with self.assertLogs("dakara_base.progress_bar"):
+                feeder.feed()
+
+        # assert the mocked calls
+        mocked_http_client_class.return_value.retrieve_songs.assert_called_once_with()
+        mocked_list_directory.assert_any_call(
+            "disk1", classifier=ANY, scan_cache=None, workers=1
+        )
+        mocked_list_directory.assert_any_call(
+            "disk2", classifier=ANY, scan_cache=None, workers=1
+        )
+        mocked_http_client_class.return_value.post_song.assert_called_with(
+            [
+                {
+                    "title": "song_2",
+                    "filename": "song_2.mp4",
+                    "directory": Path("anime") / "directory_2",
+                    "duration": 1,
+                    "has_instrumental": False,
+                    "artists": [],
+                    "works": [],
+                    "tags": [],
+                    "version": "",
+                    "detail": "",
+                    "detail_video": "",
+                    "lyrics": "lyri lyri",
+                }
+            ]
+        )
+        mocked_http_client_class.return_value.delete_song.assert_called_with(1)
+        mocked_metadata_parse.assert_called_with(
+            Path("disk2") / "directory_2" / "song_2.mp4"
+        )
+        mocked_subtitle_parse.assert_called_with(
+            Path("disk2") / "directory_2" / "song_2.ass"
+        )
+
+    def test_get_song_several_roots(self, mocked_http_client_class):
+        """Test songs of a kara folder with several roots use their root."""
+        # create the object
+        config = {
+            "server": {},
+            "kara_folder": ["disk1", {"path": "disk2", "prefix": "anime"}],
+        }
+        feeder = SongsFeeder(config, progress=False)
+
+        # call the method
+        song = feeder.get_song(
+            SongPaths(
+                Path("anime") / "directory" / "song.mp4",
+                subtitle=Path("anime") / "directory" / "song.ass",
+            )
+        )
+
+        # assert the song
+        self.assertIsInstance(song.base_directory, Path)
+        self.assertEqual(song.base_directory, Path("disk2"))
+        self.assertEqual(song.video_path, Path("directory") / "song.mp4")
+        self.assertEqual(song.subtitle_path, Path("directory") / "song.ass")
+        self.assertEqual(song.prefix, "anime")
+        self.assertIs(song.metadata_cache, feeder.metadata_cache)
+
+    @patch.object(Pysubs2SubtitleParser, "parse", autoset=True)
+    @patch.object(FFProbeMetadataParser, "parse_async", autoset=True)
+    @patch("dakara_feeder.feeder.songs.list_directory", autoset=True)
+    def test_feed_async(
+        self,
+        mocked_list_directory,
+        mocked_metadata_parse_async,
+        mocked_subtitle_parse,
+        mocked_http_client_class,
+    ):
+        """Test to feed asynchronously."""
+        set_dispatch(mocked_http_client_class.return_value)
+
+        # create the mocks
+        mocked_http_client_class.return_value.concurrency = 2
+        mocked_http_client_class.return_value.retrieve_songs.return_value = [
+            {"id": 0, "path": Path("directory_0") / "song_0.mp4"},
+            {"id": 1, "path": Path("directory_1") / "music_1.mp4"},
+        ]
+        mocked_http_client_class.return_value.post_song.return_value = [
+            {"id": 2, "directory": "directory_2", "filename": "song_2.mp4"}
+        ]
+        mocked_http_client_class.return_value.prune_artists.return_value = 2
+        mocked_http_client_class.return_value.prune_works.return_value = 1
+        mocked_list_directory.return_value = [
+            SongPaths(Path("directory_0") / "song_0.mp4"),
+            SongPaths(
+                Path("directory_2") / "song_2.mp4",
+                subtitle=Path("directory_2") / "song_2.ass",
+            ),
+        ]
+        metadata = mocked_metadata_parse_async.return_value = MagicMock()
+        metadata.get_duration.return_value = timedelta(seconds=1)
+        metadata.get_audio_tracks_count.return_value = 1
+        mocked_subtitle_parse.return_value.get_lyrics.return_value = "lyri lyri"
+
+        # create the object
+        feeder = SongsFeeder(
+            self.config, force_update=True, progress=False, parse_workers=2
+        )
+
+        # call the method
+        with self.assertLogs("dakara_feeder.feeder.songs", "DEBUG") as logger_feeder:
+            with self.assertLogs("dakara_base.progress_bar") as logger_progress:
+                asyncio.run(feeder.feed_async())
+
+        # assert the mocked calls
+        mocked_list_directory.assert_called_with(
+            "basepath", classifier=ANY, scan_cache=None, workers=1
+        )
+        song_2 = {
+            "title": "song_2",
+            "filename": "song_2.mp4",
+            "directory": "directory_2",
+            "duration": 1,
+            "has_instrumental": False,
+            "artists": [],
+            "works": [],
+            "tags": [],
+            "version": "",
+            "detail": "",
+            "detail_video": "",
+            "lyrics": "lyri lyri",
+        }
+        mocked_http_client_class.return_value.post_song.assert_called_with([song_2])
+        mocked_http_client_class.return_value.put_song.assert_called_with(
+            0,
+            {
+                **song_2,
+                "title": "song_0",
+                "filename": "song_0.mp4",
+                "directory": "directory_0",
+                "lyrics": "",
+            },
+        )
+        mocked_http_client_class.return_value.delete_song.assert_called_with(1)
+        mocked_http_client_class.return_value.prune_artists.assert_called_with()
+        mocked_http_client_class.return_value.prune_works.assert_called_with()
+
+        # assert the index
+        self.assertDictEqual(
+            dict(feeder.songs_index),
+            {
+                Path("directory_0") / "song_0.mp4": 0,
+                Path("directory_2") / "song_2.mp4": 2,
+            },
+        )
+
+        # songs of the server and local songs are found concurrently
+        self.assertCountEqual(
+            logger_feeder.output[:2],
+            [
+                "INFO:dakara_feeder.feeder.songs:Found 2 songs in local directory",
+                "INFO:dakara_feeder.feeder.songs:Found 2 songs in server",
+            ],
+        )
+        self.assertListEqual(
+            logger_feeder.output[2:],
+            [
+                "INFO:dakara_feeder.feeder.songs:Found 1 songs to add",
+                "INFO:dakara_feeder.feeder.songs:Found 1 songs to delete",
+                "INFO:dakara_feeder.feeder.songs:Found 1 songs to update",
+                "INFO:dakara_feeder.feeder.songs:Deleted 2 artists without songs "
+                "on server",
+                "INFO:dakara_feeder.feeder.songs:Deleted 1 works without songs "
+                "on server",
+            ],
+        )
+        self.assertListEqual(
+            logger_progress.output,
+            [
+                "INFO:dakara_base.progress_bar:Adding songs",
+                "INFO:dakara_base.progress_bar:Updating songs",
                 "INFO:dakara_base.progress_bar:Deleting removed songs",
             ],
         )
@@ -219,6 +600,8 @@ class SongsFeederTestCase(TestCase):
         self, mocked_list_directory, mocked_metadata_parse, mocked_http_client_class
     ):
         """Test feed when a file has been renamed."""
+        set_dispatch(mocked_http_client_class.return_value)
+
         # mock content of server (old files)
         mocked_http_client_class.return_value.retrieve_songs.return_value = [
             {"id": 0, "path": Path("directory_0") / "song.mp4"},
@@ -248,7 +631,9 @@ class SongsFeederTestCase(TestCase):
 
         # assert the mocked calls
         mocked_http_client_class.return_value.retrieve_songs.assert_called_with()
-        mocked_list_directory.assert_called_with("basepath")
+        mocked_list_directory.assert_called_with(
+            "basepath", classifier=ANY, scan_cache=None, workers=1
+        )
         mocked_http_client_class.return_value.put_song.assert_called_with(
             1,
             {
@@ -292,6 +677,8 @@ class SongsFeederTestCase(TestCase):
         mocked_http_client_class,
     ):
         """Test to feed."""
+        set_dispatch(mocked_http_client_class.return_value)
+
         # create the mocks
         mocked_http_client_class.return_value.retrieve_songs.return_value = [
             {"id": 1, "path": Path("music_1.mp4")}
@@ -317,7 +704,9 @@ class SongsFeederTestCase(TestCase):
 
         # assert the mocked calls
         mocked_http_client_class.return_value.retrieve_songs.assert_called_with()
-        mocked_list_directory.assert_called_with("basepath")
+        mocked_list_directory.assert_called_with(
+            "basepath", classifier=ANY, scan_cache=None, workers=1
+        )
         mocked_http_client_class.return_value.put_song.assert_called_with(
             1,
             {
@@ -383,7 +772,9 @@ class SongsFeederTestCase(TestCase):
 
         # assert the mocked calls
         mocked_http_client_class.return_value.retrieve_songs.assert_called_with()
-        mocked_list_directory.assert_called_with("basepath")
+        mocked_list_directory.assert_called_with(
+            "basepath", classifier=ANY, scan_cache=None, workers=1
+        )
         mocked_http_client_class.return_value.post_song.assert_not_called()
         mocked_http_client_class.return_value.delete_song.assert_not_called()
         mocked_http_client_class.return_value.prune_artists.assert_not_called()
@@ -412,6 +803,8 @@ class SongsFeederTestCase(TestCase):
         mocked_http_client_class,
     ):
         """Test to create two songs."""
+        set_dispatch(mocked_http_client_class.return_value)
+
         # create the mocks
         mocked_http_client_class.return_value.retrieve_songs.return_value = []
         mocked_http_client_class.return_value.prune_artists.return_value = 0
@@ -435,7 +828,9 @@ class SongsFeederTestCase(TestCase):
 
         # assert the mocked calls
         mocked_http_client_class.return_value.retrieve_songs.assert_called_with()
-        mocked_list_directory.assert_called_with("basepath")
+        mocked_list_directory.assert_called_with(
+            "basepath", classifier=ANY, scan_cache=None, workers=1
+        )
         songs = [
             {
                 "title": "song_0",
@@ -499,12 +894,54 @@ class SongsFeederTestCase(TestCase):
             ],
         )
 
+    @patch.object(FFProbeMetadataParser, "parse", autoset=True)
+    def test_parse_songs_concurrently(
+        self, mocked_metadata_parse, mocked_http_client_class
+    ):
+        """Test to parse songs concurrently keeps order."""
+        # create the mocks
+        mocked_metadata_parse.return_value.get_duration.return_value = timedelta(
+            seconds=1
+        )
+        mocked_metadata_parse.return_value.get_audio_tracks_count.return_value = 1
+
+        # create the object
+        feeder = SongsFeeder(self.config, progress=False, parse_workers=4)
+
+        # call the method
+        with self.assertLogs("dakara_base.progress_bar"):
+            songs = list(
+                feeder.parse_songs(
+                    [
+                        SongPaths(Path("directory") / "song_{}.mp4".format(i))
+                        for i in range(20)
+                    ],
+                    text="Parsing songs",
+                )
+            )
+
+        # assert the songs are in the same order
+        self.assertListEqual(
+            [song["title"] for song in songs],
+            ["song_{}".format(i) for i in range(20)],
+        )
+
+    def test_parse_workers_from_config(self, mocked_http_client_class):
+        """Test the number of parse workers is taken from the config."""
+        config = {"server": {}, "kara_folder": "basepath", "parse_workers": 3}
+
+        self.assertEqual(SongsFeeder(config).parse_workers, 3)
+        self.assertEqual(SongsFeeder(config, parse_workers=5).parse_workers, 5)
+        self.assertEqual(SongsFeeder(self.config).parse_workers, 1)
+
     @patch.object(FFProbeMetadataParser, "parse", autoset=True)
     @patch("dakara_feeder.feeder.songs.list_directory", autoset=True)
     def test_feed_custom_song_class(
         self, mocked_list_directory, mocked_metadata_parse, mocked_http_client_class
     ):
         """Test to feed using a custom song class."""
+        set_dispatch(mocked_http_client_class.return_value)
+
         # create the mocks
         mocked_http_client_class.return_value.retrieve_songs.return_value = []
         mocked_http_client_class.return_value.prune_artists.return_value = 0
@@ -568,6 +1005,8 @@ class SongsFeederTestCase(TestCase):
         mocked_http_client_class,
     ):
         """Test to feed a song with an extra audio file."""
+        set_dispatch(mocked_http_client_class.return_value)
+
         # create the mocks
         mocked_http_client_class.return_value.retrieve_songs.return_value = []
         mocked_list_directory.return_value = [
@@ -596,7 +1035,9 @@ class SongsFeederTestCase(TestCase):
 
         # assert the mocked calls
         mocked_http_client_class.return_value.retrieve_songs.assert_called_with()
-        mocked_list_directory.assert_called_with("basepath")
+        mocked_list_directory.assert_called_with(
+            "basepath", classifier=ANY, scan_cache=None, workers=1
+        )
         mocked_http_client_class.return_value.post_song.assert_called_with(
             [
                 {
@@ -615,3 +1056,703 @@ class SongsFeederTestCase(TestCase):
                 }
             ]
         )
+
+    @patch.object(FFProbeMetadataParser, "parse", autoset=True)
+    def test_feed_changes(self, mocked_metadata_parse, mocked_http_client_class):
+        """Test to feed only the songs of changed directories."""
+        set_dispatch(mocked_http_client_class.return_value)
+
+        # create the mocks
+        mocked_http_client_class.return_value.post_song.return_value = [
+            {"id": 3, "directory": "directory_0", "filename": "song_3.mp4"}
+        ]
+        mocked_http_client_class.return_value.prune_artists.return_value = 0
+        mocked_http_client_class.return_value.prune_works.return_value = 0
+        mocked_metadata_parse.return_value.get_duration.return_value = timedelta(
+            seconds=1
+        )
+        mocked_metadata_parse.return_value.get_audio_tracks_count.return_value = 1
+
+        with TempDir() as temp:
+            # create directory structure
+            (temp / "directory_0").makedirs()
+            (temp / "directory_0" / "song_0.mp4").touch()
+            (temp / "directory_0" / "song_3.mp4").touch()
+
+            # create the object
+            config = {
+                "server": {},
+                "kara_folder": temp,
+                "scan": {"classification": "extension"},
+            }
+            feeder = SongsFeeder(config, progress=False)
+            feeder.songs_index = SongsIndex(
+                {
+                    Path("directory_0") / "song_0.mp4": 0,
+                    Path("directory_0") / "removed_1.mp4": 1,
+                    Path("directory_1") / "music_2.mp4": 2,
+                }
+            )
+
+            # call the method
+            with self.assertLogs("dakara_feeder.feeder.songs") as logger:
+                with self.assertLogs("dakara_base.progress_bar"):
+                    feeder.feed_changes({Path("directory_0")})
+
+        # assert the mocked calls
+        mocked_http_client_class.return_value.retrieve_songs.assert_not_called()
+        mocked_http_client_class.return_value.post_song.assert_called_with([ANY])
+        mocked_http_client_class.return_value.put_song.assert_not_called()
+        mocked_http_client_class.return_value.delete_song.assert_called_with(1)
+        mocked_http_client_class.return_value.prune_artists.assert_called_with()
+
+        # assert the index is up to date
+        self.assertDictEqual(
+            dict(feeder.songs_index),
+            {
+                Path("directory_0") / "song_0.mp4": 0,
+                Path("directory_0") / "song_3.mp4": 3,
+                Path("directory_1") / "music_2.mp4": 2,
+            },
+        )
+        self.assertFalse(feeder.songs_index_stale)
+
+        self.assertIn(
+            "INFO:dakara_feeder.feeder.songs:Detected changes in 1 directories",
+            logger.output,
+        )
+
+    @patch.object(FFProbeMetadataParser, "parse", autoset=True)
+    def test_feed_changes_modified_file(
+        self, mocked_metadata_parse, mocked_http_client_class
+    ):
+        """Test to update songs which files have changed."""
+        set_dispatch(mocked_http_client_class.return_value)
+
+        # create the mocks
+        mocked_metadata_parse.return_value.get_duration.return_value = timedelta(
+            seconds=1
+        )
+        mocked_metadata_parse.return_value.get_audio_tracks_count.return_value = 1
+
+        with TempDir() as temp:
+            # create directory structure
+            (temp / "song_0.mp4").touch()
+            (temp / "song_0.ass").touch()
+            (temp / "song_1.mp4").touch()
+
+            # create the object
+            config = {
+                "server": {},
+                "kara_folder": temp,
+                "scan": {"classification": "extension"},
+            }
+            feeder = SongsFeeder(config, progress=False)
+            feeder.songs_index = SongsIndex(
+                {Path("song_0.mp4"): 0, Path("song_1.mp4"): 1}
+            )
+
+            # call the method
+            with self.assertLogs("dakara_feeder.feeder.songs"):
+                with self.assertLogs("dakara_base.progress_bar"):
+                    feeder.feed_changes({Path("")}, {Path("song_0.ass")})
+
+        # assert the mocked calls
+        mocked_http_client_class.return_value.post_song.assert_not_called()
+        mocked_http_client_class.return_value.put_song.assert_called_once_with(0, ANY)
+        mocked_http_client_class.return_value.delete_song.assert_not_called()
+        mocked_http_client_class.return_value.prune_artists.assert_not_called()
+
+    def test_index_created_songs_unknown_response(self, mocked_http_client_class):
+        """Test the index is marked as stale if created songs are unknown."""
+        # create the object
+        feeder = SongsFeeder(self.config, progress=False)
+
+        # call the method
+        feeder.index_created_songs(None)
+
+        # assert the index
+        self.assertTrue(feeder.songs_index_stale)
+
+    @patch("dakara_feeder.feeder.songs.get_watcher", autoset=True)
+    @patch.object(SongsFeeder, "feed_changes", autoset=True)
+    @patch.object(SongsFeeder, "feed", autoset=True)
+    def test_watch(
+        self,
+        mocked_feed,
+        mocked_feed_changes,
+        mocked_get_watcher,
+        mocked_http_client_class,
+    ):
+        """Test to feed continuously."""
+        # create the mocks
+        mocked_watcher = mocked_get_watcher.return_value
+        mocked_watcher.wait_changes.side_effect = [
+            ({Path("directory")}, set()),
+            KeyboardInterrupt,
+        ]
+
+        # create the object
+        config = {"server": {}, "kara_folder": "basepath", "watch": {"debounce": 5}}
+        feeder = SongsFeeder(config, progress=False)
+
+        # call the method
+        with self.assertLogs("dakara_feeder.feeder.songs"):
+            with self.assertRaises(KeyboardInterrupt):
+                feeder.watch()
+
+        # assert the mocked calls
+        mocked_get_watcher.assert_called_with("basepath", polling=False, interval=10)
+        mocked_feed.assert_called_once_with()
+        mocked_watcher.wait_changes.assert_called_with(5)
+        mocked_feed_changes.assert_called_once_with({Path("directory")}, set())
+
+    @patch("dakara_feeder.feeder.songs.get_watcher", autoset=True)
+    @patch.object(SongsFeeder, "feed_changes", autoset=True)
+    @patch.object(SongsFeeder, "feed", autoset=True)
+    def test_watch_one_root(
+        self,
+        mocked_feed,
+        mocked_feed_changes,
+        mocked_get_watcher,
+        mocked_http_client_class,
+    ):
+        """Test to feed continuously a kara folder given as a list of one root."""
+        # create the mocks
+        mocked_watcher = mocked_get_watcher.return_value
+        mocked_watcher.wait_changes.side_effect = [
+            ({Path(""), Path("directory")}, {Path("directory") / "song.ass"}),
+            KeyboardInterrupt,
+        ]
+
+        # create the object
+        config = {"server": {}, "kara_folder": [{"path": "disk1", "prefix": "anime"}]}
+        feeder = SongsFeeder(config, progress=False)
+
+        # call the method
+        with self.assertLogs("dakara_feeder.feeder.songs"):
+            with self.assertRaises(KeyboardInterrupt):
+                feeder.watch()
+
+        # assert the paths given to the feeder are prefixed
+        mocked_get_watcher.assert_called_with("disk1", polling=False, interval=10)
+        mocked_feed_changes.assert_called_once_with(
+            {Path("anime"), Path("anime") / "directory"},
+            {Path("anime") / "directory" / "song.ass"},
+        )
+
+    def test_watch_several_roots(self, mocked_http_client_class):
+        """Test a kara folder with several roots cannot be watched."""
+        config = {"server": {}, "kara_folder": ["disk1", "disk2"]}
+        feeder = SongsFeeder(config, progress=False)
+
+        with self.assertRaisesRegex(WatcherError, "several roots"):
+            feeder.watch()
+
+    @patch.object(FFProbeMetadataParser, "parse", autoset=True)
+    def test_add_songs_by_chunks(self, mocked_metadata_parse, mocked_http_client_class):
+        """Test to parse and upload songs by chunks."""
+        set_dispatch(mocked_http_client_class.return_value)
+
+        # create the mocks
+        mocked_http_client_class.return_value.post_song.side_effect = lambda songs: [
+            {
+                "id": int(song["title"].split("_")[1]),
+                "directory": song["directory"],
+                "filename": song["filename"],
+            }
+            for song in songs
+        ]
+        mocked_metadata_parse.return_value.get_duration.return_value = timedelta(
+            seconds=1
+        )
+        mocked_metadata_parse.return_value.get_audio_tracks_count.return_value = 1
+
+        # create the object
+        config = {"server": {"songs_per_chunk": 2}, "kara_folder": "basepath"}
+        feeder = SongsFeeder(config, progress=False, parse_workers=2)
+
+        # call the method
+        with self.assertLogs("dakara_base.progress_bar") as logger:
+            feeder.add_songs(
+                [
+                    SongPaths(Path("directory") / "song_{}.mp4".format(i))
+                    for i in range(7)
+                ]
+            )
+
+        # assert the songs were sent by chunks in order
+        post_calls = mocked_http_client_class.return_value.post_song.call_args_list
+        self.assertListEqual(
+            [[song["title"] for song in call.args[0]] for call in post_calls],
+            [
+                ["song_0", "song_1"],
+                ["song_2", "song_3"],
+                ["song_4", "song_5"],
+                ["song_6"],
+            ],
+        )
+
+        # assert the index is up to date
+        self.assertDictEqual(
+            dict(feeder.songs_index),
+            {Path("directory") / "song_{}.mp4".format(i): i for i in range(7)},
+        )
+
+        self.assertListEqual(
+            logger.output, ["INFO:dakara_base.progress_bar:Adding songs"]
+        )
+
+    @patch.object(FFProbeMetadataParser, "parse", autoset=True)
+    def test_add_songs_by_chunks_size(
+        self, mocked_metadata_parse, mocked_http_client_class
+    ):
+        """Test to upload songs by chunks of limited size."""
+        set_dispatch(mocked_http_client_class.return_value)
+
+        # create the mocks
+        mocked_http_client_class.return_value.post_song.return_value = None
+        mocked_metadata_parse.return_value.get_duration.return_value = timedelta(
+            seconds=1
+        )
+        mocked_metadata_parse.return_value.get_audio_tracks_count.return_value = 1
+
+        # create the object
+        config = {
+            "server": {"songs_per_chunk": 100, "chunk_max_bytes": 1000},
+            "kara_folder": "basepath",
+        }
+        feeder = SongsFeeder(config, progress=False)
+
+        # call the method
+        with self.assertLogs("dakara_base.progress_bar"):
+            feeder.add_songs(
+                [
+                    SongPaths(Path("directory") / "song_{}.mp4".format(i))
+                    for i in range(10)
+                ]
+            )
+
+        # assert the songs were sent by chunks of limited size in order
+        chunks = [
+            call.args[0]
+            for call in mocked_http_client_class.return_value.post_song.call_args_list
+        ]
+        self.assertGreater(len(chunks), 1)
+        self.assertListEqual(
+            [song["title"] for chunk in chunks for song in chunk],
+            ["song_{}".format(i) for i in range(10)],
+        )
+        for chunk in chunks:
+            self.assertLessEqual(len(json.dumps(chunk)), 1000)
+
+    @patch.object(FFProbeMetadataParser, "parse", autoset=True)
+    def test_add_songs_rejected(self, mocked_metadata_parse, mocked_http_client_class):
+        """Test to quarantine songs rejected by the server."""
+
+        # create the mocks
+        def post_songs(songs_chunks, on_sent=None, on_rejected=None):
+            for songs_chunk in songs_chunks:
+                created_songs = []
+                for song in songs_chunk:
+                    if song["title"] == "song_1":
+                        on_rejected(song, SongInvalidError("invalid"))
+                        continue
+
+                    created_songs.append(
+                        {"id": int(song["title"][-1]), **song},
+                    )
+
+                yield created_songs
+
+        mocked_http_client_class.return_value.post_songs.side_effect = post_songs
+        mocked_metadata_parse.return_value.get_duration.return_value = timedelta(
+            seconds=1
+        )
+        mocked_metadata_parse.return_value.get_audio_tracks_count.return_value = 1
+
+        # create the object
+        feeder = SongsFeeder(self.config, progress=False)
+
+        # call the method
+        with self.assertLogs("dakara_feeder.feeder.songs", "WARNING") as logger:
+            with self.assertLogs("dakara_base.progress_bar"):
+                feeder.add_songs(
+                    [
+                        SongPaths(Path("directory") / "song_{}.mp4".format(i))
+                        for i in range(3)
+                    ]
+                )
+
+        # assert the rejected song is quarantined and not indexed
+        self.assertListEqual(
+            [song["title"] for song, _ in feeder.rejected_songs], ["song_1"]
+        )
+        self.assertDictEqual(
+            dict(feeder.songs_index),
+            {
+                Path("directory") / "song_0.mp4": 0,
+                Path("directory") / "song_2.mp4": 2,
+            },
+        )
+        self.assertListEqual(
+            logger.output,
+            [
+                "WARNING:dakara_feeder.feeder.songs:Song 'directory/song_1.mp4' "
+                "rejected by the server: invalid"
+            ],
+        )
+
+    @patch.object(FFProbeMetadataParser, "parse", autoset=True)
+    def test_add_songs_rejected_journal(
+        self, mocked_metadata_parse, mocked_http_client_class
+    ):
+        """Test songs rejected by the server are not acknowledged in the journal."""
+
+        # create the mocks
+        def post_songs(songs_chunks, on_sent=None, on_rejected=None):
+            for songs_chunk in songs_chunks:
+                for song in songs_chunk:
+                    if song["title"] == "song_1":
+                        on_rejected(song, SongInvalidError("invalid"))
+
+                yield None
+
+        mocked_http_client_class.return_value.post_songs.side_effect = post_songs
+        mocked_metadata_parse.return_value.get_duration.return_value = timedelta(
+            seconds=1
+        )
+        mocked_metadata_parse.return_value.get_audio_tracks_count.return_value = 1
+
+        with TempDir() as temp:
+            (temp / "directory").makedirs()
+            songs_paths = []
+            for i in range(3):
+                (temp / "directory" / "song_{}.mp4".format(i)).touch()
+                songs_paths.append(
+                    SongPaths(Path("directory") / "song_{}.mp4".format(i))
+                )
+
+            # create the object
+            config = {"server": {"songs_per_chunk": 2}, "kara_folder": temp}
+            feeder = SongsFeeder(config, progress=False)
+            feeder.journal = Journal(temp / "journal.jsonl", {})
+            feeder.journal.open()
+
+            # call the method
+            with self.assertLogs("dakara_feeder.feeder.songs", "WARNING"):
+                with self.assertLogs("dakara_base.progress_bar"):
+                    feeder.add_songs(songs_paths)
+
+            # assert only created songs were acknowledged
+            self.assertListEqual(
+                list(feeder.journal.songs), [Path("directory") / "song_1.mp4"]
+            )
+            self.assertEqual(feeder.journal.sent_count, 2)
+            feeder.journal.close()
+
+    @patch.object(FFProbeMetadataParser, "parse", autoset=True)
+    @patch("dakara_feeder.feeder.songs.list_directory", autoset=True)
+    def test_feed_rejected_journal(
+        self, mocked_list_directory, mocked_metadata_parse, mocked_http_client_class
+    ):
+        """Test songs rejected by the server are kept in the journal after a feed."""
+
+        # create the mocks
+        def post_songs(songs_chunks, on_sent=None, on_rejected=None):
+            for songs_chunk in songs_chunks:
+                for song in songs_chunk:
+                    if song["title"] == "song_1":
+                        on_rejected(song, SongInvalidError("invalid"))
+
+                yield None
+
+        mocked_http_client_class.return_value.retrieve_songs.return_value = []
+        mocked_http_client_class.return_value.post_songs.side_effect = post_songs
+        mocked_http_client_class.return_value.prune_artists.return_value = 0
+        mocked_http_client_class.return_value.prune_works.return_value = 0
+        mocked_metadata_parse.return_value.get_duration.return_value = timedelta(
+            seconds=1
+        )
+        mocked_metadata_parse.return_value.get_audio_tracks_count.return_value = 1
+
+        with TempDir() as temp:
+            (temp / "directory").makedirs()
+            songs_paths = []
+            for i in range(3):
+                (temp / "directory" / "song_{}.mp4".format(i)).touch()
+                songs_paths.append(
+                    SongPaths(Path("directory") / "song_{}.mp4".format(i))
+                )
+
+            mocked_list_directory.return_value = songs_paths
+
+            # create the object
+            config = {"server": {"songs_per_chunk": 2}, "kara_folder": temp}
+            feeder = SongsFeeder(config, progress=False)
+            feeder.journal = Journal(temp / "journal.jsonl", {})
+            feeder.journal.open()
+
+            # call the method
+            with self.assertLogs("dakara_feeder.feeder.songs", "WARNING"):
+                with self.assertLogs("dakara_base.progress_bar"):
+                    feeder.feed()
+
+            feeder.journal.close()
+
+            # assert only the rejected song is kept in the journal
+            journal = Journal(temp / "journal.jsonl", {})
+            with self.assertLogs("dakara_feeder.journal", "INFO"):
+                journal.open()
+
+            self.assertListEqual(
+                list(journal.songs), [str(Path("directory") / "song_1.mp4")]
+            )
+            journal.close()
+
+    @patch.object(FFProbeMetadataParser, "parse", autoset=True)
+    def test_add_songs_journal(self, mocked_metadata_parse, mocked_http_client_class):
+        """Test to reuse songs parsed by an interrupted run and journal chunks."""
+        set_dispatch(mocked_http_client_class.return_value)
+
+        # create the mocks
+        mocked_http_client_class.return_value.post_song.return_value = None
+        mocked_metadata_parse.return_value.get_duration.return_value = timedelta(
+            seconds=1
+        )
+        mocked_metadata_parse.return_value.get_audio_tracks_count.return_value = 1
+
+        with TempDir() as temp:
+            (temp / "directory").makedirs()
+            songs_paths = []
+            for i in range(3):
+                (temp / "directory" / "song_{}.mp4".format(i)).touch()
+                songs_paths.append(
+                    SongPaths(Path("directory") / "song_{}.mp4".format(i))
+                )
+
+            # create the object
+            config = {"server": {"songs_per_chunk": 2}, "kara_folder": temp}
+            feeder = SongsFeeder(config, progress=False)
+            feeder.journal = Journal(temp / "journal.jsonl", {})
+            feeder.journal.open()
+
+            # a previous run parsed the first song
+            song = {
+                "title": "journaled",
+                "filename": "song_0.mp4",
+                "directory": "directory",
+            }
+            feeder.journal.add(temp, songs_paths[0], song)
+
+            # call the method
+            with self.assertLogs("dakara_base.progress_bar"):
+                feeder.add_songs(songs_paths)
+
+            # assert all songs were acknowledged
+            self.assertDictEqual(feeder.journal.songs, {})
+            self.assertEqual(feeder.journal.sent_count, 3)
+            feeder.journal.close()
+
+        # assert the journaled song was not parsed again
+        post_calls = mocked_http_client_class.return_value.post_song.call_args_list
+        self.assertListEqual(
+            [[song["title"] for song in call.args[0]] for call in post_calls],
+            [["journaled", "song_1"], ["song_2"]],
+        )
+        self.assertEqual(mocked_metadata_parse.call_count, 2)
+
+    def test_match_renamed(self, mocked_http_client_class):
+        """Test to find renamed songs."""
+        # create the object
+        feeder = SongsFeeder(self.config, progress=False)
+
+        # call the method
+        updated, added, deleted = feeder.match_renamed(
+            [
+                Path("new") / "song_0.mp4",
+                Path("directory") / "a.mkv",
+                Path("directory") / "sonj_2.mp4",
+            ],
+            [
+                Path("old") / "song_0.mp4",
+                Path("directory") / "a.mp4",
+                Path("directory") / "song_2.mp4",
+            ],
+        )
+
+        # assert the result
+        self.assertListEqual(
+            updated,
+            [
+                (Path("new") / "song_0.mp4", Path("old") / "song_0.mp4"),
+                (Path("directory") / "sonj_2.mp4", Path("directory") / "song_2.mp4"),
+            ],
+        )
+        self.assertListEqual(added, [Path("directory") / "a.mkv"])
+        self.assertListEqual(deleted, [Path("directory") / "a.mp4"])
+
+    def test_match_renamed_stem(self, mocked_http_client_class):
+        """Test to find songs which extension changed."""
+        # create the object
+        config = {
+            "server": {},
+            "kara_folder": "basepath",
+            "rename_detection": {"match_stem": True},
+        }
+        feeder = SongsFeeder(config, progress=False)
+
+        # call the method
+        updated, added, deleted = feeder.match_renamed(
+            [Path("directory") / "a.mkv"], [Path("directory") / "a.mp4"]
+        )
+
+        # assert the result
+        self.assertListEqual(
+            updated,
+            [(Path("directory") / "a.mkv", Path("directory") / "a.mp4")],
+        )
+        self.assertListEqual(added, [])
+        self.assertListEqual(deleted, [])
+
+    def test_invalid_similarity_method(self, mocked_http_client_class):
+        """Test an unknown similarity method is refused."""
+        config = {
+            "server": {},
+            "kara_folder": "basepath",
+            "rename_detection": {"method": "unknown"},
+        }
+
+        with self.assertRaisesRegex(
+            InvalidSimilarityMethodError, "Invalid similarity method 'unknown'"
+        ):
+            SongsFeeder(config)
+
+    @skipIf(similarity.numpy is None, "NumPy not installed")
+    def test_match_renamed_trigram(self, mocked_http_client_class):
+        """Test to find renamed songs with trigrams."""
+        # create the object
+        config = {
+            "server": {},
+            "kara_folder": "basepath",
+            "rename_detection": {"method": "trigram", "threshold": 0.7},
+        }
+        feeder = SongsFeeder(config, progress=False)
+
+        # call the method
+        updated, added, deleted = feeder.match_renamed(
+            [Path("directory") / "song title.mp4", Path("directory") / "other.mp4"],
+            [Path("directory") / "song titl.mp4", Path("directory") / "different.mp4"],
+        )
+
+        # assert the result
+        self.assertListEqual(
+            updated,
+            [
+                (
+                    Path("directory") / "song title.mp4",
+                    Path("directory") / "song titl.mp4",
+                )
+            ],
+        )
+        self.assertListEqual(added, [Path("directory") / "other.mp4"])
+        self.assertListEqual(deleted, [Path("directory") / "different.mp4"])
+
+    @patch("dakara_feeder.feeder.songs.get_available_cpu_count", return_value=6)
+    def test_similarity_processes(
+        self, mocked_get_available_cpu_count, mocked_http_client_class
+    ):
+        """Test the number of processes to compute similarity."""
+        config = {
+            "server": {},
+            "kara_folder": "basepath",
+            "rename_detection": {"processes": "auto"},
+        }
+
+        self.assertEqual(SongsFeeder(config).similarity_processes, 6)
+        self.assertEqual(SongsFeeder(self.config).similarity_processes, 1)
+
+    def test_match_renamed_fingerprint(self, mocked_http_client_class):
+        """Test to find renamed songs by their fingerprint."""
+        with TempDir() as temp:
+            # create directory structure
+            (temp / "kara").makedirs()
+            (temp / "kara" / "completely different.mp4").write_bytes(b"video 1")
+            (temp / "kara" / "copy.mp4").write_bytes(b"video 2")
+            (temp / "kara" / "fresh.mp4").write_bytes(b"video 3")
+
+            # create the object
+            config = {"server": {}, "kara_folder": temp / "kara"}
+            feeder = SongsFeeder(config, progress=False)
+
+            with FingerprintCache(temp / "fingerprints.sqlite") as cache:
+                feeder.fingerprint_cache = cache
+
+                # store fingerprints of old files
+                cache.set(
+                    Path("old name.mp4"),
+                    get_file_fingerprint(temp / "kara" / "completely different.mp4"),
+                )
+                cache.set(
+                    Path("original.mp4"),
+                    (0,) + get_file_fingerprint(temp / "kara" / "copy.mp4")[1:],
+                )
+
+                # call the method
+                updated, added, deleted = feeder.match_renamed(
+                    [
+                        Path("completely different.mp4"),
+                        Path("copy.mp4"),
+                        Path("fresh.mp4"),
+                    ],
+                    [Path("old name.mp4"), Path("original.mp4"), Path("removed.mp4")],
+                )
+
+        # assert the result
+        self.assertListEqual(
+            updated,
+            [
+                (Path("completely different.mp4"), Path("old name.mp4")),
+                (Path("copy.mp4"), Path("original.mp4")),
+            ],
+        )
+        self.assertListEqual(added, [Path("fresh.mp4")])
+        self.assertListEqual(deleted, [Path("removed.mp4")])
+
+    @patch.object(FFProbeMetadataParser, "parse", autoset=True)
+    def test_synchronize_fingerprint(
+        self, mocked_metadata_parse, mocked_http_client_class
+    ):
+        """Test fingerprints are updated after synchronization."""
+        # create the mocks
+        mocked_metadata_parse.return_value.get_duration.return_value = timedelta(
+            seconds=1
+        )
+        mocked_metadata_parse.return_value.get_audio_tracks_count.return_value = 1
+
+        with TempDir() as temp:
+            # create directory structure
+            (temp / "kara").makedirs()
+            (temp / "kara" / "song.mp4").write_bytes(b"video")
+
+            # create the object
+            config = {"server": {}, "kara_folder": temp / "kara"}
+            feeder = SongsFeeder(config, progress=False)
+
+            with FingerprintCache(temp / "fingerprints.sqlite") as cache:
+                feeder.fingerprint_cache = cache
+                cache.set(Path("removed.mp4"), (1, 2, "head", "tail"))
+
+                # call the method
+                with self.assertLogs("dakara_feeder.feeder.songs"):
+                    with self.assertLogs("dakara_base.progress_bar"):
+                        feeder.synchronize(
+                            {Path("removed.mp4"): 0}, [SongPaths(Path("song.mp4"))]
+                        )
+
+                # assert the fingerprints
+                self.assertIsNone(cache.get(Path("removed.mp4")))
+                self.assertEqual(
+                    cache.get(Path("song.mp4")),
+                    get_file_fingerprint(temp / "kara" / "song.mp4"),
+                )
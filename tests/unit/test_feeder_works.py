@@ -1,3 +1,4 @@
+import json
 from unittest import TestCase
 from unittest.mock import call, patch
 
@@ -258,6 +259,42 @@ class WorksFeederTestCase(TestCase):
             ],
         )
 
+    @patch("dakara_feeder.feeder.works.get_json_file_content")
+    def test_feed_by_chunks(
+        self, mocked_get_json_file_content, mocked_http_client_class
+    ):
+        """Test to feed works by chunks of limited size."""
+        mocked_http_client_class.return_value.retrieve_works.return_value = []
+        mocked_get_json_file_content.return_value = {
+            "anime": [
+                {"title": "Work 0", "subtitle": ""},
+                {"title": "Work 1", "subtitle": "A long subtitle " * 5},
+                {"title": "Work 2", "subtitle": ""},
+                {"title": "Work 3", "subtitle": ""},
+            ]
+        }
+
+        # create the object
+        config = {"server": {"works_per_chunk": 3, "chunk_max_bytes": 200}}
+        feeder = WorksFeeder(config, self.works_file_path, progress=False)
+
+        # call the method
+        with self.assertLogs("dakara_feeder.feeder.works", "DEBUG"):
+            feeder.feed()
+
+        # assert the works were sent by chunks of limited size
+        chunks = [
+            call.args[0]
+            for call in mocked_http_client_class.return_value.post_work.call_args_list
+        ]
+        self.assertCountEqual(
+            [work["title"] for chunk in chunks for work in chunk],
+            ["Work 0", "Work 1", "Work 2", "Work 3"],
+        )
+        self.assertEqual(len(chunks), 3)
+        for chunk in chunks:
+            self.assertLessEqual(len(json.dumps(chunk)), 200)
+
     @patch("dakara_feeder.feeder.works.get_json_file_content")
     def test_feed_update_only(
         self, mocked_get_json_file_content, mocked_http_client_class
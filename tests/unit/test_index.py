@@ -0,0 +1,107 @@
+from unittest import TestCase
+
+from path import Path
+
+from dakara_feeder.index import SongsIndex
+
+
+class SongsIndexTestCase(TestCase):
+    """Test the index of songs of the server."""
+
+    def setUp(self):
+        self.songs = {
+            Path("directory_0") / "song_0.mp4": 0,
+            Path("directory_0") / "song_1.mp4": 1,
+            Path("directory_1") / "song_2.mp4": 2,
+            Path("song_3.mp4"): 3,
+        }
+
+    def test_mapping(self):
+        """Test to use the index as a mapping."""
+        index = SongsIndex(self.songs)
+
+        self.assertEqual(len(index), 4)
+        self.assertDictEqual(dict(index), self.songs)
+        self.assertEqual(index[Path("directory_1") / "song_2.mp4"], 2)
+        self.assertEqual(index["song_3.mp4"], 3)
+        self.assertIn(Path("directory_0") / "song_1.mp4", index)
+        self.assertNotIn(Path("directory_2") / "song_1.mp4", index)
+
+        with self.assertRaises(KeyError):
+            index[Path("directory_0") / "song_9.mp4"]
+
+    def test_intern_directories(self):
+        """Test directories are stored once."""
+        index = SongsIndex(self.songs)
+
+        self.assertListEqual(index.directories, ["directory_0", "directory_1", ""])
+        self.assertEqual(len(index.ids), 4)
+
+    def test_set_delete(self):
+        """Test to update and remove songs."""
+        index = SongsIndex(self.songs)
+
+        # update a song
+        index[Path("directory_0") / "song_0.mp4"] = 10
+        self.assertEqual(index[Path("directory_0") / "song_0.mp4"], 10)
+        self.assertEqual(len(index), 4)
+
+        # remove a song
+        self.assertEqual(index.pop(Path("directory_0") / "song_1.mp4"), 1)
+        self.assertIsNone(index.pop(Path("directory_0") / "song_1.mp4", None))
+        self.assertEqual(len(index), 3)
+
+        with self.assertRaises(KeyError):
+            del index[Path("directory_2") / "song_1.mp4"]
+
+        # the row of the removed song is reused
+        index[Path("directory_2") / "song_4.mp4"] = 4
+        self.assertEqual(len(index.ids), 4)
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index[Path("directory_2") / "song_4.mp4"], 4)
+
+    def test_copy(self):
+        """Test to copy the index."""
+        index = SongsIndex(self.songs)
+        copy = index.copy()
+        del copy[Path("song_3.mp4")]
+        copy[Path("directory_0") / "song_0.mp4"] = 10
+
+        self.assertDictEqual(dict(index), self.songs)
+        self.assertEqual(len(copy), 3)
+
+    def test_subset(self):
+        """Test to get the songs of some directories."""
+        index = SongsIndex(self.songs)
+
+        self.assertDictEqual(
+            dict(index.subset([Path("directory_0"), Path(""), Path("unknown")])),
+            {
+                Path("directory_0") / "song_0.mp4": 0,
+                Path("directory_0") / "song_1.mp4": 1,
+                Path("song_3.mp4"): 3,
+            },
+        )
+
+    def test_diff(self):
+        """Test to compare the index with a listing."""
+        index = SongsIndex(self.songs)
+        del index[Path("directory_1") / "song_2.mp4"]
+
+        added, deleted, unchanged = index.diff(
+            [
+                Path("directory_0") / "song_0.mp4",
+                Path("directory_1") / "song_2.mp4",
+                Path("directory_2") / "song_4.mp4",
+                Path("song_3.mp4"),
+            ]
+        )
+
+        self.assertListEqual(
+            added,
+            [Path("directory_1") / "song_2.mp4", Path("directory_2") / "song_4.mp4"],
+        )
+        self.assertListEqual(deleted, [Path("directory_0") / "song_1.mp4"])
+        self.assertListEqual(
+            unchanged, [Path("directory_0") / "song_0.mp4", Path("song_3.mp4")]
+        )
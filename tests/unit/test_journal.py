@@ -0,0 +1,223 @@
+import json
+from unittest import TestCase
+
+from path import Path, TempDir
+
+from dakara_feeder.directory import SongPaths
+from dakara_feeder.journal import Journal, get_song_signature
+
+
+class GetSongSignatureTestCase(TestCase):
+    """Test the signature of the files of a song."""
+
+    def test_get(self):
+        """Test to get the signature of a song."""
+        with TempDir() as temp:
+            (temp / "song.mkv").write_bytes(b"video")
+            (temp / "song.ass").write_bytes(b"subtitle")
+
+            signature = get_song_signature(
+                temp, SongPaths(Path("song.mkv"), subtitle=Path("song.ass"))
+            )
+
+        self.assertEqual(len(signature), 2)
+        self.assertEqual(signature[0][:2], ["song.mkv", 5])
+        self.assertEqual(signature[1][:2], ["song.ass", 8])
+
+    def test_get_missing(self):
+        """Test to get the signature of a song with a missing file."""
+        with TempDir() as temp:
+            signature = get_song_signature(temp, SongPaths(Path("song.mkv")))
+
+        self.assertListEqual(signature, [["song.mkv", None, None, None]])
+
+
+class JournalTestCase(TestCase):
+    """Test the journal of songs being created."""
+
+    def setUp(self):
+        self.header = {"root": "kara", "song_class": "dakara_feeder.song"}
+        self.song_paths = SongPaths(Path("directory") / "song.mkv")
+        self.song = {"title": "song", "filename": "song.mkv", "directory": "directory"}
+
+    def create_video(self, temp, content=b"video"):
+        (temp / "directory").makedirs_p()
+        (temp / "directory" / "song.mkv").write_bytes(content)
+
+    def test_get_empty(self):
+        """Test to get a song from an empty journal."""
+        with TempDir() as temp:
+            journal = Journal(temp / "journal.jsonl", self.header)
+            journal.open()
+
+            self.assertIsNone(journal.get(temp, self.song_paths))
+            self.assertFalse((temp / "journal.jsonl").exists())
+
+    def test_add_get(self):
+        """Test to get a song after adding it."""
+        with TempDir() as temp:
+            self.create_video(temp)
+            journal = Journal(temp / "journal.jsonl", self.header)
+            journal.open()
+            journal.add(temp, self.song_paths, self.song)
+
+            self.assertDictEqual(journal.get(temp, self.song_paths), self.song)
+            self.assertTrue((temp / "journal.jsonl").exists())
+            journal.close()
+
+    def test_add_get_prefix(self):
+        """Test to get a song of a root of the kara folder."""
+        song = dict(self.song, directory="anime/directory")
+
+        with TempDir() as temp:
+            self.create_video(temp)
+            journal = Journal(temp / "journal.jsonl", self.header)
+            journal.open()
+            journal.add(temp, self.song_paths, song, "anime")
+
+            self.assertDictEqual(journal.get(temp, self.song_paths, "anime"), song)
+            self.assertIsNone(journal.get(temp, self.song_paths))
+
+            # the song is acknowledged by its path in the kara folder
+            journal.acknowledge([song])
+            self.assertIsNone(journal.get(temp, self.song_paths, "anime"))
+            journal.close()
+
+    def test_resume(self):
+        """Test to reuse the songs parsed but not sent by a previous run."""
+        song_paths_other = SongPaths(Path("directory") / "other.mkv")
+        song_other = {
+            "title": "other",
+            "filename": "other.mkv",
+            "directory": "directory",
+        }
+
+        with TempDir() as temp:
+            self.create_video(temp)
+            (temp / "directory" / "other.mkv").write_bytes(b"other")
+
+            # first run, interrupted after sending one song
+            journal = Journal(temp / "journal.jsonl", self.header)
+            journal.open()
+            journal.add(temp, self.song_paths, self.song)
+            journal.add(temp, song_paths_other, song_other)
+            journal.acknowledge([song_other])
+            journal.close()
+
+            # second run
+            journal = Journal(temp / "journal.jsonl", self.header)
+            with self.assertLogs("dakara_feeder.journal", "INFO") as logger:
+                journal.open()
+
+            self.assertDictEqual(journal.get(temp, self.song_paths), self.song)
+            self.assertIsNone(journal.get(temp, song_paths_other))
+            self.assertEqual(journal.sent_count, 1)
+
+            # the file has been compacted
+            lines = (temp / "journal.jsonl").read_text().splitlines()
+            journal.close()
+
+        self.assertListEqual(
+            logger.output,
+            [
+                "INFO:dakara_feeder.journal:Resuming from journal: 1 songs were "
+                "sent, 1 parsed songs can be reused"
+            ],
+        )
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[1])["video"], "directory/song.mkv")
+
+    def test_resume_changed(self):
+        """Test to not reuse a song which file has changed."""
+        with TempDir() as temp:
+            self.create_video(temp)
+            journal = Journal(temp / "journal.jsonl", self.header)
+            journal.open()
+            journal.add(temp, self.song_paths, self.song)
+            journal.close()
+
+            # change the file
+            self.create_video(temp, b"other video")
+
+            journal = Journal(temp / "journal.jsonl", self.header)
+            with self.assertLogs("dakara_feeder.journal", "INFO"):
+                journal.open()
+
+            self.assertIsNone(journal.get(temp, self.song_paths))
+            journal.close()
+
+    def test_resume_outdated(self):
+        """Test to ignore a journal created for another song class."""
+        with TempDir() as temp:
+            self.create_video(temp)
+            journal = Journal(temp / "journal.jsonl", self.header)
+            journal.open()
+            journal.add(temp, self.song_paths, self.song)
+            journal.close()
+
+            journal = Journal(
+                temp / "journal.jsonl", {**self.header, "song_class": "other"}
+            )
+            journal.open()
+
+            self.assertIsNone(journal.get(temp, self.song_paths))
+            self.assertFalse((temp / "journal.jsonl").exists())
+
+    def test_resume_truncated(self):
+        """Test to ignore the last entry if it is truncated."""
+        with TempDir() as temp:
+            self.create_video(temp)
+            journal = Journal(temp / "journal.jsonl", self.header)
+            journal.open()
+            journal.add(temp, self.song_paths, self.song)
+            journal.close()
+
+            # simulate an interruption while writing
+            with open(temp / "journal.jsonl", "a") as file:
+                file.write('{"sent": ["directory/so')
+
+            journal = Journal(temp / "journal.jsonl", self.header)
+            with self.assertLogs("dakara_feeder.journal", "INFO"):
+                journal.open()
+
+            self.assertDictEqual(journal.get(temp, self.song_paths), self.song)
+            journal.close()
+
+    def test_keep(self):
+        """Test to keep only some songs of the journal."""
+        song_paths_other = SongPaths(Path("directory") / "other.mkv")
+        song_other = dict(self.song, title="other", filename="other.mkv")
+
+        with TempDir() as temp:
+            self.create_video(temp)
+            (temp / "directory" / "other.mkv").write_bytes(b"other")
+            journal = Journal(temp / "journal.jsonl", self.header)
+            journal.open()
+            journal.add(temp, self.song_paths, self.song)
+            journal.add(temp, song_paths_other, song_other)
+            journal.keep({"directory/other.mkv"})
+            journal.close()
+
+            # the file contains only the kept song
+            journal = Journal(temp / "journal.jsonl", self.header)
+            with self.assertLogs("dakara_feeder.journal", "INFO"):
+                journal.open()
+
+            self.assertIsNone(journal.get(temp, self.song_paths))
+            self.assertDictEqual(journal.get(temp, song_paths_other), song_other)
+
+            # the file is removed if no song is kept
+            journal.keep(set())
+            self.assertFalse((temp / "journal.jsonl").exists())
+
+    def test_clear(self):
+        """Test to clear the journal."""
+        with TempDir() as temp:
+            self.create_video(temp)
+            journal = Journal(temp / "journal.jsonl", self.header)
+            journal.open()
+            journal.add(temp, self.song_paths, self.song)
+            journal.clear()
+
+            self.assertIsNone(journal.get(temp, self.song_paths))
+            self.assertFalse((temp / "journal.jsonl").exists())
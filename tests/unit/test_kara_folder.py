@@ -0,0 +1,139 @@
+from unittest import TestCase
+
+from path import Path
+
+from dakara_feeder.directory import SongPaths
+from dakara_feeder.kara_folder import (
+    InvalidKaraFolderError,
+    KaraFolder,
+    UnknownKaraRootError,
+)
+
+
+class KaraFolderTestCase(TestCase):
+    """Test the karaoke folder."""
+
+    def test_one_folder(self):
+        """Test a karaoke folder with one root."""
+        kara_folder = KaraFolder.from_config("path/to/kara")
+
+        self.assertEqual(len(kara_folder.roots), 1)
+        self.assertEqual(kara_folder.roots[0].path, Path("path/to/kara"))
+        self.assertEqual(kara_folder.roots[0].prefix, "")
+        self.assertEqual(
+            kara_folder.get_identifier(), str(Path("path/to/kara").abspath())
+        )
+        self.assertEqual(
+            kara_folder.get_file_path(Path("directory") / "song.mkv"),
+            Path("path/to/kara") / "directory" / "song.mkv",
+        )
+
+        # get roots of songs
+        song_paths = SongPaths(Path("directory") / "song.mkv")
+        root, root_song_paths = kara_folder.get_song_paths(song_paths)
+        self.assertIs(root, kara_folder.roots[0])
+        self.assertEqual(root_song_paths, song_paths)
+
+    def test_several_folders(self):
+        """Test a karaoke folder with several roots."""
+        kara_folder = KaraFolder.from_config(
+            ["path/to/disk1", {"path": "path/to/disk2/", "prefix": "anime"}]
+        )
+
+        self.assertListEqual(
+            [(root.path, root.prefix) for root in kara_folder.roots],
+            [(Path("path/to/disk1"), "disk1"), (Path("path/to/disk2/"), "anime")],
+        )
+        self.assertEqual(
+            kara_folder.get_identifier(),
+            "disk1:{}\nanime:{}".format(
+                Path("path/to/disk1").abspath(), Path("path/to/disk2/").abspath()
+            ),
+        )
+
+        # resolve paths
+        self.assertEqual(
+            kara_folder.get_file_path(Path("disk1") / "directory" / "song.mkv"),
+            Path("path/to/disk1") / "directory" / "song.mkv",
+        )
+        self.assertEqual(
+            kara_folder.get_file_path(Path("anime") / "song.mkv"),
+            Path("path/to/disk2/") / "song.mkv",
+        )
+        self.assertEqual(kara_folder.get_file_path("anime"), Path("path/to/disk2/"))
+
+        with self.assertRaisesRegex(
+            UnknownKaraRootError, "Path 'other' is not in any karaoke folder"
+        ):
+            kara_folder.get_file_path("other")
+
+        # get roots of songs
+        root, root_song_paths = kara_folder.get_song_paths(
+            SongPaths(
+                Path("anime") / "directory" / "song.mkv",
+                subtitle=Path("anime") / "directory" / "song.ass",
+            )
+        )
+        self.assertIs(root, kara_folder.roots[1])
+        self.assertEqual(
+            root_song_paths,
+            SongPaths(
+                Path("directory") / "song.mkv",
+                subtitle=Path("directory") / "song.ass",
+            ),
+        )
+
+    def test_root_kara_folder_path(self):
+        """Test to get the path in the karaoke folder of a path of a root."""
+        root, root_without_prefix = (
+            KaraFolder.from_config([{"path": "path/to/disk1", "prefix": "anime"}]).roots
+            + KaraFolder.from_config("path/to/kara").roots
+        )
+
+        self.assertEqual(
+            root.get_kara_folder_path(Path("directory")), Path("anime/directory")
+        )
+        self.assertEqual(root.get_kara_folder_path(Path("")), Path("anime"))
+        self.assertEqual(
+            root_without_prefix.get_kara_folder_path(Path("directory")),
+            Path("directory"),
+        )
+
+    def test_default_prefix(self):
+        """Test the prefix of a root is the name of its directory."""
+        kara_folder = KaraFolder.from_config([{"path": "path/to/disk1/"}])
+
+        self.assertEqual(kara_folder.roots[0].prefix, "disk1")
+
+    def test_empty(self):
+        """Test an empty list of roots is invalid."""
+        with self.assertRaisesRegex(
+            InvalidKaraFolderError, "The list of karaoke folders is empty"
+        ):
+            KaraFolder.from_config([])
+
+    def test_no_path(self):
+        """Test a root without path is invalid."""
+        with self.assertRaisesRegex(
+            InvalidKaraFolderError, "A karaoke folder of the list has no path"
+        ):
+            KaraFolder.from_config([{"prefix": "disk1"}])
+
+    def test_same_prefix(self):
+        """Test roots with the same prefix are invalid."""
+        with self.assertRaisesRegex(
+            InvalidKaraFolderError,
+            "Several karaoke folders have the prefix 'karaoke'",
+        ):
+            KaraFolder.from_config(["disk1/karaoke", "disk2/karaoke"])
+
+    def test_invalid_prefix(self):
+        """Test a prefix which is not a directory name is invalid."""
+        with self.assertRaisesRegex(
+            InvalidKaraFolderError,
+            "Invalid prefix 'anime/op' for karaoke folder 'disk1'",
+        ):
+            KaraFolder.from_config([{"path": "disk1", "prefix": "anime/op"}])
+
+        with self.assertRaisesRegex(InvalidKaraFolderError, "Invalid prefix '..'"):
+            KaraFolder.from_config([{"path": "disk1", "prefix": ".."}])
@@ -1,4 +1,6 @@
 from argparse import ArgumentParser, Namespace
+from contextlib import redirect_stderr
+from io import StringIO
 from unittest import TestCase
 from unittest.mock import ANY, MagicMock, patch
 
@@ -11,10 +13,25 @@ from dakara_feeder.__main__ import (
     feed_tags,
     feed_work_types,
     feed_works,
+    get_parser,
     main,
 )
 
 
+class GetParserTestCase(TestCase):
+    """Test the parser of the command line."""
+
+    def test_watch_async(self):
+        """Test the watch mode cannot be asynchronous."""
+        parser = get_parser()
+
+        with redirect_stderr(StringIO()) as stderr:
+            with self.assertRaises(SystemExit):
+                parser.parse_args(["feed", "songs", "--watch", "--async"])
+
+        self.assertIn("not allowed with argument", stderr.getvalue())
+
+
 @patch("dakara_feeder.__main__.CONFIG_FILE", "feeder.yaml")
 @patch("dakara_feeder.__main__.create_logger")
 @patch("dakara_feeder.__main__.create_config_file")
@@ -62,7 +79,18 @@ class FeedSongsTestCase(TestCase):
     ):
         """Test to feed songs."""
         # call the function
-        feed_songs(Namespace(debug=False, force=False, progress=True, prune=True))
+        feed_songs(
+            Namespace(
+                debug=False,
+                force=False,
+                progress=True,
+                prune=True,
+                jobs=None,
+                rescan=False,
+                watch=False,
+                asynchronous=False,
+            )
+        )
 
         # assert the call
         mocked_create_logger.assert_called_with(wrap=True)
@@ -71,10 +99,83 @@ class FeedSongsTestCase(TestCase):
         mocked_set_debug.assert_called_with(False)
         mocked_set_loglevel.assert_called_with(ANY)
         mocked_songs_feeder_class.assert_called_with(
-            ANY, force_update=False, prune=True, progress=True
+            ANY,
+            force_update=False,
+            prune=True,
+            progress=True,
+            parse_workers=None,
+            rescan=False,
         )
         mocked_songs_feeder_class.return_value.load.assert_called_with()
         mocked_songs_feeder_class.return_value.feed.assert_called_with()
+        mocked_songs_feeder_class.return_value.watch.assert_not_called()
+        mocked_songs_feeder_class.return_value.close.assert_called_with()
+
+    def test_watch(
+        self,
+        mocked_create_logger,
+        mocked_load_file,
+        mocked_check_mandatory_keys,
+        mocked_set_debug,
+        mocked_set_loglevel,
+        mocked_songs_feeder_class,
+    ):
+        """Test to feed songs continuously."""
+        # call the function
+        feed_songs(
+            Namespace(
+                debug=False,
+                force=False,
+                progress=True,
+                prune=True,
+                jobs=None,
+                rescan=False,
+                watch=True,
+                asynchronous=False,
+            )
+        )
+
+        # assert the call
+        mocked_songs_feeder_class.return_value.load.assert_called_with()
+        mocked_songs_feeder_class.return_value.watch.assert_called_with()
+        mocked_songs_feeder_class.return_value.feed.assert_not_called()
+
+    @patch("dakara_feeder.__main__.asyncio.run", autoset=True)
+    def test_asynchronous(
+        self,
+        mocked_run,
+        mocked_create_logger,
+        mocked_load_file,
+        mocked_check_mandatory_keys,
+        mocked_set_debug,
+        mocked_set_loglevel,
+        mocked_songs_feeder_class,
+    ):
+        """Test to feed songs asynchronously."""
+        # create the mocks
+        mocked_songs_feeder_class.return_value.feed_async = MagicMock()
+
+        # call the function
+        feed_songs(
+            Namespace(
+                debug=False,
+                force=False,
+                progress=True,
+                prune=True,
+                jobs=None,
+                rescan=False,
+                watch=False,
+                asynchronous=True,
+            )
+        )
+
+        # assert the call
+        mocked_songs_feeder_class.return_value.load.assert_called_with()
+        mocked_songs_feeder_class.return_value.feed_async.assert_called_with()
+        mocked_run.assert_called_with(
+            mocked_songs_feeder_class.return_value.feed_async.return_value
+        )
+        mocked_songs_feeder_class.return_value.feed.assert_not_called()
 
 
 @patch("dakara_feeder.__main__.WorksFeeder", autospec=True)
@@ -1,15 +1,19 @@
+import asyncio
 from datetime import timedelta
 from unittest import TestCase
-from unittest.mock import ANY, patch
+from unittest.mock import AsyncMock, patch
 
 from path import Path
 from pymediainfo import MediaInfo
 
 from dakara_feeder.metadata import (
+    CachedMetadataParseError,
+    CachedMetadataParser,
     FFProbeMetadataParser,
     FFProbeNotInstalledError,
     MediainfoMetadataParser,
     MediainfoNotInstalledError,
+    MediaNotFoundError,
     MediaParseError,
     NullMetadataParser,
 )
@@ -37,13 +41,50 @@ class NullMetadataParserTestCase(TestCase):
         parser = NullMetadataParser(Path("path/to/file"))
         self.assertEqual(parser.get_subtitle_tracks_count(), 0)
 
+    def test_parse_async(self):
+        """Test to parse asynchronously with the synchronous method."""
+        parser = asyncio.run(NullMetadataParser.parse_async(Path("path/to/file")))
+        self.assertIsInstance(parser, NullMetadataParser)
+
+
+class CachedMetadataParserTestCase(TestCase):
+    """Test the cached metadata parser."""
+
+    def test_from_parser(self):
+        """Test to store the values of another parser."""
+        parser = CachedMetadataParser.from_parser(
+            FFProbeMetadataParser(
+                {
+                    "format": {"duration": "42.42"},
+                    "streams": [{"codec_type": "audio"}, {"codec_type": "subtitle"}],
+                }
+            )
+        )
+
+        self.assertEqual(parser.get_duration(), timedelta(seconds=42.42))
+        self.assertEqual(parser.get_audio_tracks_count(), 1)
+        self.assertEqual(parser.get_subtitle_tracks_count(), 1)
+
+    def test_parse(self):
+        """Test cached metadata cannot be parsed from a file."""
+        self.assertFalse(CachedMetadataParser.is_available())
+
+        with self.assertRaisesRegex(
+            CachedMetadataParseError,
+            "Cached metadata cannot be parsed from file 'path/to/file'",
+        ):
+            CachedMetadataParser.parse(Path("path/to/file"))
+
 
 class MediainfoMetadataParserTestCase(TestCase):
     """Test the Mediainfo metadata parser."""
 
-    @patch("dakara_feeder.metadata.MediaInfo.can_parse", autoset=True)
-    def test_available(self, mocked_can_parse):
+    @patch("dakara_feeder.metadata.registry", autoset=True)
+    def test_available(self, mocked_registry):
         """Test when the parser is available."""
+        # prepare the mock
+        mocked_registry.get.return_value.available = True
+
         # call the method
         result = MediainfoMetadataParser.is_available()
 
@@ -51,13 +92,13 @@ class MediainfoMetadataParserTestCase(TestCase):
         self.assertTrue(result)
 
         # assert the call
-        mocked_can_parse.assert_called_with()
+        mocked_registry.get.assert_called_with("mediainfo")
 
-    @patch("dakara_feeder.metadata.MediaInfo.can_parse", autoset=True)
-    def test_not_available(self, mocked_can_parse):
+    @patch("dakara_feeder.metadata.registry", autoset=True)
+    def test_not_available(self, mocked_registry):
         """Test when the parser is not available."""
         # prepare the mock
-        mocked_can_parse.return_value = False
+        mocked_registry.get.return_value.available = False
 
         # call the method
         result = MediainfoMetadataParser.is_available()
@@ -93,9 +134,12 @@ class MediainfoMetadataParserTestCase(TestCase):
 class FFProbeMetadataParserTestCase(TestCase):
     """Test the FFProbe metadata parser."""
 
-    @patch("dakara_feeder.metadata.subprocess.run", autoset=True)
-    def test_available(self, mocked_run):
+    @patch("dakara_feeder.metadata.registry", autoset=True)
+    def test_available(self, mocked_registry):
         """Test when the parser is available."""
+        # prepare the mock
+        mocked_registry.get.return_value.available = True
+
         # call the method
         result = FFProbeMetadataParser.is_available()
 
@@ -103,13 +147,13 @@ class FFProbeMetadataParserTestCase(TestCase):
         self.assertTrue(result)
 
         # assert the call
-        mocked_run.assert_called_with(["ffprobe", "-version"], stdout=ANY, stderr=ANY)
+        mocked_registry.get.assert_called_with("ffprobe")
 
-    @patch("dakara_feeder.metadata.subprocess.run", autoset=True)
-    def test_not_available(self, mocked_run):
+    @patch("dakara_feeder.metadata.registry", autoset=True)
+    def test_not_available(self, mocked_registry):
         """Test when the parser is not available."""
         # prepare the mock
-        mocked_run.side_effect = FileNotFoundError()
+        mocked_registry.get.return_value.available = False
 
         # call the method
         result = FFProbeMetadataParser.is_available()
@@ -125,6 +169,64 @@ class FFProbeMetadataParserTestCase(TestCase):
         with self.assertRaisesRegex(FFProbeNotInstalledError, "FFProbe not installed"):
             FFProbeMetadataParser.parse(Path("nowhere"))
 
+    @patch("asyncio.create_subprocess_exec", autoset=True)
+    @patch.object(FFProbeMetadataParser, "is_available")
+    def test_parse_async(self, mocked_is_available, mocked_create_subprocess_exec):
+        """Test to parse asynchronously with a subprocess."""
+        # create the mocks
+        mocked_is_available.return_value = True
+        mocked_process = mocked_create_subprocess_exec.return_value
+        mocked_process.returncode = 0
+        mocked_process.communicate = AsyncMock(
+            return_value=(b'{"format": {"duration": "42"}}', None)
+        )
+
+        # call the method
+        parser = asyncio.run(FFProbeMetadataParser.parse_async(Path("file.mkv")))
+
+        # assert the result
+        self.assertEqual(parser.get_duration(), timedelta(seconds=42))
+
+        # assert the call
+        mocked_create_subprocess_exec.assert_called_with(
+            "ffprobe",
+            "-loglevel",
+            "quiet",
+            "-print_format",
+            "json",
+            "-show_format",
+            "-show_streams",
+            Path("file.mkv"),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+
+    @patch("asyncio.create_subprocess_exec", autoset=True)
+    @patch.object(FFProbeMetadataParser, "is_available")
+    def test_parse_async_not_found_error(
+        self, mocked_is_available, mocked_create_subprocess_exec
+    ):
+        """Test to parse asynchronously a file that does not exist."""
+        # create the mocks
+        mocked_is_available.return_value = True
+        mocked_process = mocked_create_subprocess_exec.return_value
+        mocked_process.returncode = 1
+        mocked_process.communicate = AsyncMock(return_value=(b"", None))
+
+        # call the method
+        with self.assertRaisesRegex(
+            MediaNotFoundError, "Media file 'nowhere' not found"
+        ):
+            asyncio.run(FFProbeMetadataParser.parse_async(Path("nowhere")))
+
+    @patch.object(FFProbeMetadataParser, "is_available")
+    def test_parse_async_not_available(self, mocked_is_available):
+        """Test to parse asynchronously when ffprobe is not installed."""
+        mocked_is_available.return_value = False
+
+        with self.assertRaisesRegex(FFProbeNotInstalledError, "FFProbe not installed"):
+            asyncio.run(FFProbeMetadataParser.parse_async(Path("nowhere")))
+
     def test_get_duration_format(self):
         """Test to get duration stored in format key."""
         parser = FFProbeMetadataParser({"format": {"duration": "42.42"}})
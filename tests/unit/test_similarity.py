@@ -1,8 +1,18 @@
-from unittest import TestCase
+from unittest import TestCase, skipIf
+from unittest.mock import patch
 
 from path import Path
 
-from dakara_feeder.similarity import calculate_file_path_similarity
+from dakara_feeder import similarity
+from dakara_feeder.similarity import (
+    NumpyNotAvailableError,
+    calculate_file_path_similarities,
+    calculate_file_path_similarity,
+    calculate_file_path_similarity_matrix,
+    check_numpy,
+    generate_file_path_candidates,
+    get_character_tokens,
+)
 
 
 class CalculateFilePathSimilarityTestCase(TestCase):
@@ -41,3 +51,148 @@ class CalculateFilePathSimilarityTestCase(TestCase):
             calculate_file_path_similarity(Path("directory"), Path("other")),
             calculate_file_path_similarity(Path("other"), Path("directory")),
         )
+
+
+class GetCharacterTokensTestCase(TestCase):
+    """Test get_character_tokens method."""
+
+    def test_get(self):
+        """Test to number occurrences of characters."""
+        self.assertListEqual(
+            get_character_tokens("abab"), [("a", 1), ("b", 1), ("a", 2), ("b", 2)]
+        )
+
+
+class GenerateFilePathCandidatesTestCase(TestCase):
+    """Test generate_file_path_candidates method."""
+
+    def test_generate(self):
+        """Test to generate candidate pairs."""
+        paths1 = [
+            Path("directory/filename.mp4"),
+            Path("directory/other.mp4"),
+            Path("directory/empty/"),
+        ]
+        paths2 = [
+            Path("directory/xyz.mp4"),
+            Path("other/filenam.mp4"),
+            Path("other/"),
+        ]
+
+        self.assertCountEqual(
+            generate_file_path_candidates(paths1, paths2, 0.8), [(0, 1), (2, 2)]
+        )
+
+    def test_generate_no_miss(self):
+        """Test all pairs above the threshold are candidates."""
+        names = ["filename", "filenam", "namefile", "file", "fil ename", "elifname"]
+        paths1 = [Path(directory) / name for directory in ["a", "b"] for name in names]
+        paths2 = [Path(directory) / name for directory in ["a", "c"] for name in names]
+
+        for threshold in [0.5, 0.7, 0.8, 0.9]:
+            expected = {
+                (index1, index2)
+                for index1, path1 in enumerate(paths1)
+                for index2, path2 in enumerate(paths2)
+                if calculate_file_path_similarity(path1, path2) > threshold
+            }
+            candidates = set(generate_file_path_candidates(paths1, paths2, threshold))
+
+            self.assertLessEqual(expected, candidates)
+
+    def test_generate_low_threshold(self):
+        """Test all pairs are candidates for a low threshold."""
+        self.assertCountEqual(
+            generate_file_path_candidates([Path("a"), Path("b")], [Path("c")], 0.1),
+            [(0, 0), (1, 0)],
+        )
+
+
+class CheckNumpyTestCase(TestCase):
+    """Test check_numpy method."""
+
+    @patch.object(similarity, "numpy", None)
+    def test_not_available(self):
+        """Test an error is raised if NumPy is not installed."""
+        with self.assertRaisesRegex(NumpyNotAvailableError, "NumPy is required"):
+            check_numpy()
+
+
+@skipIf(similarity.numpy is None, "NumPy not installed")
+class CalculateFilePathSimilarityMatrixTestCase(TestCase):
+    """Test calculate_file_path_similarity_matrix method."""
+
+    def setUp(self):
+        self.paths1 = [
+            Path("directory/filename.mp4"),
+            Path("directory/other.mp4"),
+            Path("file.mp4"),
+        ]
+        self.paths2 = [
+            Path("directory/filenam.mp4"),
+            Path("other/filename.mp4"),
+            Path("directory/other.mp4"),
+            Path("file.mp4"),
+        ]
+
+    def test_matrix(self):
+        """Test to compute the similarity of each pair of paths."""
+        matrix = calculate_file_path_similarity_matrix(self.paths1, self.paths2)
+
+        self.assertEqual(matrix.shape, (3, 4))
+
+        # renamed
+        self.assertGreater(matrix[0, 0], 0.8)
+
+        # moved
+        self.assertGreater(matrix[0, 1], 0.85)
+
+        # identical
+        self.assertAlmostEqual(matrix[1, 2], 1, places=5)
+        self.assertAlmostEqual(matrix[2, 3], 1, places=5)
+
+        # different
+        self.assertLess(matrix[1, 0], 0.6)
+
+    def test_symmetry(self):
+        """Test the calculation is symmetrical."""
+        matrix = calculate_file_path_similarity_matrix(self.paths1, self.paths2)
+        matrix_transposed = calculate_file_path_similarity_matrix(
+            self.paths2, self.paths1
+        )
+
+        self.assertTrue(similarity.numpy.allclose(matrix, matrix_transposed.T))
+
+    def test_similarities(self):
+        """Test to get pairs higher than a threshold by blocks."""
+        matrix = calculate_file_path_similarity_matrix(self.paths1, self.paths2)
+
+        with patch.object(similarity, "BLOCK_SIZE", 2):
+            with patch.object(
+                similarity,
+                "get_file_path_vectors",
+                wraps=similarity.get_file_path_vectors,
+            ) as mocked_get_file_path_vectors:
+                pairs = list(
+                    calculate_file_path_similarities(self.paths1, self.paths2, 0.8)
+                )
+
+        # the second list is vectorized once, the first one by blocks
+        mocked_get_file_path_vectors.assert_any_call(self.paths2)
+        self.assertEqual(
+            mocked_get_file_path_vectors.call_count,
+            1 + (len(self.paths1) + 1) // 2,
+        )
+
+        self.assertCountEqual(
+            [(index1, index2) for _, index1, index2 in pairs],
+            [(0, 0), (0, 1), (1, 2), (2, 3)],
+        )
+        for value, index1, index2 in pairs:
+            self.assertAlmostEqual(value, float(matrix[index1, index2]), places=5)
+
+    def test_similarities_empty(self):
+        """Test to get pairs of an empty list."""
+        self.assertListEqual(
+            list(calculate_file_path_similarities([], self.paths2, 0.8)), []
+        )
@@ -1,6 +1,7 @@
+import asyncio
 from datetime import timedelta
 from unittest import TestCase
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from path import Path
 
@@ -69,3 +70,162 @@ class BaseSongTestCase(TestCase):
         self.assertListEqual(
             logger.output, ["ERROR:dakara_feeder.song:Cannot parse metadata: invalid"]
         )
+
+    @patch.object(FFProbeMetadataParser, "parse", autoset=True)
+    def test_metadata_cache_hit(self, mocked_metadata_parse):
+        """Test metadata are taken from the cache."""
+        # setup mocks
+        cache = MagicMock()
+        cache.get.return_value.get_duration.return_value = timedelta(seconds=42)
+        cache.get.return_value.get_audio_tracks_count.return_value = 1
+
+        # create BaseSong instance
+        song = BaseSong(Path("/base-dir"), SongPaths(Path("file.mp4")))
+        song.metadata_cache = cache
+
+        # get song representation
+        representation = song.get_representation()
+
+        # check the duration comes from the cache
+        self.assertEqual(representation["duration"], 42)
+        mocked_metadata_parse.assert_not_called()
+        cache.get.assert_called_with(Path("file.mp4"), Path("/base-dir/file.mp4"))
+        cache.set.assert_not_called()
+
+    @patch.object(FFProbeMetadataParser, "parse", autoset=True)
+    def test_metadata_cache_miss(self, mocked_metadata_parse):
+        """Test metadata are stored in the cache when parsed."""
+        # setup mocks
+        cache = MagicMock()
+        cache.get.return_value = None
+        mocked_metadata_parse.return_value.get_duration.return_value = timedelta(
+            seconds=1
+        )
+        mocked_metadata_parse.return_value.get_audio_tracks_count.return_value = 1
+
+        # create BaseSong instance
+        song = BaseSong(Path("/base-dir"), SongPaths(Path("file.mp4")))
+        song.metadata_cache = cache
+
+        # get song representation
+        representation = song.get_representation()
+
+        # check the metadata are stored
+        self.assertEqual(representation["duration"], 1)
+        cache.set.assert_called_with(
+            Path("file.mp4"),
+            Path("/base-dir/file.mp4"),
+            mocked_metadata_parse.return_value,
+        )
+
+    @patch.object(FFProbeMetadataParser, "parse", autoset=True)
+    def test_prefix(self, mocked_metadata_parse):
+        """Test the prefix is added to the directory and the cache key."""
+        # setup mocks
+        cache = MagicMock()
+        cache.get.return_value = None
+        mocked_metadata_parse.return_value.get_duration.return_value = timedelta(
+            seconds=1
+        )
+        mocked_metadata_parse.return_value.get_audio_tracks_count.return_value = 1
+
+        # create BaseSong instances
+        song = BaseSong(Path("/disk2"), SongPaths(Path("directory/file.mp4")))
+        song.metadata_cache = cache
+        song.prefix = "anime"
+        song_root = BaseSong(Path("/disk2"), SongPaths(Path("file.mp4")))
+        song_root.prefix = "anime"
+
+        # get song representations
+        representation = song.get_representation()
+        representation_root = song_root.get_representation()
+
+        # check the representations
+        self.assertEqual(representation["filename"], "file.mp4")
+        self.assertEqual(representation["directory"], Path("anime/directory"))
+        self.assertEqual(representation_root["directory"], "anime")
+        mocked_metadata_parse.assert_any_call(Path("/disk2/directory/file.mp4"))
+        cache.set.assert_called_with(
+            Path("anime/directory/file.mp4"),
+            Path("/disk2/directory/file.mp4"),
+            mocked_metadata_parse.return_value,
+        )
+
+    @patch.object(FFProbeMetadataParser, "parse_async", autoset=True)
+    def test_get_representation_async(self, mocked_metadata_parse_async):
+        """Test to get the representation asynchronously."""
+        # setup mocks
+        cache = MagicMock()
+        cache.get.return_value = None
+        metadata = mocked_metadata_parse_async.return_value = MagicMock()
+        metadata.get_duration.return_value = timedelta(seconds=1)
+        metadata.get_audio_tracks_count.return_value = 2
+
+        # create BaseSong instance
+        song = BaseSong(Path("/base-dir"), SongPaths(Path("directory/file.mp4")))
+        song.metadata_cache = cache
+
+        # get song representation
+        representation = asyncio.run(song.get_representation_async())
+
+        # check the representation
+        self.assertEqual(representation["duration"], 1)
+        self.assertTrue(representation["has_instrumental"])
+        self.assertEqual(representation["filename"], "file.mp4")
+        self.assertEqual(representation["directory"], "directory")
+        mocked_metadata_parse_async.assert_called_with(
+            Path("/base-dir/directory/file.mp4")
+        )
+        cache.set.assert_called_with(
+            Path("directory/file.mp4"), Path("/base-dir/directory/file.mp4"), metadata
+        )
+
+    @patch.object(FFProbeMetadataParser, "parse_async", autoset=True)
+    def test_get_representation_async_overriden(self, mocked_metadata_parse_async):
+        """Test overriden synchronous methods are used asynchronously."""
+
+        class MySong(BaseSong):
+            def parse_metadata(self):
+                self.metadata = MagicMock()
+                self.metadata.get_duration.return_value = timedelta(seconds=42)
+                self.metadata.get_audio_tracks_count.return_value = 1
+
+        class MyOtherSong(BaseSong):
+            def get_representation(self):
+                return {"title": "other"}
+
+        # get songs representation
+        representation = asyncio.run(
+            MySong(
+                Path("/base-dir"), SongPaths(Path("file.mp4"))
+            ).get_representation_async()
+        )
+        representation_other = asyncio.run(
+            MyOtherSong(
+                Path("/base-dir"), SongPaths(Path("file.mp4"))
+            ).get_representation_async()
+        )
+
+        # check the overriden methods were used
+        self.assertEqual(representation["duration"], 42)
+        self.assertDictEqual(representation_other, {"title": "other"})
+        mocked_metadata_parse_async.assert_not_called()
+
+    @patch.object(FFProbeMetadataParser, "parse_async", autoset=True)
+    def test_get_representation_async_metadata_error(self, mocked_metadata_parse_async):
+        """Test to get the representation asynchronously with invalid metadata."""
+        # setup mocks
+        mocked_metadata_parse_async.side_effect = MediaParseError("invalid")
+
+        # create BaseSong instance
+        song = BaseSong(Path("/base-dir"), SongPaths(Path("file.mp4")))
+
+        # get song representation
+        with self.assertLogs("dakara_feeder.song") as logger:
+            representation = asyncio.run(song.get_representation_async())
+
+        # check the representation
+        self.assertEqual(representation["duration"], 0)
+        self.assertListEqual(
+            logger.output, ["ERROR:dakara_feeder.song:Cannot parse metadata: invalid"]
+        )
@@ -1,4 +1,3 @@
-from subprocess import DEVNULL
 from unittest import TestCase
 from unittest.mock import patch
 
@@ -13,18 +12,17 @@ from dakara_feeder.subtitle.extraction import (
 class FFmpegSubtitleExtractorTestCase(TestCase):
     """Test the subtitle extractor based on FFmpeg."""
 
-    @patch("dakara_feeder.subtitle.extraction.subprocess.run")
-    def test_is_available(self, mocked_run):
+    @patch("dakara_feeder.subtitle.extraction.registry")
+    def test_is_available(self, mocked_registry):
         """Test if the FFmpeg subtitle extractor is available."""
+        mocked_registry.get.return_value.available = True
         self.assertTrue(FFmpegSubtitleExtractor.is_available())
-        mocked_run.assert_called_with(
-            ["ffmpeg", "-version"], stdout=DEVNULL, stderr=DEVNULL
-        )
+        mocked_registry.get.assert_called_with("ffmpeg")
 
-    @patch("dakara_feeder.subtitle.extraction.subprocess.run")
-    def test_is_available_not_available(self, mocked_run):
+    @patch("dakara_feeder.subtitle.extraction.registry")
+    def test_is_available_not_available(self, mocked_registry):
         """Test if the FFmpeg subtitle extractor is not available."""
-        mocked_run.side_effect = FileNotFoundError()
+        mocked_registry.get.return_value.available = False
         self.assertFalse(FFmpegSubtitleExtractor.is_available())
 
     @patch.object(FFmpegSubtitleExtractor, "is_available")
@@ -0,0 +1,117 @@
+from subprocess import CompletedProcess
+from unittest import TestCase
+from unittest.mock import ANY, patch
+
+from path import TempDir
+
+from dakara_feeder.tools import (
+    Tool,
+    ToolsRegistry,
+    UnknownToolError,
+    detect_ffmpeg_binary,
+)
+
+FFPROBE_VERSION_OUTPUT = (
+    b"ffprobe version 6.1.1 Copyright (c) 2007-2023 the FFmpeg developers\n"
+    b"configuration: --prefix=/usr --enable-gpl --enable-libass\n"
+)
+
+
+class DetectFFmpegBinaryTestCase(TestCase):
+    """Test the detection of FFmpeg binaries."""
+
+    @patch("dakara_feeder.tools.subprocess.run", autoset=True)
+    def test_available(self, mocked_run):
+        """Test to detect an available binary."""
+        mocked_run.return_value = CompletedProcess([], 0, FFPROBE_VERSION_OUTPUT)
+
+        tool = detect_ffmpeg_binary("ffprobe", "/usr/bin/ffprobe")
+
+        self.assertTrue(tool.available)
+        self.assertEqual(tool.version, "6.1.1")
+        self.assertListEqual(tool.features, ["gpl", "libass"])
+        mocked_run.assert_called_with(
+            ["/usr/bin/ffprobe", "-version"], stdout=ANY, stderr=ANY
+        )
+
+    @patch("dakara_feeder.tools.subprocess.run", autoset=True)
+    def test_not_available(self, mocked_run):
+        """Test to detect a binary that cannot be run."""
+        mocked_run.side_effect = FileNotFoundError()
+
+        tool = detect_ffmpeg_binary("ffprobe", "/usr/bin/ffprobe")
+
+        self.assertFalse(tool.available)
+
+
+@patch("dakara_feeder.tools.os.stat", autoset=True)
+@patch("dakara_feeder.tools.shutil.which", autoset=True)
+@patch("dakara_feeder.tools.subprocess.run", autoset=True)
+class ToolsRegistryTestCase(TestCase):
+    """Test the registry of tools."""
+
+    def test_get_once(self, mocked_run, mocked_which, mocked_stat):
+        """Test a tool is detected only once."""
+        mocked_which.return_value = "/usr/bin/ffprobe"
+        mocked_run.return_value = CompletedProcess([], 0, FFPROBE_VERSION_OUTPUT)
+
+        registry = ToolsRegistry()
+        tool1 = registry.get("ffprobe")
+        tool2 = registry.get("ffprobe")
+
+        self.assertIs(tool1, tool2)
+        self.assertTrue(tool1.available)
+        mocked_run.assert_called_once_with(
+            ["/usr/bin/ffprobe", "-version"], stdout=ANY, stderr=ANY
+        )
+
+    def test_get_not_installed(self, mocked_run, mocked_which, mocked_stat):
+        """Test to get a tool that is not installed."""
+        mocked_which.return_value = None
+
+        registry = ToolsRegistry()
+        tool = registry.get("ffmpeg")
+
+        self.assertFalse(tool.available)
+        mocked_run.assert_not_called()
+
+    def test_get_unknown(self, mocked_run, mocked_which, mocked_stat):
+        """Test to get a tool not managed by the registry."""
+        registry = ToolsRegistry()
+
+        with self.assertRaisesRegex(UnknownToolError, "Unknown tool vlc"):
+            registry.get("vlc")
+
+    def test_get_from_cache(self, mocked_run, mocked_which, mocked_stat):
+        """Test the detection is stored on disk and reused."""
+        mocked_which.return_value = "/usr/bin/ffprobe"
+        mocked_stat.return_value.st_mtime = 42
+        mocked_run.return_value = CompletedProcess([], 0, FFPROBE_VERSION_OUTPUT)
+
+        with TempDir() as temp:
+            cache_path = temp / "tools.json"
+
+            # first detection is stored
+            ToolsRegistry(cache_path).get("ffprobe")
+            self.assertTrue(cache_path.exists())
+
+            # second detection comes from the cache
+            tool = ToolsRegistry(cache_path).get("ffprobe")
+            self.assertEqual(tool.version, "6.1.1")
+            mocked_run.assert_called_once()
+
+            # binary modified, detection is done again
+            mocked_stat.return_value.st_mtime = 43
+            ToolsRegistry(cache_path).get("ffprobe")
+            self.assertEqual(mocked_run.call_count, 2)
+
+
+class ToolTestCase(TestCase):
+    """Test the tool class."""
+
+    def test_dict(self):
+        """Test to convert a tool to and from a dictionary."""
+        tool = Tool("ffmpeg", "/usr/bin/ffmpeg", True, "6.1.1", ["libass"])
+        tool_copy = Tool.from_dict(tool.to_dict())
+
+        self.assertDictEqual(tool.to_dict(), tool_copy.to_dict())
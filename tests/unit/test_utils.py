@@ -1,4 +1,7 @@
+import asyncio
+import threading
 from unittest import TestCase
+from unittest.mock import patch
 
 from dakara_feeder import utils
 
@@ -14,6 +17,166 @@ class DivideChuncksTestCase(TestCase):
         self.assertEqual(len(chuncks), 3)
         self.assertListEqual(chuncks, [[34, 58], [98, 35], [45]])
 
+    def test_generator(self):
+        """Test to divide the items of a generator."""
+        items = (item for item in [34, 58, 98, 35, 45])
+        chuncks = list(utils.divide_chunks(items, 2))
+
+        self.assertListEqual(chuncks, [[34, 58], [98, 35], [45]])
+
+
+class AdaptiveChunkerTestCase(TestCase):
+    """Test the divider of items in chunks of limited size."""
+
+    def test_divide_items(self):
+        """Test to divide items by number."""
+        chunker = utils.AdaptiveChunker(max_items=2)
+        chunks = list(chunker.divide(iter([1, 2, 3, 4, 5])))
+
+        self.assertListEqual(chunks, [[1, 2], [3, 4], [5]])
+
+    def test_divide_bytes(self):
+        """Test to divide items by serialized size."""
+        chunker = utils.AdaptiveChunker(max_items=10, max_bytes=20)
+        chunks = list(chunker.divide(["aaaa", "bbbb", "cccccccccccccccccccc", "d"]))
+
+        # each item takes its length, its quotes and a separator
+        self.assertListEqual(
+            chunks, [["aaaa", "bbbb"], ["cccccccccccccccccccc"], ["d"]]
+        )
+
+    def test_divide_empty(self):
+        """Test to divide no items."""
+        chunker = utils.AdaptiveChunker(max_items=10)
+        self.assertListEqual(list(chunker.divide([])), [])
+
+    def test_record(self):
+        """Test to adapt the number of items per chunk to the duration."""
+        chunker = utils.AdaptiveChunker(max_items=100, min_items=10, target_duration=4)
+
+        # slow requests halve the size down to the minimum
+        chunker.record(5)
+        self.assertEqual(chunker.size, 50)
+        chunker.record(5)
+        chunker.record(5)
+        chunker.record(5)
+        self.assertEqual(chunker.size, 10)
+
+        # requests close to the target do not change the size
+        chunker.record(3)
+        self.assertEqual(chunker.size, 10)
+
+        # fast requests increase the size up to the maximum
+        chunker.record(1)
+        self.assertEqual(chunker.size, 12)
+        for _ in range(20):
+            chunker.record(1)
+
+        self.assertEqual(chunker.size, 100)
+
+    def test_record_divide(self):
+        """Test the adapted size is used for the next chunks."""
+        chunker = utils.AdaptiveChunker(max_items=4, target_duration=1)
+        chunks = []
+        for chunk in chunker.divide(range(10)):
+            chunks.append(chunk)
+            chunker.record(2)
+
+        self.assertListEqual(chunks, [[0, 1, 2, 3], [4, 5], [6], [7], [8], [9]])
+
+    def test_from_config(self):
+        """Test to create a chunker from the config of the server."""
+        chunker = utils.AdaptiveChunker.from_config(
+            {"chunk_max_bytes": 1000, "chunk_min_items": 5, "chunk_target_duration": 2},
+            50,
+        )
+
+        self.assertEqual(chunker.max_items, 50)
+        self.assertEqual(chunker.max_bytes, 1000)
+        self.assertEqual(chunker.min_items, 5)
+        self.assertEqual(chunker.target_duration, 2)
+        self.assertEqual(chunker.size, 50)
+
+
+class MapConcurrentlyTestCase(TestCase):
+    """Test the function to map items with a pool of threads."""
+
+    def test_sequential(self):
+        """Test to map items in the calling thread."""
+        results = list(utils.map_concurrently(lambda x: x * 2, [1, 2, 3]))
+
+        self.assertListEqual(results, [2, 4, 6])
+
+    def test_concurrent(self):
+        """Test to map items with several threads keeps order."""
+        results = list(utils.map_concurrently(lambda x: x * 2, range(100), workers=4))
+
+        self.assertListEqual(results, [x * 2 for x in range(100)])
+
+    def test_background(self):
+        """Test to map items in another thread with one worker."""
+        threads = list(
+            utils.map_concurrently(
+                lambda x: threading.get_ident(), range(3), background=True
+            )
+        )
+
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_concurrent_error(self):
+        """Test an error in a thread is raised in the calling thread."""
+
+        def function(item):
+            if item == 5:
+                raise ValueError("error")
+
+            return item
+
+        with self.assertRaisesRegex(ValueError, "error"):
+            list(utils.map_concurrently(function, range(10), workers=4))
+
+
+class RunConcurrentlyTestCase(TestCase):
+    """Test the function to run coroutines with a limit."""
+
+    def test_run(self):
+        """Test to run coroutines with no more than the limit at once."""
+        running = []
+        maximum = []
+        results = []
+
+        async def coroutine(item):
+            running.append(item)
+            maximum.append(len(running))
+            await asyncio.sleep(0)
+            running.remove(item)
+            results.append(item)
+
+        asyncio.run(
+            utils.run_concurrently((coroutine(item) for item in range(10)), limit=3)
+        )
+
+        self.assertCountEqual(results, range(10))
+        self.assertEqual(max(maximum), 3)
+
+    def test_run_error(self):
+        """Test an error in a coroutine is raised and others are canceled."""
+        results = []
+
+        async def coroutine(item):
+            if item == 0:
+                raise ValueError("error")
+
+            await asyncio.sleep(1)
+            results.append(item)
+
+        with self.assertRaisesRegex(ValueError, "error"):
+            asyncio.run(
+                utils.run_concurrently((coroutine(item) for item in range(10)), limit=3)
+            )
+
+        self.assertListEqual(results, [])
+
 
 class CleanDictTestCase(TestCase):
     """ "Test the function to clean dictionary."""
@@ -24,3 +187,23 @@ class CleanDictTestCase(TestCase):
         target_clean = utils.clean_dict(target, ["a", "c", "d"])
 
         self.assertDictEqual(target_clean, {"a": 1, "c": 3})
+
+
+class GetAvailableCpuCountTestCase(TestCase):
+    """Test the function to get the number of usable CPUs."""
+
+    @patch("dakara_feeder.utils.os.sched_getaffinity", create=True)
+    def test_affinity(self, mocked_sched_getaffinity):
+        """Test to get the number of CPUs from the affinity of the process."""
+        mocked_sched_getaffinity.return_value = {0, 2}
+
+        self.assertEqual(utils.get_available_cpu_count(), 2)
+        mocked_sched_getaffinity.assert_called_with(0)
+
+    @patch("dakara_feeder.utils.os.cpu_count", return_value=8)
+    @patch("dakara_feeder.utils.os.sched_getaffinity", create=True)
+    def test_no_affinity(self, mocked_sched_getaffinity, mocked_cpu_count):
+        """Test to get the number of CPUs when affinity is not supported."""
+        mocked_sched_getaffinity.side_effect = AttributeError
+
+        self.assertEqual(utils.get_available_cpu_count(), 8)
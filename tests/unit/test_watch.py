@@ -0,0 +1,212 @@
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+from path import Path, TempDir
+
+from dakara_feeder.watch import (
+    BaseWatcher,
+    InotifyWatcher,
+    PollingWatcher,
+    get_subdirectories,
+    get_watcher,
+    list_directories,
+)
+
+
+class ScriptedWatcher(BaseWatcher):
+    """Watcher returning predefined changes."""
+
+    def __init__(self, path, changes):
+        super().__init__(path)
+        self.changes = list(changes)
+        self.timeouts = []
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def poll(self, timeout=None):
+        self.timeouts.append(timeout)
+        return self.changes.pop(0)
+
+
+class ListDirectoriesTestCase(TestCase):
+    """Test the recursive listing of directories."""
+
+    def test_list(self):
+        """Test to list directories of a folder."""
+        with TempDir() as temp:
+            (temp / "directory_0" / "subdirectory").makedirs()
+            (temp / "directory_1").makedirs()
+            (temp / "file.mkv").touch()
+
+            directories = list_directories(temp)
+
+        self.assertCountEqual(
+            directories,
+            [
+                Path(""),
+                Path("directory_0"),
+                Path("directory_0") / "subdirectory",
+                Path("directory_1"),
+            ],
+        )
+
+
+class GetSubdirectoriesTestCase(TestCase):
+    """Test the selection of sub directories."""
+
+    def test_get(self):
+        """Test to get the sub directories of a directory."""
+        directories = [
+            Path(""),
+            Path("directory"),
+            Path("directory") / "subdirectory",
+            Path("directory_other"),
+        ]
+
+        self.assertSetEqual(
+            get_subdirectories(directories, Path("directory")),
+            {Path("directory"), Path("directory") / "subdirectory"},
+        )
+
+    def test_get_root(self):
+        """Test to get the sub directories of the root directory."""
+        directories = [Path(""), Path("directory")]
+
+        self.assertSetEqual(
+            get_subdirectories(directories, Path("")),
+            {Path(""), Path("directory")},
+        )
+
+
+class WaitChangesTestCase(TestCase):
+    """Test the debouncing of changes."""
+
+    def test_wait(self):
+        """Test to accumulate changes until nothing happens."""
+        watcher = ScriptedWatcher(
+            Path("kara"),
+            [
+                (set(), set()),
+                ({Path("directory_0")}, set()),
+                (set(), {Path("directory_1") / "song.ass"}),
+                (set(), set()),
+            ],
+        )
+
+        directories, files = watcher.wait_changes(debounce=5)
+
+        self.assertSetEqual(directories, {Path("directory_0"), Path("directory_1")})
+        self.assertSetEqual(files, {Path("directory_1") / "song.ass"})
+        self.assertListEqual(watcher.timeouts, [None, None, 5, 5])
+
+
+class PollingWatcherTestCase(TestCase):
+    """Test the polling watcher."""
+
+    def test_poll_new_file(self):
+        """Test to detect a new file."""
+        with TempDir() as temp:
+            (temp / "directory").makedirs()
+
+            with PollingWatcher(temp, interval=0) as watcher:
+                # nothing changed
+                self.assertEqual(watcher.poll(), (set(), set()))
+
+                # add a file
+                (temp / "directory" / "song.mkv").touch()
+                directories, files = watcher.poll()
+
+        self.assertSetEqual(directories, {Path("directory")})
+        self.assertSetEqual(files, set())
+
+    def test_poll_removed_directory(self):
+        """Test to detect a removed directory."""
+        with TempDir() as temp:
+            (temp / "directory" / "subdirectory").makedirs()
+
+            with PollingWatcher(temp, interval=0) as watcher:
+                (temp / "directory").rmtree()
+                directories, _ = watcher.poll()
+
+        self.assertSetEqual(
+            directories,
+            {Path(""), Path("directory"), Path("directory") / "subdirectory"},
+        )
+
+
+@skipUnless(InotifyWatcher.is_available(), "Inotify not available")
+class InotifyWatcherTestCase(TestCase):
+    """Test the inotify watcher."""
+
+    def test_poll_new_file(self):
+        """Test to detect a new file."""
+        with TempDir() as temp:
+            (temp / "directory").makedirs()
+
+            with InotifyWatcher(temp) as watcher:
+                # nothing changed
+                self.assertEqual(watcher.poll(timeout=0), (set(), set()))
+
+                # add a file
+                (temp / "directory" / "song.mkv").write_text("content")
+                directories, files = watcher.poll(timeout=1)
+
+        self.assertSetEqual(directories, {Path("directory")})
+        self.assertSetEqual(files, {Path("directory") / "song.mkv"})
+
+    def test_poll_new_directory(self):
+        """Test to detect a new directory and watch it."""
+        with TempDir() as temp:
+            with InotifyWatcher(temp) as watcher:
+                (temp / "directory").makedirs()
+                directories, _ = watcher.poll(timeout=1)
+
+                self.assertSetEqual(directories, {Path(""), Path("directory")})
+
+                # changes in the new directory are detected
+                (temp / "directory" / "song.mkv").touch()
+                directories, _ = watcher.poll(timeout=1)
+
+        self.assertSetEqual(directories, {Path("directory")})
+
+    def test_poll_removed_directory(self):
+        """Test to detect a removed directory."""
+        with TempDir() as temp:
+            (temp / "directory" / "subdirectory").makedirs()
+
+            with InotifyWatcher(temp) as watcher:
+                (temp / "directory").rmtree()
+                directories, _ = watcher.poll(timeout=1)
+
+                # the watches of the removed directories are forgotten
+                self.assertNotIn(Path("directory"), watcher.descriptors_by_directory)
+
+        self.assertSetEqual(
+            directories,
+            {Path(""), Path("directory"), Path("directory") / "subdirectory"},
+        )
+
+
+class GetWatcherTestCase(TestCase):
+    """Test the selection of the watcher."""
+
+    @patch.object(InotifyWatcher, "is_available", return_value=True)
+    def test_get_inotify(self, mocked_is_available):
+        """Test to get the inotify watcher."""
+        self.assertIsInstance(get_watcher(Path("kara")), InotifyWatcher)
+
+    @patch.object(InotifyWatcher, "is_available", return_value=False)
+    def test_get_inotify_not_available(self, mocked_is_available):
+        """Test to get the polling watcher when inotify is not available."""
+        watcher = get_watcher(Path("kara"), interval=5)
+
+        self.assertIsInstance(watcher, PollingWatcher)
+        self.assertEqual(watcher.interval, 5)
+
+    def test_get_polling(self):
+        """Test to force the polling watcher."""
+        self.assertIsInstance(get_watcher(Path("kara"), polling=True), PollingWatcher)
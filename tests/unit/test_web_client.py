@@ -1,6 +1,11 @@
+import asyncio
+import gzip
+import json
 from unittest import TestCase
 from unittest.mock import ANY, patch
 
+import dakara_base.http_client
+import requests
 from path import Path
 
 from dakara_feeder import web_client
@@ -45,7 +50,7 @@ class HTTPClientDakaraTestCase(TestCase):
         )
 
         # call the method
-        songs_list = http_client.retrieve_songs()
+        songs_list = list(http_client.retrieve_songs())
 
         # assert the songs are present and filename and directory is joined
         self.assertCountEqual(
@@ -57,7 +62,90 @@ class HTTPClientDakaraTestCase(TestCase):
         )
 
         # assert the mock
-        mocked_get.assert_called_with("library/songs/retrieve/")
+        mocked_get.assert_called_once_with(
+            "library/songs/retrieve/", params={"page": 1, "page_size": 1000}
+        )
+
+    @patch.object(web_client.HTTPClientDakara, "get", autoset=True)
+    def test_retrieve_songs_paginated(self, mocked_get):
+        """Test to obtain the list of song paths page by page."""
+
+        # create the mock
+        def get(endpoint, params):
+            page = params["page"]
+            return {
+                "pagination": {"current": page, "last": 3},
+                "count": 6,
+                "results": [
+                    {
+                        "filename": "song_{}.mp4".format(index),
+                        "directory": "directory",
+                        "id": index,
+                    }
+                    for index in (page * 2 - 2, page * 2 - 1)
+                ],
+            }
+
+        mocked_get.side_effect = get
+
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            {**self.config, "concurrency": 2, "songs_per_page": 2},
+            endpoint_prefix=self.endpoint_prefix,
+        )
+
+        # call the method
+        songs_list = list(http_client.retrieve_songs())
+
+        # assert the songs of all pages are present in order
+        self.assertListEqual(
+            songs_list,
+            [
+                {"path": Path("directory") / "song_{}.mp4".format(index), "id": index}
+                for index in range(6)
+            ],
+        )
+
+        # assert the mock
+        self.assertCountEqual(
+            [call.kwargs["params"]["page"] for call in mocked_get.call_args_list],
+            [1, 2, 3],
+        )
+
+    @patch.object(web_client.HTTPClientDakara, "get", autoset=True)
+    def test_retrieve_songs_paginated_missing(self, mocked_get):
+        """Test to detect songs missed between pages."""
+        # create the mock
+        mocked_get.side_effect = [
+            {
+                "pagination": {"current": 1, "last": 2},
+                "count": 4,
+                "results": [
+                    {"filename": "song_0.mp4", "directory": "directory", "id": 0},
+                    {"filename": "song_1.mp4", "directory": "directory", "id": 1},
+                ],
+            },
+            {
+                "pagination": {"current": 2, "last": 2},
+                "count": 3,
+                "results": [
+                    {"filename": "song_3.mp4", "directory": "directory", "id": 3},
+                ],
+            },
+        ]
+
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            {**self.config, "songs_per_page": 2},
+            endpoint_prefix=self.endpoint_prefix,
+        )
+
+        # call the method
+        with self.assertRaisesRegex(
+            web_client.SongsCountMismatchError,
+            "Received 3 songs from the server instead of 4",
+        ):
+            list(http_client.retrieve_songs())
 
     @patch.object(web_client.HTTPClientDakara, "post", autoset=True)
     def test_post_song(self, mocked_post):
@@ -76,10 +164,35 @@ class HTTPClientDakaraTestCase(TestCase):
         )
 
         # call the method
-        http_client.post_song(song)
+        created_song = http_client.post_song(song)
+
+        # assert the result
+        self.assertIs(created_song, mocked_post.return_value)
 
         # assert the mock
-        mocked_post.assert_called_with("library/songs/", json=song)
+        mocked_post.assert_called_with(
+            "library/songs/", json=song, function_on_error=ANY
+        )
+
+    @patch("dakara_feeder.web_client.requests.Session.post", autoset=True)
+    def test_post_song_error_invalid(self, mocked_post):
+        """Test to create a song rejected by the server."""
+        # create the mock
+        mocked_post.return_value.ok = False
+        mocked_post.return_value.status_code = 400
+        mocked_post.return_value.text = "invalid song"
+
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            self.config, endpoint_prefix=self.endpoint_prefix
+        )
+
+        # artificially connect the server
+        http_client.token = "token"
+
+        # call the method
+        with self.assertRaisesRegex(web_client.SongInvalidError, "invalid song"):
+            http_client.post_song([{"title": "title_0"}])
 
     @patch.object(web_client.HTTPClientDakara, "put", autoset=True)
     def test_put_song(self, mocked_put):
@@ -123,6 +236,344 @@ class HTTPClientDakaraTestCase(TestCase):
         # assert the mock
         mocked_delete.assert_called_with("library/songs/42/")
 
+    @patch.object(web_client.HTTPClientDakara, "delete_song", autoset=True)
+    def test_delete_songs(self, mocked_delete_song):
+        """Test to delete several songs concurrently."""
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            {**self.config, "concurrency": 4}, endpoint_prefix=self.endpoint_prefix
+        )
+
+        # call the method
+        songs_id = list(http_client.delete_songs(range(20)))
+
+        # assert the result
+        self.assertListEqual(songs_id, list(range(20)))
+        self.assertCountEqual(
+            [call.args[0] for call in mocked_delete_song.call_args_list], range(20)
+        )
+
+    @patch.object(web_client.HTTPClientDakara, "put_song", autoset=True)
+    def test_put_songs(self, mocked_put_song):
+        """Test to update several songs concurrently."""
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            {**self.config, "concurrency": 2}, endpoint_prefix=self.endpoint_prefix
+        )
+
+        # call the method
+        songs_id = list(
+            http_client.put_songs([(1, {"title": "a"}), (2, {"title": "b"})])
+        )
+
+        # assert the result
+        self.assertListEqual(songs_id, [1, 2])
+        mocked_put_song.assert_any_call(1, {"title": "a"})
+        mocked_put_song.assert_any_call(2, {"title": "b"})
+
+    @patch.object(web_client.HTTPClientDakara, "post_song", autoset=True)
+    def test_post_songs(self, mocked_post_song):
+        """Test to create several chunks of songs."""
+        # create the mock
+        mocked_post_song.side_effect = lambda songs: [song["title"] for song in songs]
+
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            self.config, endpoint_prefix=self.endpoint_prefix
+        )
+
+        # call the method
+        responses = list(
+            http_client.post_songs([[{"title": "a"}, {"title": "b"}], [{"title": "c"}]])
+        )
+
+        # assert the result
+        self.assertListEqual(responses, [["a", "b"], ["c"]])
+
+    @patch.object(web_client.HTTPClientDakara, "post_song", autoset=True)
+    def test_post_songs_on_sent(self, mocked_post_song):
+        """Test to get the duration of the requests of chunks of songs."""
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            self.config, endpoint_prefix=self.endpoint_prefix
+        )
+        durations = []
+
+        # call the method
+        list(
+            http_client.post_songs(
+                [[{"title": "a"}], [{"title": "b"}]], on_sent=durations.append
+            )
+        )
+
+        # assert the durations
+        self.assertEqual(len(durations), 2)
+        for duration in durations:
+            self.assertGreaterEqual(duration, 0)
+
+    @patch.object(web_client.HTTPClientDakara, "post_song", autoset=True)
+    def test_post_songs_chunk_bisect(self, mocked_post_song):
+        """Test to isolate invalid songs of a rejected chunk."""
+
+        # create the mock
+        def post_song(songs):
+            if any(song["title"] in ("c", "f") for song in songs):
+                raise web_client.SongInvalidError("invalid")
+
+            return [{"title": song["title"]} for song in songs]
+
+        mocked_post_song.side_effect = post_song
+
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            self.config, endpoint_prefix=self.endpoint_prefix
+        )
+        rejected = []
+        durations = []
+
+        # call the method
+        created_songs = http_client.post_songs_chunk(
+            [{"title": title} for title in "abcdefgh"],
+            on_sent=durations.append,
+            on_rejected=lambda song, error: rejected.append(song["title"]),
+        )
+
+        # assert the result
+        self.assertListEqual(
+            [song["title"] for song in created_songs], ["a", "b", "d", "e", "g", "h"]
+        )
+        self.assertListEqual(rejected, ["c", "f"])
+
+        # assert only the request of the whole chunk was timed
+        self.assertEqual(len(durations), 1)
+
+        # assert the number of requests is logarithmic for each invalid song
+        self.assertLessEqual(mocked_post_song.call_count, 1 + 2 * 2 * 3)
+
+    @patch.object(web_client.HTTPClientDakara, "post_song", autoset=True)
+    def test_post_songs_chunk_bisect_not_described(self, mocked_post_song):
+        """Test to isolate invalid songs when the server does not describe songs."""
+
+        # create the mock
+        def post_song(songs):
+            if any(song["title"] == "b" for song in songs):
+                raise web_client.SongInvalidError("invalid")
+
+        mocked_post_song.side_effect = post_song
+
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            self.config, endpoint_prefix=self.endpoint_prefix
+        )
+        rejected = []
+
+        # call the method
+        created_songs = http_client.post_songs_chunk(
+            [{"title": title} for title in "abcd"],
+            on_rejected=lambda song, error: rejected.append(song["title"]),
+        )
+
+        # assert the result
+        self.assertIsNone(created_songs)
+        self.assertListEqual(rejected, ["b"])
+        mocked_post_song.assert_called_with([{"title": "c"}, {"title": "d"}])
+
+    @patch.object(web_client.HTTPClientDakara, "post_song", autoset=True)
+    def test_post_songs_rejected_error(self, mocked_post_song):
+        """Test an error when a chunk is rejected without quarantine."""
+        # create the mock
+        mocked_post_song.side_effect = web_client.SongInvalidError("invalid")
+
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            self.config, endpoint_prefix=self.endpoint_prefix
+        )
+
+        # call the method
+        with self.assertRaises(web_client.SongInvalidError):
+            list(http_client.post_songs([[{"title": "a"}, {"title": "b"}]]))
+
+        # assert the chunk was not bisected
+        mocked_post_song.assert_called_once_with([{"title": "a"}, {"title": "b"}])
+
+    @patch.object(web_client.HTTPClientDakara, "delete_song", autoset=True)
+    def test_delete_songs_error(self, mocked_delete_song):
+        """Test an error when deleting several songs is raised."""
+        # create the mock
+        mocked_delete_song.side_effect = web_client.ResponseInvalidError("error")
+
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            {**self.config, "concurrency": 2}, endpoint_prefix=self.endpoint_prefix
+        )
+
+        # call the method
+        with self.assertRaisesRegex(web_client.ResponseInvalidError, "error"):
+            list(http_client.delete_songs(range(5)))
+
+    def test_concurrency(self):
+        """Test the concurrency of the client."""
+        http_client = web_client.HTTPClientDakara(
+            self.config, endpoint_prefix=self.endpoint_prefix
+        )
+        self.assertEqual(http_client.concurrency, 1)
+
+        http_client = web_client.HTTPClientDakara(
+            {**self.config, "concurrency": 8}, endpoint_prefix=self.endpoint_prefix
+        )
+        self.assertEqual(http_client.concurrency, 8)
+
+    def test_get_session(self):
+        """Test the session is created once with a large enough pool."""
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            {**self.config, "concurrency": 8}, endpoint_prefix=self.endpoint_prefix
+        )
+
+        # call the method
+        session = http_client.get_session()
+
+        # assert the session
+        self.assertIs(http_client.get_session(), session)
+        self.assertEqual(session.get_adapter(self.url)._pool_maxsize, 8)
+
+        # close the session
+        http_client.close()
+        self.assertIsNone(http_client.session)
+
+    def test_other_clients(self):
+        """Test other clients of dakara_base do not use the session."""
+        self.assertIs(dakara_base.http_client.requests, requests)
+
+    @patch("dakara_feeder.web_client.requests.Session.put", autoset=True)
+    def test_send_request_raw_error_generic(self, mocked_put):
+        """Test an unknown problem when sending a request."""
+        # create the mock
+        mocked_put.return_value.ok = False
+        mocked_put.return_value.status_code = 500
+        mocked_put.return_value.text = "error message"
+
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            self.config, endpoint_prefix=self.endpoint_prefix
+        )
+
+        # call the method
+        with self.assertLogs("dakara_feeder.web_client", "DEBUG"):
+            with self.assertRaisesRegex(
+                web_client.ResponseInvalidError,
+                "Error 500 when communicating with the server: error message",
+            ):
+                http_client.send_request_raw("put", "library/songs/42/", json={})
+
+        # assert the call
+        mocked_put.assert_called_with(self.url + "library/songs/42/", json={})
+
+    @patch("dakara_feeder.web_client.requests.Session.delete", autoset=True)
+    def test_send_request_raw_error_communication(self, mocked_delete):
+        """Test a connection problem when sending a request."""
+        # create the mock
+        mocked_delete.side_effect = web_client.requests.exceptions.ConnectionError(
+            "refused"
+        )
+
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            self.config, endpoint_prefix=self.endpoint_prefix
+        )
+
+        # call the method
+        with self.assertLogs("dakara_feeder.web_client", "DEBUG") as logger:
+            with self.assertRaisesRegex(
+                web_client.ResponseRequestError,
+                "Error when communicating with the server: refused",
+            ):
+                http_client.send_request_raw("delete", "library/songs/42/")
+
+        # assert the logs
+        self.assertIn(
+            "ERROR:dakara_feeder.web_client:Unable to request the server, "
+            "communication error",
+            logger.output,
+        )
+
+    @patch("dakara_feeder.web_client.requests.Session.post", autoset=True)
+    def test_send_request_raw_compression(self, mocked_post):
+        """Test to send a compressed JSON body."""
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            {**self.config, "compression": "gzip", "compression_threshold": 100},
+            endpoint_prefix=self.endpoint_prefix,
+        )
+        song = {"title": "Song", "lyrics": "la " * 100}
+
+        # call the method
+        with self.assertLogs("dakara_feeder.web_client", "DEBUG"):
+            http_client.send_request_raw(
+                "post", "library/songs/", json=song, headers={"Authorization": "t"}
+            )
+
+        # assert the call
+        mocked_post.assert_called_with(
+            self.url + "library/songs/",
+            data=ANY,
+            headers={
+                "Authorization": "t",
+                "Content-Type": "application/json",
+                "Content-Encoding": "gzip",
+            },
+        )
+        data = mocked_post.call_args.kwargs["data"]
+        self.assertDictEqual(json.loads(gzip.decompress(data)), song)
+
+    @patch("dakara_feeder.web_client.requests.Session.post", autoset=True)
+    def test_send_request_raw_compression_threshold(self, mocked_post):
+        """Test to not compress a small JSON body."""
+        # create the object
+        http_client = web_client.HTTPClientDakara(
+            {**self.config, "compression": "gzip", "compression_threshold": 100},
+            endpoint_prefix=self.endpoint_prefix,
+        )
+
+        # call the method
+        http_client.send_request_raw("post", "library/songs/", json={"title": "a"})
+
+        # assert the call
+        mocked_post.assert_called_with(
+            self.url + "library/songs/",
+            data=b'{"title": "a"}',
+            headers={"Content-Type": "application/json"},
+        )
+
+    def test_compression_invalid(self):
+        """Test to use an unknown compression."""
+        with self.assertRaisesRegex(
+            web_client.InvalidCompressionError,
+            "Invalid compression 'lzma', must be one of: gzip, zstd",
+        ):
+            web_client.HTTPClientDakara(
+                {**self.config, "compression": "lzma"},
+                endpoint_prefix=self.endpoint_prefix,
+            )
+
+    @patch("dakara_feeder.web_client.zstandard", None)
+    def test_compression_not_available(self):
+        """Test to use zstd compression when Zstandard is not installed."""
+        with self.assertRaises(web_client.CompressionNotAvailableError):
+            web_client.HTTPClientDakara(
+                {**self.config, "compression": "zstd"},
+                endpoint_prefix=self.endpoint_prefix,
+            )
+
+    def test_send_request_raw_error_method(self):
+        """Test to send a request with an unknown method."""
+        http_client = web_client.HTTPClientDakara(
+            self.config, endpoint_prefix=self.endpoint_prefix
+        )
+
+        with self.assertRaises(web_client.MethodError):
+            http_client.send_request_raw("head", "library/songs/")
+
     @patch.object(web_client.HTTPClientDakara, "delete", autoset=True)
     def test_prune_artists(self, mocked_delete):
         """Test to prune artists."""
@@ -290,7 +741,7 @@ class HTTPClientDakaraTestCase(TestCase):
         # assert the call
         mocked_post.assert_called_with("library/song-tags/", tag, function_on_error=ANY)
 
-    @patch("dakara_base.http_client.requests.post", autoset=True)
+    @patch("dakara_feeder.web_client.requests.Session.post", autoset=True)
     def test_post_tag_error_already_exists(self, mocked_post):
         """Test to create tag that already exists."""
         # create the mock
@@ -317,7 +768,7 @@ class HTTPClientDakaraTestCase(TestCase):
             self.url + "library/song-tags/", tag, headers=ANY
         )
 
-    @patch("dakara_base.http_client.requests.post", autoset=True)
+    @patch("dakara_feeder.web_client.requests.Session.post", autoset=True)
     def test_post_tag_error_other(self, mocked_post):
         """Test an unknown problem when creating a tag."""
         # create the mock
@@ -365,7 +816,7 @@ class HTTPClientDakaraTestCase(TestCase):
             "library/work-types/", work_type, function_on_error=ANY
         )
 
-    @patch("dakara_base.http_client.requests.post", autoset=True)
+    @patch("dakara_feeder.web_client.requests.Session.post", autoset=True)
     def test_post_work_type_error_already_exists(self, mocked_post):
         """Test to create work type that already exists."""
         # create the mock
@@ -392,7 +843,7 @@ class HTTPClientDakaraTestCase(TestCase):
             self.url + "library/work-types/", work_type, headers=ANY
         )
 
-    @patch("dakara_base.http_client.requests.post", autoset=True)
+    @patch("dakara_feeder.web_client.requests.Session.post", autoset=True)
     def test_post_work_type_error_other(self, mocked_post):
         """Test an unknown problem when creating a work type."""
         # create the mock
@@ -417,3 +868,53 @@ class HTTPClientDakaraTestCase(TestCase):
             "Error 999 when communicating with the server: error message",
         ):
             http_client.post_work_type(work_type)
+
+
+class AsyncHTTPClientDakaraTestCase(TestCase):
+    """Test the asynchronous HTTP client."""
+
+    def setUp(self):
+        # create config
+        self.config = {"address": "www.example.com", "concurrency": 2}
+
+    @patch.object(web_client.HTTPClientDakara, "put_song", autoset=True)
+    @patch.object(web_client.HTTPClientDakara, "post_songs_chunk", autoset=True)
+    def test_post_and_put_song(self, mocked_post_songs_chunk, mocked_put_song):
+        """Test to send several requests asynchronously."""
+        # create the mock
+        mocked_post_songs_chunk.return_value = [{"id": 2}]
+
+        # create the object
+        http_client = web_client.HTTPClientDakara(self.config, endpoint_prefix="api")
+
+        async def send(async_http_client):
+            return await asyncio.gather(
+                async_http_client.post_songs_chunk([{"title": "a"}]),
+                async_http_client.put_song(1, {"title": "b"}),
+            )
+
+        # call the method
+        with web_client.AsyncHTTPClientDakara(http_client) as async_http_client:
+            results = asyncio.run(send(async_http_client))
+
+        # assert the result
+        self.assertListEqual(results, [[{"id": 2}], None])
+        self.assertEqual(async_http_client.concurrency, 2)
+        mocked_post_songs_chunk.assert_called_with(
+            [{"title": "a"}], on_sent=None, on_rejected=None
+        )
+        mocked_put_song.assert_called_with(1, {"title": "b"})
+
+    @patch.object(web_client.HTTPClientDakara, "delete_song", autoset=True)
+    def test_delete_song_error(self, mocked_delete_song):
+        """Test an error of the wrapped client is raised."""
+        # create the mock
+        mocked_delete_song.side_effect = web_client.ResponseInvalidError("error")
+
+        # create the object
+        http_client = web_client.HTTPClientDakara(self.config, endpoint_prefix="api")
+
+        # call the method
+        with web_client.AsyncHTTPClientDakara(http_client) as async_http_client:
+            with self.assertRaisesRegex(web_client.ResponseInvalidError, "error"):
+                asyncio.run(async_http_client.delete_song(1))